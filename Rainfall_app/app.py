@@ -1,8 +1,14 @@
 import streamlit as st
+from utils.startup import PageTimer, start_warmup
+
+page_timer = PageTimer("App")
 
 # Set page configuration
 st.set_page_config(page_title="Rainfall App", layout="centered")
 
+# Preload the heavy modules, dataset and models into the shared cache while this page renders
+start_warmup()
+
 # Custom CSS for attractive and responsive styling
 st.markdown("""
     <style>
@@ -85,6 +91,7 @@ with st.container():
     st.title("🌧️ Rainfall App for Eastern Nepal")
     st.markdown("Navigate through the pages using the sidebar to explore rainfall predictions, regional analysis, news insights, and provide feedback.")
     st.markdown('</div>', unsafe_allow_html=True)
+page_timer.first_paint()
 
 # Horizontal line
 st.markdown('<hr>', unsafe_allow_html=True)
@@ -113,4 +120,6 @@ with st.container():
         **Application Developed By**: Rangit Sapkota  
                Kathmandu, Nepal
     """)
-    st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown('</div>', unsafe_allow_html=True)
+
+page_timer.done()
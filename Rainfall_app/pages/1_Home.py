@@ -1,4 +1,8 @@
 import streamlit as st
+from utils.startup import PageTimer
+
+# Started before the remaining imports so they count towards the first paint
+page_timer = PageTimer("Home")
 from utils.data_utils import load_model_evaluation_results
 
 # Set page configuration
@@ -85,6 +89,7 @@ st.markdown("""
 # Main title and introduction
 with st.container():
     st.title("🌧️ Rainfall Prediction App for Eastern Nepal")
+    page_timer.first_paint()
     st.markdown('<div class="card" role="region" aria-label="Introduction Section">', unsafe_allow_html=True)
     st.markdown("""
         Welcome to the Rainfall App, designed to predict rainfall and extreme weather events in Eastern Nepal using advanced machine learning models. This app also provides insights from news articles analyzed through natural language processing (NLP).
@@ -113,4 +118,4 @@ with st.container():
         st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
-    
\ No newline at end of file
+page_timer.done()
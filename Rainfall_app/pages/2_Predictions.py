@@ -1,15 +1,41 @@
 import streamlit as st
+from utils.startup import PageTimer
+
+# Started before the remaining imports so they count towards the first paint
+page_timer = PageTimer("Predictions")
 import pandas as pd
 import numpy as np
 from utils.data_utils import (
-    load_feature_data, 
-    load_reg_model, 
-    load_clf_model, 
+    DATA_DIR,
+    file_hash,
+    load_station_index,
+    load_compact_reg_model,
+    load_compact_clf_model,
+    load_feature_transforms,
+    feature_defaults,
     load_model_evaluation_results
 )
-from utils.visualization_utils import plot_time_series
-import uuid
+from utils.visualization_utils import (
+    AGGREGATION_FREQUENCIES,
+    aggregate_series,
+    plot_station_facets,
+    plot_time_series
+)
+from utils.inference import (
+    FEATURE_COLUMNS,
+    get_regression_service,
+    get_classification_service,
+    iter_upload_chunks,
+    missing_features,
+    score_batches,
+    score_frame,
+    score_raw_batches
+)
+from utils.prediction_store import load_predictions
+from utils.transforms import TRANSFORMS_FILE, missing_raw_inputs
+import hashlib
 import os
+import time
 
 # Set page configuration
 st.set_page_config(page_title="Rainfall Prediction Dashboard", layout="centered", initial_sidebar_state="expanded")
@@ -99,12 +125,17 @@ st.markdown("""
 with st.container():
     st.title("🌧️ Rainfall Prediction Dashboard")
     st.markdown("Analyze historical rainfall data and make real-time predictions with a modern interface.")
+page_timer.first_paint()
+
+# Feature columns (shared with the startup warmup, which preloads this page's station index)
+feature_columns = list(FEATURE_COLUMNS)
+required_columns = ['date', 'rainfall_sum'] + feature_columns
 
-# Load data and models
+# Load data and models (indexed by station and date, dates parsed once per process)
 try:
-    data = load_feature_data()
-    reg_model = load_reg_model()
-    clf_model = load_clf_model()
+    index = load_station_index(columns=required_columns)
+    # The compact export carries the feature names, so the pickle is not unpickled here
+    reg_model = load_compact_reg_model()
 except FileNotFoundError as e:
     st.error(f"Failed to load data or models: {str(e)}")
     st.stop()
@@ -131,8 +162,8 @@ with st.container():
     st.markdown('</div>', unsafe_allow_html=True)
 
 # Create station options
-station_options = data[['station_id', 'station_name_x']].drop_duplicates().set_index('station_id')['station_name_x'].to_dict()
-display_options = [f"{station_options.get(sid, 'Unknown')} (ID: {sid})" for sid in data['station_id'].unique()]
+station_options = index.station_names
+display_options = [f"{station_options.get(sid, 'Unknown')} (ID: {sid})" for sid in station_options]
 
 # Sidebar filters
 with st.sidebar:
@@ -150,27 +181,32 @@ with st.sidebar:
     ]
     date_range = st.date_input(
         "Select Date Range",
-        [pd.to_datetime(data['date']).min(), pd.to_datetime(data['date']).max()],
+        [index.date_min, index.date_max],
         help="Select the date range for historical data"
     )
+    aggregation = st.selectbox(
+        "Aggregation",
+        options=list(AGGREGATION_FREQUENCIES),
+        index=list(AGGREGATION_FREQUENCIES).index('Monthly'),
+        help="Average the chart over days, weeks or months",
+        key="chart_aggregation"
+    )
+    chart_scope = st.radio(
+        "Chart Series",
+        ["Per station", "Basin-wide mean"],
+        help="One panel per station, or the mean over all selected stations",
+        key="chart_scope"
+    )
     st.markdown('</div>', unsafe_allow_html=True)
 
-# Filter data
-filtered_data = data[
-    (data['station_id'].isin(selected_stations)) &
-    (pd.to_datetime(data['date']) >= pd.to_datetime(date_range[0])) &
-    (pd.to_datetime(data['date']) <= pd.to_datetime(date_range[1]))
-].copy()
-
-# Feature columns
-feature_columns = [
-    'ele(meter)', 'lat(deg)', 'lon(deg)', 'year', 'month', 'day_of_year',
-    'yearly_rainfall', 'monthly_rainfall', 'prev_day_rainfall',
-    'rolling_mean_7d', 'station_name_x_encoded', 'log_rainfall_sum',
-    'log_monthly_rainfall', 'log_prev_day_rainfall', 'log_rolling_mean_7d',
-    'pca_component_1', 'pca_component_2', 'pca_component_3'
-]
-required_columns = ['date', 'rainfall_sum'] + feature_columns
+# Filter data (contiguous per-station slices resolved by binary search)
+if len(date_range) == 2:
+    filtered_data = index.select(
+        selected_stations, date_range[0], date_range[1],
+        columns=['station_id'] + [col for col in required_columns if col in index.data.columns]
+    )
+else:
+    filtered_data = pd.DataFrame(columns=['station_id'] + required_columns)
 
 # Main content
 if not filtered_data.empty:
@@ -182,7 +218,7 @@ if not filtered_data.empty:
         st.warning(f"Missing columns in data: {missing_columns}. Filling with zeros.")
         for col in missing_columns:
             filtered_data[col] = 0
-    filtered_data = filtered_data[required_columns]
+    filtered_data = filtered_data[['station_id'] + required_columns]
 
     # Historical Predictions Section
     with st.container():
@@ -201,7 +237,20 @@ if not filtered_data.empty:
             model_features = getattr(reg_model, 'feature_names_in_', feature_columns)
             if not all(f in filtered_data.columns for f in model_features):
                 raise ValueError(f"Model expects features {model_features}, but data has {filtered_data.columns.tolist()}")
-            filtered_data['pred_rainfall'] = reg_model.predict(filtered_data[feature_columns])
+            # Precomputed store for the current model files first, live (memoized) inference for the rest
+            stored = load_predictions(selected_stations, (date_range[0], date_range[1]))
+            if stored is not None:
+                filtered_data['date'] = filtered_data['date'].astype('datetime64[ns]')
+                stored = stored[['station_id', 'date', 'pred_rainfall']].astype({'date': 'datetime64[ns]'})
+                filtered_data = filtered_data.merge(stored, on=['station_id', 'date'], how='left')
+                # The store keeps float32; live predictions for uncovered rows are float64
+                filtered_data['pred_rainfall'] = filtered_data['pred_rainfall'].astype('float64')
+            else:
+                filtered_data['pred_rainfall'] = np.nan
+            pending = filtered_data['pred_rainfall'].isna()
+            if pending.any():
+                filtered_data.loc[pending, 'pred_rainfall'] = \
+                    get_regression_service().predict(filtered_data[pending])['pred_rainfall']
         except Exception as e:
             st.error(f"Error generating predictions: {str(e)}")
             # Update debug path to match data_utils.py
@@ -221,8 +270,38 @@ print(model.feature_names_in_)
             y_columns = ['rainfall_sum', 'pred_rainfall'] if 'pred_rainfall' in filtered_data.columns else ['rainfall_sum']
             title = "Actual vs Predicted Rainfall" if 'pred_rainfall' in filtered_data.columns else "Actual Rainfall"
             try:
-                fig = plot_time_series(filtered_data, y_columns=y_columns, title=title)
+                # Long histories are decimated to a fixed point budget; zooming in to a
+                # window that fits the budget shows it at full resolution
+                zoom = None
+                if date_range[0] < date_range[1]:
+                    zoom = st.slider(
+                        "Zoom",
+                        min_value=date_range[0],
+                        max_value=date_range[1],
+                        value=(date_range[0], date_range[1]),
+                        format="YYYY-MM-DD",
+                        key="ts_zoom"
+                    )
+                selection = (tuple(sorted(selected_stations)), str(date_range[0]), str(date_range[1]))
+                per_station = chart_scope == "Per station"
+                chart_data = aggregate_series(
+                    filtered_data, y_columns, freq=AGGREGATION_FREQUENCIES[aggregation],
+                    per_station=per_station, cache_key=selection
+                )
+                chart_key = selection + (aggregation, chart_scope)
+                title = f"{title} ({aggregation.lower()}, {chart_scope.lower()})"
+                if per_station:
+                    fig = plot_station_facets(chart_data, y_columns=y_columns, title=title,
+                                              station_names=station_options, x_range=zoom, cache_key=chart_key)
+                else:
+                    fig = plot_time_series(chart_data, y_columns=y_columns, title=title, x_range=zoom,
+                                           cache_key=chart_key)
                 st.plotly_chart(fig, use_container_width=True)
+                shown = sum(len(trace.x) for trace in fig.data) // len(y_columns)
+                in_window = len(chart_data) if zoom is None else \
+                    int(chart_data['date'].between(pd.Timestamp(zoom[0]), pd.Timestamp(zoom[1])).sum())
+                st.caption(f"Plotting {shown:,} points per variable from {len(filtered_data):,} station-days"
+                           + ("; zoom in for full resolution." if shown < in_window else "."))
             except Exception as e:
                 st.error(f"Error plotting time series: {str(e)}")
         else:
@@ -235,58 +314,93 @@ else:
         st.markdown('</div>', unsafe_allow_html=True)
 
 # New Prediction Section
+# Model feature inputs grouped as they are shown in the form
+FEATURE_GROUPS = {
+    "Geographical Features": ['ele(meter)', 'lat(deg)', 'lon(deg)'],
+    "Temporal Features": ['year', 'month', 'day_of_year'],
+    "Rainfall Features": ['yearly_rainfall', 'monthly_rainfall', 'prev_day_rainfall', 'rolling_mean_7d'],
+    "Encoded and Transformed Features": ['station_name_x_encoded', 'log_rainfall_sum', 'log_monthly_rainfall',
+                                         'log_prev_day_rainfall', 'log_rolling_mean_7d', 'pca_component_1',
+                                         'pca_component_2', 'pca_component_3'],
+}
+
 with st.container():
     st.markdown('<div class="card" role="region" aria-label="New Prediction Section">', unsafe_allow_html=True)
     st.subheader("🔮 Make a New Prediction")
     
-    # Input form with expanders
+    # Raw readings are turned into model features by the saved transform pipeline
+    try:
+        transforms = load_feature_transforms()
+    except FileNotFoundError:
+        transforms = None
+    input_mode = "Model Features"
+    if transforms is not None:
+        input_mode = st.radio("Input Mode", ["Raw Readings", "Model Features"], horizontal=True, key="input_mode")
+    
+    if input_mode == "Model Features":
+        # Defaults are per-station (or overall) means, computed once per data version
+        default_options = ["All stations"] + display_options
+        default_choice = st.selectbox(
+            "Default Values", default_options, key="input_defaults",
+            help="Prefill the features with the mean of one station or of all stations"
+        )
+        default_station = None
+        if default_choice != "All stations":
+            default_station = list(station_options)[display_options.index(default_choice)]
+        defaults = feature_defaults(feature_columns, station=default_station)
+    
+    # Inputs are batched in a form: editing a field does not rerun the page until Predict is pressed
     input_data = {}
-    with st.expander("Geographical Features"):
-        for col in ['ele(meter)', 'lat(deg)', 'lon(deg)']:
-            input_data[col] = st.number_input(
-                f"{col}",
-                value=float(data[col].mean()) if col in data.columns else 0.0,
-                step=0.1,
-                key=f"input_{col}_{uuid.uuid4()}"
-            )
-    with st.expander("Temporal Features"):
-        for col in ['year', 'month', 'day_of_year']:
-            input_data[col] = st.number_input(
-                f"{col}",
-                value=float(data[col].mean()) if col in data.columns else 0.0,
-                step=0.1,
-                key=f"input_{col}_{uuid.uuid4()}"
-            )
-    with st.expander("Rainfall Features"):
-        for col in ['yearly_rainfall', 'monthly_rainfall', 'prev_day_rainfall', 'rolling_mean_7d']:
-            input_data[col] = st.number_input(
-                f"{col}",
-                value=float(data[col].mean()) if col in data.columns else 0.0,
-                step=0.1,
-                key=f"input_{col}_{uuid.uuid4()}"
-            )
-    with st.expander("Encoded and Transformed Features"):
-        for col in ['station_name_x_encoded', 'log_rainfall_sum', 'log_monthly_rainfall', 
-                    'log_prev_day_rainfall', 'log_rolling_mean_7d', 'pca_component_1', 
-                    'pca_component_2', 'pca_component_3']:
-            input_data[col] = st.number_input(
-                f"{col}",
-                value=float(data[col].mean()) if col in data.columns else 0.0,
-                step=0.1,
-                key=f"input_{col}_{uuid.uuid4()}"
+    raw_input = {}
+    with st.form("new_prediction_form"):
+        if input_mode == "Raw Readings":
+            raw_input['station_name_x'] = st.selectbox(
+                "Station", sorted(transforms.station_table.index.astype(str)), key="raw_station"
             )
+            raw_input['date'] = st.date_input("Date", value=index.date_max, key="raw_date")
+            with st.expander("Rainfall Readings (mm)", expanded=True):
+                # The models were trained on whole-month and whole-year totals
+                period_help = ("Total for the whole period, as in training. For a period still in "
+                               "progress only the total so far is known, and predictions are less reliable.")
+                for col, label, help_text in [
+                    ('rainfall_sum', "Rainfall on the day", None),
+                    ('prev_day_rainfall', "Rainfall on the previous day", None),
+                    ('rolling_mean_7d', "Mean rainfall over the last 7 days", None),
+                    ('monthly_rainfall', "Total rainfall of the month", period_help),
+                    ('yearly_rainfall', "Total rainfall of the year", period_help),
+                ]:
+                    raw_input[col] = st.number_input(label, value=0.0, min_value=0.0, step=0.1, key=f"raw_{col}",
+                                                     help=help_text)
+        else:
+            # Keys are stable across reruns; the defaults source is part of the key so
+            # choosing another station prefills its values
+            defaults_key = default_station if default_station is not None else 'all'
+            for group, columns in FEATURE_GROUPS.items():
+                with st.expander(group):
+                    for col in columns:
+                        input_data[col] = st.number_input(
+                            f"{col}",
+                            value=defaults.get(col, 0.0),
+                            step=0.1,
+                            key=f"input_{col}_{defaults_key}"
+                        )
+        submitted = st.form_submit_button("Predict")
     
-    if st.button("Predict", key="predict_button"):
+    if submitted:
         input_df = pd.DataFrame([input_data])
         try:
             # Verify feature compatibility
             model_features = getattr(reg_model, 'feature_names_in_', feature_columns)
-            missing_features = [f for f in model_features if f not in input_df.columns]
-            if missing_features:
-                raise ValueError(f"Input missing required features: {missing_features}")
-            reg_pred = reg_model.predict(input_df[model_features])[0]
-            clf_pred = clf_model.predict(input_df[model_features])[0]
-            clf_proba = clf_model.predict_proba(input_df[model_features])[0][1]
+            if input_mode == "Raw Readings":
+                input_df = transforms.model_features([raw_input], model_features)
+            absent_features = [f for f in model_features if f not in input_df.columns]
+            if absent_features:
+                raise ValueError(f"Input missing required features: {absent_features}")
+            # Compact tree runtime when exported (falls back to the pickled models)
+            scored = score_frame(input_df[model_features], load_compact_reg_model(), load_compact_clf_model())
+            reg_pred = scored['pred_rainfall'].iloc[0]
+            clf_pred = scored['pred_extreme'].iloc[0]
+            clf_proba = scored['pred_extreme_proba'].iloc[0]
             
             # Display predictions
             col1, col2, col3 = st.columns(3)
@@ -311,4 +425,88 @@ with open('{os.path.join(data_dir, 'best_random_forest_regressor_model.pkl')}',
     model = pickle.load(f)
 print(model.feature_names_in_)
             """)
-    st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+def score_upload(uploaded_file, batch_reg_model, batch_clf_model):
+    """Score an uploaded feature or raw-readings file chunk by chunk, reporting progress."""
+    chunks = iter_upload_chunks(uploaded_file)
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        raise ValueError("The uploaded file contains no rows.")
+    missing = missing_features(first_chunk.columns, batch_reg_model)
+    raw_upload = bool(missing) and transforms is not None and not missing_raw_inputs(first_chunk.columns)
+    if missing and not raw_upload:
+        raise ValueError(f"Uploaded file is missing required features: {missing}")
+
+    def all_chunks():
+        yield first_chunk
+        yield from chunks
+
+    if raw_upload:
+        batches = score_raw_batches(all_chunks(), transforms, batch_reg_model, batch_clf_model)
+    else:
+        batches = score_batches(all_chunks(), batch_reg_model, batch_clf_model)
+    start = time.perf_counter()
+    status = st.empty()
+    scored_chunks = []
+    n_rows = 0
+    for scored in batches:
+        scored_chunks.append(scored)
+        n_rows += len(scored)
+        status.caption(f"Scored {n_rows:,} rows...")
+    elapsed = time.perf_counter() - start
+    status.caption(f"Scored {n_rows:,} rows in {elapsed:.2f}s")
+    scored_data = pd.concat(scored_chunks, ignore_index=True)
+    return {'data': scored_data, 'csv': scored_data.to_csv(index=False).encode('utf-8'),
+            'n_rows': n_rows, 'elapsed': elapsed}
+
+
+# Batch Prediction Section
+with st.container():
+    st.markdown('<div class="card" role="region" aria-label="Batch Prediction Section">', unsafe_allow_html=True)
+    st.subheader("📤 Batch Predictions")
+    st.markdown("Upload a CSV or Parquet file with the model feature columns, or with raw readings "
+                "(station, date and rainfall inputs in mm), to score many station-days at once.")
+    uploaded_file = st.file_uploader("Feature file", type=['csv', 'parquet'], key="batch_upload")
+    if uploaded_file is not None:
+        try:
+            # Forests configured by the inference services (all cores, batched calls)
+            reg_service, clf_service = get_regression_service(), get_classification_service()
+            # Scored once per upload content, models and transforms; widget reruns reuse the result
+            transforms_hash = file_hash(os.path.join(DATA_DIR, TRANSFORMS_FILE)) if transforms is not None else None
+            upload_key = (hashlib.sha256(uploaded_file.getvalue()).hexdigest(), reg_service.model_hash,
+                          clf_service.model_hash, transforms_hash)
+            batch_result = st.session_state.get('batch_result')
+            if batch_result is None or batch_result['key'] != upload_key:
+                st.session_state.pop('batch_result', None)
+                batch_result = score_upload(uploaded_file, reg_service.model, clf_service.model)
+                batch_result['key'] = upload_key
+                st.session_state['batch_result'] = batch_result
+            else:
+                st.caption(f"Scored {batch_result['n_rows']:,} rows in {batch_result['elapsed']:.2f}s")
+            n_rows, elapsed = batch_result['n_rows'], batch_result['elapsed']
+            scored_data = batch_result['data']
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown('<div class="metric-box">', unsafe_allow_html=True)
+                st.metric("Rows Scored", f"{n_rows:,}")
+                st.markdown('</div>', unsafe_allow_html=True)
+            with col2:
+                st.markdown('<div class="metric-box">', unsafe_allow_html=True)
+                st.metric("Throughput", f"{n_rows / max(elapsed, 1e-9):,.0f} rows/sec")
+                st.markdown('</div>', unsafe_allow_html=True)
+            st.dataframe(scored_data.head(100), use_container_width=True)
+            st.download_button(
+                "Download Scored Data",
+                data=batch_result['csv'],
+                file_name="scored_predictions.csv",
+                mime="text/csv",
+                key="batch_download"
+            )
+        except Exception as e:
+            st.error(f"Batch prediction failed: {str(e)}")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+page_timer.done()
@@ -1,12 +1,23 @@
 import streamlit as st
+from utils.startup import PageTimer, lazy_import
+
+# Started before the remaining imports so they count towards the first paint
+page_timer = PageTimer("Regional Analysis")
 import pandas as pd
-import plotly.express as px
-from streamlit_folium import st_folium
-from utils.data_utils import load_regional_performance_regression, load_regional_performance_classification, load_feature_data
-from utils.visualization_utils import plot_station_map
-import folium
+from utils.data_utils import (
+    load_regional_performance_regression,
+    load_regional_performance_classification,
+    load_feature_data,
+    load_station_locations,
+    rainfall_summary
+)
+from utils.visualization_utils import station_map_html
+import streamlit.components.v1 as components
 import os
 
+# plotly.express is only imported when the first chart is drawn
+px = lazy_import('plotly.express')
+
 # Set page configuration
 st.set_page_config(page_title="Regional Analysis Dashboard", layout="centered", initial_sidebar_state="expanded")
 
@@ -92,12 +103,15 @@ st.markdown("""
 with st.container():
     st.title("📍 Regional Analysis Dashboard")
     st.markdown("Explore regression and classification performance across stations with interactive visualizations.")
+page_timer.first_paint()
 
 # Load performance data
 try:
     reg_perf = load_regional_performance_regression()
     clf_perf = load_regional_performance_classification()
-    feature_data = load_feature_data()
+    feature_data = load_feature_data(columns=['station_id', 'station_name_x', 'lat(deg)', 'lon(deg)', 'rainfall_sum'])
+    # Unscaled coordinates per station, built once (the feature columns are standardized)
+    locations_df = load_station_locations()
 except FileNotFoundError as e:
     st.error(f"Failed to load data: {str(e)}")
     st.stop()
@@ -120,16 +134,14 @@ with st.container():
     st.markdown('</div>', unsafe_allow_html=True)
 
 # Locations Data Processing
-if 'station_id' not in feature_data.columns or 'lat(deg)' not in feature_data.columns or 'lon(deg)' not in feature_data.columns:
+if locations_df.empty:
+    locations_df = None
     with st.container():
         st.markdown('<div class="card" role="region" aria-label="Error Section">', unsafe_allow_html=True)
-        missing_cols = [col for col in ['station_id', 'lat(deg)', 'lon(deg)'] if col not in feature_data.columns]
-        st.error(f"Missing required columns in feature_data: {missing_cols}")
-        st.write("Feature Data Columns:", feature_data.columns.tolist())
+        st.error("No station coordinates available. Run `python -m utils.feature_updates bootstrap` with "
+                 "--stations to save the unscaled station metadata.")
         st.markdown('</div>', unsafe_allow_html=True)
 else:
-    locations_df = feature_data[['station_id', 'station_name_x', 'lat(deg)', 'lon(deg)']].drop_duplicates().set_index('station_id')
-    
     # Debug Information Section
     with st.container():
         st.markdown('<div class="card" role="region" aria-label="Debug Information Section">', unsafe_allow_html=True)
@@ -195,31 +207,58 @@ else:
             st.warning("No classification performance data available.")
         st.markdown('</div>', unsafe_allow_html=True)
 
+# Observed Rainfall Section (aggregates read from the pre-built rainfall cube)
+with st.container():
+    st.markdown('<div class="card" role="region" aria-label="Observed Rainfall Section">', unsafe_allow_html=True)
+    st.subheader("🌧️ Observed Rainfall by Station")
+    try:
+        station_rainfall = rainfall_summary(by='station')
+        monthly_rainfall = rainfall_summary(by='month')
+    except FileNotFoundError:
+        st.info("Build the rainfall cube with `python -m utils.rainfall_cube` to see observed rainfall by station.")
+    except Exception as e:
+        st.error(f"Error loading rainfall aggregates: {str(e)}")
+    else:
+        fig_rain = px.bar(
+            station_rainfall.reset_index(),
+            x='station_id',
+            y='mean_mm',
+            title="Mean Daily Rainfall by Station (mm)",
+            color='extreme_days',
+            color_continuous_scale='Blues',
+            labels={'mean_mm': 'Mean daily rainfall (mm)', 'extreme_days': 'Days > 50 mm'}
+        )
+        fig_rain.update_layout(
+            font=dict(size=12),
+            xaxis_tickangle=45,
+            margin=dict(l=10, r=10, t=50, b=50)
+        )
+        st.plotly_chart(fig_rain, use_container_width=True)
+        fig_month = px.bar(
+            monthly_rainfall.reset_index(),
+            x='month',
+            y='mean_mm',
+            title="Mean Daily Rainfall by Month, All Stations (mm)",
+            labels={'mean_mm': 'Mean daily rainfall (mm)'}
+        )
+        fig_month.update_layout(font=dict(size=12), margin=dict(l=10, r=10, t=50, b=50))
+        st.plotly_chart(fig_month, use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
 # Station Performance Map Section
 with st.container():
     st.markdown('<div class="card" role="region" aria-label="Station Performance Map Section">', unsafe_allow_html=True)
     st.subheader("🗺️ Station Performance Map")
-    
-    # List of predefined locations (unchanged as per requirement)
-    locations_data = {
-        'Rajbiraj': {'lat': 26.5419, 'lon': 86.7567},
-        'Siraha': {'lat': 26.6397, 'lon': 86.1853},
-        'Tarahara': {'lat': 26.7056, 'lon': 87.2569},
-        'Taplejung': {'lat': 27.3540, 'lon': 87.6680}
-    }
-
-    # Create a map centered around Nepal
-    map_center = [27.5, 86.5]
-    map_fig = folium.Map(location=map_center, zoom_start=8, tiles="CartoDB Positron")
-
-    # Add markers for each station
-    for station, coords in locations_data.items():
-        folium.Marker(
-            location=[coords['lat'], coords['lon']],
-            popup=station,
-            icon=folium.Icon(color='blue', icon='cloud', icon_size=(30, 30))
-        ).add_to(map_fig)
-
-    # Show the map
-    st_folium(map_fig, width='100%', height=500, key="folium_map")
+    if locations_df is None:
+        st.warning("Station locations are not available.")
+    else:
+        map_metric = st.radio("Map Metric", ['R2', 'F1'], horizontal=True, key="map_metric")
+        map_perf = reg_perf if map_metric == 'R2' else clf_perf
+        if map_perf.empty or map_metric not in map_perf.columns:
+            st.warning(f"No {map_metric} performance data available for the map.")
+        else:
+            # Cached HTML per (metric, data hash): reruns do not rebuild the map
+            components.html(station_map_html(map_perf, locations_df, map_metric), height=500)
     st.markdown('</div>', unsafe_allow_html=True)
+
+page_timer.done()
@@ -1,9 +1,14 @@
 import os
 import streamlit as st
+from utils.startup import PageTimer, lazy_import
+
+# Started before the remaining imports so they count towards the first paint
+page_timer = PageTimer("News Insights")
 import pandas as pd
-from textblob import TextBlob
 from utils.data_utils import load_nlp_results, load_lda_topics
-import plotly.express as px
+
+# plotly.express is only imported when the first chart is drawn
+px = lazy_import('plotly.express')
 
 # Ensure working directory is correct
 os.chdir(os.path.dirname(__file__))
@@ -51,6 +56,7 @@ st.markdown("""
 with st.container():
     st.title("📰 News Insights Dashboard")
     st.markdown("Explore NLP analysis results with sentiment distribution and topic modeling.")
+page_timer.first_paint()
 
 # Load data
 try:
@@ -78,24 +84,11 @@ with st.container():
         st.warning("Expected columns not found in nlp_results.csv")
     st.markdown('</div>', unsafe_allow_html=True)
 
-# Sentiment Analysis
-def get_sentiment(text):
-    if isinstance(text, str):
-        analysis = TextBlob(text)
-        if analysis.sentiment.polarity > 0:
-            return 'Positive'
-        elif analysis.sentiment.polarity < 0:
-            return 'Negative'
-        else:
-            return 'Neutral'
-    return 'Unknown'
-
-nlp_data['sentiment'] = nlp_data['summary'].apply(get_sentiment)
-
 # Sentiment Chart
 with st.container():
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.subheader("😊 Sentiment Distribution")
+    # Precomputed by the NLP pipeline (or once per file by load_nlp_results)
     sentiment_counts = nlp_data['sentiment'].value_counts()
     fig = px.bar(
         x=sentiment_counts.index,
@@ -115,3 +108,5 @@ with st.container():
     st.subheader("🔍 Topics")
     st.markdown(f'<div class="topics-box">{topics}</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
+
+page_timer.done()
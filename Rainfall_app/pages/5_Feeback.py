@@ -1,4 +1,8 @@
 import streamlit as st
+from utils.startup import PageTimer
+
+# Started before the remaining imports so they count towards the first paint
+page_timer = PageTimer("Feedback")
 import os
 from datetime import datetime
 
@@ -98,6 +102,7 @@ st.markdown("""
 # Main content
 with st.container():
     st.title("📝 Provide Feedback")
+    page_timer.first_paint()
     st.markdown('<div class="card" role="region" aria-label="Feedback Form Section">', unsafe_allow_html=True)
     with st.form("feedback_form"):
         name = st.text_input("Name (optional)", placeholder="Enter your name (optional)", label_visibility="visible")
@@ -110,4 +115,6 @@ with st.container():
                 safe_feedback = feedback.replace(',', '').replace('\n', ' ')
                 f.write(f"{datetime.now()},{safe_name},{safe_feedback}\n")
             st.success("Thank you for your feedback!")
-    st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown('</div>', unsafe_allow_html=True)
+
+page_timer.done()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the app's utils package the way `python -m utils.X` does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,88 @@
+"""Offline runs of the news ingest stage against a local HTTP server and a stub translator."""
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from utils.news_ingest import ingest_articles
+
+PAGE = '<html><body><article><p>{}</p></article></body></html>'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.headers['Host'].split(':')[0], self.path, time.monotonic()))
+        body = PAGE.format(f'Article {self.path}').encode('utf-8')
+        etag = '"' + hashlib.sha256(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class StubTranslator:
+    def __init__(self):
+        self.calls = 0
+
+    def translate(self, text, src, dest):
+        self.calls += 1
+        return SimpleNamespace(text=f'[{dest}] {text}')
+
+
+def _article(host, port, path, language='ne'):
+    return {'url': f'http://{host}:{port}{path}', 'source': 'stub', 'date': '2024-07-01', 'language': language}
+
+
+def test_ingest_translates_and_revalidates_cached_pages(server, tmp_path):
+    port = server.server_address[1]
+    articles = [_article('127.0.0.1', port, '/a'), _article('127.0.0.1', port, '/b', language='en')]
+    translator = StubTranslator()
+
+    first = ingest_articles(articles, translator=translator, cache_dir=str(tmp_path), host_interval=0)
+    assert list(first['text']) == ['Article /a', 'Article /b']
+    assert list(first['translated_text']) == ['[en] Article /a', 'Article /b']
+    assert translator.calls == 1
+
+    # Unchanged pages come back as 304 and the translation from the cache
+    second = ingest_articles(articles, translator=translator, cache_dir=str(tmp_path), host_interval=0)
+    assert second.equals(first)
+    assert translator.calls == 1
+    assert len(server.requests) == 4
+
+
+def test_rate_limited_host_does_not_hold_download_slot(server, tmp_path):
+    port = server.server_address[1]
+    interval = 0.5
+    # 127.0.0.1 and localhost are different hosts to the rate limiter
+    articles = [_article('127.0.0.1', port, f'/slow-{i}', language='en') for i in range(3)]
+    articles.append(_article('localhost', port, '/other', language='en'))
+
+    result = ingest_articles(articles, translator=StubTranslator(), cache_dir=str(tmp_path),
+                             concurrency=1, host_interval=interval)
+    assert len(result) == 4
+    started = {path: at for _, path, at in server.requests}
+    # With one slot, the other host's download runs while 127.0.0.1 waits out its interval
+    assert started['/other'] < started['/slow-1']
+    assert started['/slow-2'] - started['/slow-1'] >= interval * 0.9
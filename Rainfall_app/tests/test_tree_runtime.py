@@ -0,0 +1,76 @@
+"""Parity of the compact tree runtime with the scikit-learn forests it was exported from."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from utils.tree_runtime import CompactForest, export_forest, flatten_forest
+
+FEATURES = ['a', 'b', 'c', 'd']
+
+
+def _training_data(missing=0.1):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, len(FEATURES)))
+    y = 3 * X[:, 0] - 2 * X[:, 1] + rng.normal(scale=0.1, size=len(X))
+    X[rng.random(X.shape) < missing] = np.nan
+    return pd.DataFrame(X, columns=FEATURES), y
+
+
+def _test_rows(n_rows, missing):
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(n_rows, len(FEATURES)))
+    X[rng.random(X.shape) < missing] = np.nan
+    return pd.DataFrame(X, columns=FEATURES)
+
+
+@pytest.fixture(scope='module')
+def regressor():
+    X, y = _training_data()
+    return RandomForestRegressor(n_estimators=15, max_depth=8, random_state=0).fit(X, y)
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    X, y = _training_data()
+    return RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(X, (y > 0).astype(int))
+
+
+def _export(model, tmp_path):
+    return CompactForest.load(export_forest(model, str(tmp_path / 'model.compact.npz')))
+
+
+@pytest.mark.parametrize('n_rows, missing', [(1, 0.0), (500, 0.0), (1, 0.5), (500, 0.3)],
+                         ids=['single-row', 'batch', 'single-row-nan', 'batch-nan'])
+def test_regressor_parity(regressor, tmp_path, n_rows, missing):
+    compact = _export(regressor, tmp_path)
+    X = _test_rows(n_rows, missing)
+    np.testing.assert_allclose(compact.predict(X), regressor.predict(X), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('n_rows, missing', [(1, 0.0), (500, 0.0), (1, 0.5), (500, 0.3)],
+                         ids=['single-row', 'batch', 'single-row-nan', 'batch-nan'])
+def test_classifier_parity(classifier, tmp_path, n_rows, missing):
+    compact = _export(classifier, tmp_path)
+    X = _test_rows(n_rows, missing)
+    np.testing.assert_allclose(compact.predict_proba(X), classifier.predict_proba(X), rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(compact.predict(X), classifier.predict(X))
+
+
+def test_export_records_parity_check(regressor, tmp_path):
+    assert _export(regressor, tmp_path).parity_rows > 0
+
+
+def test_nan_rejected_without_missing_routing(regressor):
+    arrays = flatten_forest(regressor)
+    arrays.pop('missing_left', None)
+    compact = CompactForest({**arrays, 'source_hash': np.str_('')})
+    with pytest.raises(ValueError, match='NaN'):
+        compact.predict(_test_rows(5, 0.5))
+
+
+def test_large_batches_use_the_fallback(regressor, tmp_path):
+    compact = CompactForest.load(export_forest(regressor, str(tmp_path / 'model.compact.npz')),
+                                 fallback=lambda: regressor)
+    X = _test_rows(2000, 0.1)
+    np.testing.assert_allclose(compact.predict(X), regressor.predict(X), rtol=0, atol=1e-12)
@@ -1,53 +1,503 @@
 import pandas as pd
 import os
-import pickle
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+from utils import feature_store
+from utils.station_index import StationDateIndex
 
 # Get the base directory of the Rainfall_app (parent of utils directory)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
+# Caches and logs the app and the batch jobs write at run time; ignored by git
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+
+# Saved by utils.feature_updates bootstrap; holds the unscaled station metadata
+ENGINE_STATE_FILE = 'feature_engine_state.pkl'
+# Latitude and longitude ranges that contain every Eastern Nepal station
+STATION_BOUNDS = ((26.0, 28.5), (85.5, 88.5))
+# Stations of the original static map, used when no unscaled metadata is available
+KNOWN_STATION_COORDINATES = {
+    'Rajbiraj': (26.5419, 86.7567),
+    'Siraha': (26.6397, 86.1853),
+    'Tarahara': (26.7056, 87.2569),
+    'Tarhara': (26.7056, 87.2569),
+    'Taplejung': (27.3540, 87.6680),
+}
+
+# Memory budget for the shared artifact cache (override with RAINFALL_CACHE_MB)
+CACHE_BUDGET_MB = int(os.environ.get('RAINFALL_CACHE_MB', 1024))
+
+
+class ArtifactCache:
+    """
+    Process-wide LRU cache for loaded data files and models.
+
+    Entries are keyed by name and validated against the fingerprint of the source
+    files: a changed mtime/size triggers a content hash comparison, and the entry
+    is reloaded only when the content actually changed. Entries are evicted in
+    least-recently-used order once the memory budget is exceeded. Values that
+    grow after they are cached (e.g. an InferenceService memo) report their size
+    through cache_nbytes() and are re-measured on every hit.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, loader, paths=()):
+        """Return the cached value for key, calling loader() on a miss or stale entry."""
+        stats = [_file_stat(p) for p in paths]
+        with self._lock:
+            entry = self._lookup(key, paths, stats)
+            if entry is not None:
+                return entry['value']
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Load outside the global lock so concurrent sessions only wait on the same key
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key, paths, stats)
+                if entry is not None:
+                    return entry['value']
+                self.misses += 1
+            try:
+                value = loader()
+            except BaseException:
+                with self._lock:
+                    if key not in self._entries:
+                        self._key_locks.pop(key, None)
+                raise
+            entry = {
+                'value': value,
+                'stats': stats,
+                'hashes': [file_hash(p) for p in paths],
+                'nbytes': _estimate_size(value),
+                'growing': callable(getattr(value, 'cache_nbytes', None)),
+            }
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self._evict(keep=key)
+        return value
+
+    def _lookup(self, key, paths, stats):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry['stats'] != stats:
+            # mtime/size moved: only reload if the content hash differs as well
+            hashes = [file_hash(p) for p in paths]
+            if hashes != entry['hashes']:
+                del self._entries[key]
+                self.invalidations += 1
+                return None
+            entry['stats'] = stats
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if entry['growing']:
+            entry['nbytes'] = _estimate_size(entry['value'])
+            self._evict(keep=key)
+        return entry
+
+    def _evict(self, keep=None):
+        total = sum(e['nbytes'] for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key)['nbytes']
+            # A later get() creates a fresh lock, so key locks stay bounded by the entries
+            self._key_locks.pop(key, None)
+            self.evictions += 1
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            for entry in self._entries.values():
+                if entry['growing']:
+                    entry['nbytes'] = _estimate_size(entry['value'])
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': sum(e['nbytes'] for e in self._entries.values()),
+                'budget_bytes': self.budget_bytes,
+                'keys': list(self._entries),
+            }
+
+
+_cache = ArtifactCache(CACHE_BUDGET_MB * 1024 * 1024)
+_hash_memo = {}
+
+
+def cached(key, loader, paths=()):
+    """
+    Load through the shared cache; paths are the files the value is derived from.
+
+    The returned object is shared by every session in the process, so callers
+    must copy it before mutating.
+    """
+    return _cache.get(key, loader, paths)
 
-def load_feature_data():
+
+def get_cache_stats():
+    """Return hit/miss/eviction counters and current memory use of the shared cache."""
+    return _cache.stats()
+
+
+def set_cache_budget(megabytes):
+    """Change the shared cache memory budget, evicting entries if needed."""
+    _cache.set_budget(int(megabytes * 1024 * 1024))
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def file_hash(file_path):
+    """SHA-256 of a file's content, memoized on (mtime, size)."""
+    stat = _file_stat(file_path)
+    memo = _hash_memo.get(file_path)
+    if memo is not None and memo[0] == stat:
+        return memo[1]
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    _hash_memo[file_path] = (stat, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def load_feature_data(columns=None, stations=None, date_range=None):
+    """
+    Load the feature data, preferring the Parquet feature store over the CSV.
+
+    Only the requested columns and the rows matching `stations` (station_id values)
+    and the inclusive `date_range` (start, end) are read. Requested columns that do
+    not exist in the data are skipped so callers can report them.
+    """
+    source, paths, reader = _feature_source()
+    columns = _existing_feature_columns(columns, source, paths)
+    if stations is not None:
+        stations = tuple(sorted(int(s) for s in stations))
+    if date_range is not None:
+        date_range = tuple(None if d is None else str(pd.Timestamp(d).date()) for d in date_range)
+    key = ('feature_data', columns, stations, date_range)
+    return cached(key, lambda: reader(source, columns=None if columns is None else list(columns),
+                                      stations=stations, date_range=date_range), paths)
+
+def load_station_index(columns=None):
+    """
+    Load the feature data as a StationDateIndex sorted by station then date.
+
+    'station_id', 'station_name_x' and 'date' are always included so the index can
+    resolve sidebar filters; dates are parsed once when the index is built.
+    """
+    source, paths, reader = _feature_source()
+    if columns is not None:
+        columns = ['station_id', 'station_name_x', 'date'] + list(columns)
+    columns = _existing_feature_columns(columns, source, paths)
+    return cached(('station_index', columns),
+                  lambda: StationDateIndex(reader(source, columns=None if columns is None else list(columns))),
+                  paths)
+
+def feature_data_path():
+    """Return the feature store directory, or the feature CSV if no store has been built."""
+    return _feature_source()[0]
+
+def feature_data_files():
+    """Return the files the feature data is read from (store parts, or the CSV)."""
+    return list(_feature_source()[1])
+
+def _feature_source():
+    """Return (source, files, reader) for the feature store, or the CSV if no store exists."""
+    store_dir = os.path.join(DATA_DIR, feature_store.STORE_NAME)
+    part_files = feature_store.store_files(store_dir)
+    if part_files:
+        return store_dir, part_files, feature_store.read_feature_store
     file_path = os.path.join(DATA_DIR, 'feature_engineered_data.csv')
     _check_file_exists(file_path)
-    return pd.read_csv(file_path)
+    return file_path, [file_path], feature_store.read_feature_csv_filtered
+
+def _existing_feature_columns(columns, source, paths):
+    if columns is None:
+        return None
+    existing = set(cached(('feature_columns', source), lambda: feature_store.available_columns(source), paths))
+    return tuple(col for col in dict.fromkeys(columns) if col in existing)
 
 def load_reg_model():
     file_path = os.path.join(DATA_DIR, 'best_random_forest_regressor_model.pkl')
     _check_file_exists(file_path)
-    return pd.read_pickle(file_path)
+    return cached('reg_model', lambda: pd.read_pickle(file_path), [file_path])
 
 def load_clf_model():
     file_path = os.path.join(DATA_DIR, 'best_random_forest_classifier_model.pkl')
     _check_file_exists(file_path)
-    return pd.read_pickle(file_path)
+    return cached('clf_model', lambda: pd.read_pickle(file_path), [file_path])
+
+def load_compact_reg_model():
+    """Compact runtime of the regressor if its export is current and parity-checked, else the pickled model."""
+    return _load_compact('best_random_forest_regressor_model.pkl', load_reg_model)
+
+def load_compact_clf_model():
+    """Compact runtime of the classifier if its export is current and parity-checked, else the pickled model."""
+    return _load_compact('best_random_forest_classifier_model.pkl', load_clf_model)
+
+def _load_compact(file_name, fallback):
+    from utils.tree_runtime import CompactForest, compact_path
+
+    pickle_path = os.path.join(DATA_DIR, file_name)
+    npz_path = compact_path(pickle_path)
+    if os.path.exists(npz_path) and os.path.exists(pickle_path):
+        # Large batches are handed back to the pickled model, loaded on first need
+        compact = cached(('compact', file_name), lambda: CompactForest.load(npz_path, fallback=fallback), [npz_path])
+        if compact.source_hash == file_hash(pickle_path) and compact.parity_rows > 0:
+            return compact
+    return fallback()
+
+def load_feature_transforms():
+    """Fitted FeatureTransforms (scaler, encoders, PCA) used to build features from raw inputs."""
+    from utils.transforms import TRANSFORMS_FILE, FeatureTransforms
+
+    file_path = os.path.join(DATA_DIR, TRANSFORMS_FILE)
+    _check_file_exists(file_path)
+    return cached('feature_transforms', lambda: FeatureTransforms.load(file_path), [file_path])
+
+def load_station_locations():
+    """
+    Station coordinates in degrees, one row per station of the feature data.
+
+    The feature data's lat(deg)/lon(deg) are standardized by the feature
+    engineering step, so coordinates come from unscaled station metadata: the
+    station table kept by the saved transforms, then the station metadata in the
+    feature engine state, then the feature columns themselves if they still hold
+    degrees, then KNOWN_STATION_COORDINATES by name. Stations without a location
+    inside STATION_BOUNDS are left out. Cached until those files change.
+
+    Returns:
+    - pd.DataFrame: station_name_x, lat(deg) and lon(deg), indexed by station_id.
+    """
+    from utils.transforms import TRANSFORMS_FILE
+
+    metadata = [os.path.join(DATA_DIR, name) for name in [TRANSFORMS_FILE, ENGINE_STATE_FILE]]
+    paths = feature_data_files() + [p for p in metadata if os.path.exists(p)]
+    return cached('station_locations', lambda: _station_locations(*metadata), paths)
+
+def _station_locations(transforms_path, state_path):
+    names = pd.Series(load_station_index(columns=[]).station_names, name='station_name_x')
+    names.index.name = 'station_id'
+    locations = pd.DataFrame({'station_name_x': names, 'lat(deg)': float('nan'), 'lon(deg)': float('nan')})
+
+    sources = []
+    if os.path.exists(transforms_path):
+        sources.append(getattr(pd.read_pickle(transforms_path), 'station_table', None))
+    if os.path.exists(state_path):
+        sources.append(pd.read_pickle(state_path).get('stations'))
+    sources.append(load_feature_data(columns=['station_id', 'lat(deg)', 'lon(deg)']))
+    for source in sources:
+        if source is None or not {'station_id', 'lat(deg)', 'lon(deg)'} <= set(source.columns):
+            continue
+        coords = source.groupby('station_id')[['lat(deg)', 'lon(deg)']].first().reindex(locations.index)
+        # Standardized coordinates fall far outside the region and are skipped
+        (lat_min, lat_max), (lon_min, lon_max) = STATION_BOUNDS
+        valid = coords['lat(deg)'].between(lat_min, lat_max) & coords['lon(deg)'].between(lon_min, lon_max)
+        missing = locations['lat(deg)'].isna() & valid
+        locations.loc[missing, ['lat(deg)', 'lon(deg)']] = coords.loc[missing].to_numpy()
+    known = {name.lower(): coords for name, coords in KNOWN_STATION_COORDINATES.items()}
+    for station_id in locations.index[locations['lat(deg)'].isna()]:
+        coords = known.get(str(locations.at[station_id, 'station_name_x']).strip().lower())
+        if coords is not None:
+            locations.loc[station_id, ['lat(deg)', 'lon(deg)']] = coords
+    return locations.dropna(subset=['lat(deg)', 'lon(deg)'])
+
+def load_rainfall_cube():
+    """Pre-aggregated RainfallCube; build it with `python -m utils.rainfall_cube`."""
+    from utils.rainfall_cube import RainfallCube, climatology_path, cube_path
+
+    paths = [cube_path(), climatology_path()]
+    for file_path in paths:
+        _check_file_exists(file_path)
+    return cached('rainfall_cube', RainfallCube.load, paths)
+
+def rainfall_summary(stations=None, years=None, months=None, by=('station',)):
+    """
+    Rainfall totals, day counts, maxima and extreme-day counts from the cube.
+
+    Parameters:
+    - stations (list, optional): station_id values. Defaults to all stations.
+    - years (tuple or list, optional): Inclusive (start, end) year range, or a list of years.
+    - months (list, optional): Months 1-12. Defaults to all months.
+    - by (str or tuple, optional): Dimensions to keep: 'station', 'year' and/or 'month'.
+
+    Returns:
+    - pd.DataFrame: total_mm, days, max_mm, extreme_days and mean_mm per group.
+    """
+    return load_rainfall_cube().query(stations, years, months, by)
+
+def rainfall_climatology(stations=None):
+    """Day-of-year mean, maximum and extreme-day probability over the given stations."""
+    return load_rainfall_cube().climatology_profile(stations)
+
+def feature_defaults(columns, station=None, statistic='mean'):
+    """
+    Default values of feature inputs: the mean or median of each column.
+
+    The per-station and overall statistics are computed in one pass over the
+    requested columns and cached until the feature data changes, so forms do
+    not rescan the dataset on every rerun.
+
+    Parameters:
+    - columns (list): Feature columns.
+    - station (int, optional): station_id to take the statistics of. Defaults to all stations.
+    - statistic (str, optional): 'mean' or 'median'.
+
+    Returns:
+    - dict: column -> float for the columns present in the data.
+    """
+    if statistic not in ('mean', 'median'):
+        raise ValueError(f"Unknown statistic: {statistic}")
+    source, paths, reader = _feature_source()
+    columns = _existing_feature_columns(columns, source, paths)
+
+    def compute():
+        frame = reader(source, columns=['station_id'] + [col for col in columns if col != 'station_id'])
+        values = frame[list(columns)].apply(pd.to_numeric, errors='coerce')
+        per_station = getattr(values.groupby(frame['station_id']), statistic)()
+        return getattr(values, statistic)(), per_station
+
+    overall, per_station = cached(('feature_defaults', columns, statistic), compute, paths)
+    if station is not None and station in per_station.index:
+        values = per_station.loc[station]
+    else:
+        values = overall
+    return {col: float(value) for col, value in values.items() if pd.notna(value)}
 
 def load_nlp_results():
+    """
+    NLP results with their sentiment columns.
+
+    Files written by utils.nlp_pipeline carry sentiment and sentiment_polarity;
+    older files get them computed here, once per file version.
+    """
     file_path = os.path.join(DATA_DIR, 'nlp_results.csv')
     _check_file_exists(file_path)
-    return pd.read_csv(file_path)
+    return cached('nlp_results', lambda: _read_nlp_results(file_path), [file_path])
 
 def load_lda_topics():
     file_path = os.path.join(DATA_DIR, 'lda_topics.txt')
     _check_file_exists(file_path)
-    with open(file_path, 'r') as f:
-        return f.read()
+    return cached('lda_topics', lambda: _read_text(file_path), [file_path])
 
 def load_regional_performance_regression():
     file_path = os.path.join(DATA_DIR, 'regional_performance_regression.csv')
     _check_file_exists(file_path)
-    return pd.read_csv(file_path, index_col='station_id')
+    return cached('regional_performance_regression',
+                  lambda: pd.read_csv(file_path, index_col='station_id'), [file_path])
 
 def load_regional_performance_classification():
     file_path = os.path.join(DATA_DIR, 'regional_performance_classification.csv')
     _check_file_exists(file_path)
-    return pd.read_csv(file_path, index_col='station_id')
+    return cached('regional_performance_classification',
+                  lambda: pd.read_csv(file_path, index_col='station_id'), [file_path])
 
 def load_model_evaluation_results():
     file_path = os.path.join(DATA_DIR, 'model_evaluation_results.csv')
     _check_file_exists(file_path)
-    return pd.read_csv(file_path)
+    return cached('model_evaluation_results', lambda: pd.read_csv(file_path), [file_path])
+
+def _read_nlp_results(file_path):
+    data = pd.read_csv(file_path)
+    if 'sentiment' not in data.columns and 'summary' in data.columns:
+        from utils.nlp_pipeline import summary_sentiment
+        data['sentiment_polarity'], data['sentiment'] = summary_sentiment(data['summary'])
+    return data
+
+def _read_text(file_path):
+    with open(file_path, 'r') as f:
+        return f.read()
+
+def _file_stat(file_path):
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _estimate_size(value, _seen=None):
+    """
+    Approximate in-memory size of a cached value, in bytes.
+
+    Walks the object: NumPy arrays count their buffer (shared buffers once),
+    pandas objects their deep memory usage, containers and plain objects the
+    sum of their contents. Extension objects without a __dict__ (e.g. the
+    scikit-learn trees of a forest) are measured through their pickled state.
+    Objects with a cache_nbytes() method report their own size.
+    """
+    import numpy as np
+
+    # Maps id to the object itself, so temporary states stay alive and ids are not reused
+    seen = {} if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen[id(value)] = value
+    if callable(getattr(value, 'cache_nbytes', None)):
+        # The value measures itself, e.g. without a model that is cached on its own
+        return int(value.cache_nbytes())
+    if isinstance(value, np.ndarray):
+        base = value
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        if base is not value:
+            if id(base) in seen:
+                return 0
+            seen[id(base)] = base
+        return int(base.nbytes)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (str, bytes, bytearray, int, float, bool, type(None))):
+        return sys.getsizeof(value)
+    if hasattr(value, 'nbytes') and isinstance(getattr(value, 'nbytes'), int):
+        # pyarrow tables and arrays
+        return int(value.nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        return size + sum(_estimate_size(k, seen) + _estimate_size(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(_estimate_size(item, seen) for item in value)
+    state = getattr(value, '__dict__', None)
+    if state is None:
+        try:
+            state = value.__getstate__()
+        except Exception:
+            state = None
+    if isinstance(state, dict):
+        size += sum(_estimate_size(v, seen) for v in state.values())
+    for slot in getattr(type(value), '__slots__', ()):
+        if isinstance(slot, str) and hasattr(value, slot):
+            size += _estimate_size(getattr(value, slot), seen)
+    return size
 
 def _check_file_exists(file_path):
     """Helper function to check if a file exists and raise a descriptive error if not."""
     if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found at: {file_path}")
\ No newline at end of file
+        raise FileNotFoundError(f"File not found at: {file_path}")
@@ -0,0 +1,188 @@
+"""
+Vectorized per-group evaluation of the rainfall models.
+
+Model_Evaluation_and_Validation.ipynb computes regional and yearly metrics
+with groupby(...).apply(), calling the sklearn metric functions once per group
+in Python. Here every group is evaluated in one pass: rows are mapped to dense
+group ids and the error sums, squared errors and confusion counts are reduced
+per id with np.bincount. The results match sklearn's mean_absolute_error,
+mean_squared_error, r2_score, accuracy_score and precision/recall/f1_score
+(zero_division=0), including their edge cases, for any combination of group
+keys (station, year, month, district, ...).
+
+Usage (from the Rainfall_app directory):
+    python -m utils.evaluation                     # rewrite the performance CSVs
+    python -m utils.evaluation --by district_x month
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+REGRESSION_METRICS = ['MAE', 'RMSE', 'R2']
+CLASSIFICATION_METRICS = ['Accuracy', 'Precision', 'Recall', 'F1']
+
+
+def group_ids(frame, by):
+    """
+    Map rows to dense group ids.
+
+    Parameters:
+    - frame (pd.DataFrame): Rows to group.
+    - by (str or list): Group key column(s).
+
+    Returns:
+    - tuple: (ids array, pd.Index of group keys in sorted order).
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    if len(by) == 1:
+        ids, keys = pd.factorize(frame[by[0]], sort=True, use_na_sentinel=False)
+        return ids, pd.Index(keys, name=by[0])
+    # Factorize each key, then the combined integer codes (cheaper than tuples)
+    codes, levels = zip(*(pd.factorize(frame[col], sort=True, use_na_sentinel=False) for col in by))
+    shape = [len(level) for level in levels]
+    ids, combined = pd.factorize(np.ravel_multi_index(codes, shape), sort=True)
+    keys = pd.MultiIndex(levels=levels, codes=np.unravel_index(combined, shape), names=by)
+    return ids, keys
+
+
+def regression_metrics(y_true, y_pred, ids, n_groups):
+    """
+    MAE, RMSE and R2 for every group id.
+
+    R2 follows r2_score: NaN for groups with fewer than two rows, and 1.0 or 0.0
+    for groups with a constant target depending on whether predictions are exact.
+
+    Returns:
+    - pd.DataFrame: One row per group id with the REGRESSION_METRICS columns.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    err = y_true - np.asarray(y_pred, dtype=np.float64)
+    n = np.bincount(ids, minlength=n_groups).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mae = np.bincount(ids, np.abs(err), minlength=n_groups) / n
+        ss_res = np.bincount(ids, err * err, minlength=n_groups)
+        mean = np.bincount(ids, y_true, minlength=n_groups) / n
+        dev = y_true - mean[ids]
+        ss_tot = np.bincount(ids, dev * dev, minlength=n_groups)
+        r2 = 1 - ss_res / ss_tot
+    r2 = np.where(ss_tot == 0, np.where(ss_res == 0, 1.0, 0.0), r2)
+    r2 = np.where(n < 2, np.nan, r2)
+    return pd.DataFrame({'MAE': mae, 'RMSE': np.sqrt(ss_res / n), 'R2': r2})
+
+
+def classification_metrics(y_true, y_pred, ids, n_groups, pos_label=1):
+    """
+    Accuracy, precision, recall and F1 for every group id from confusion counts.
+
+    Returns:
+    - pd.DataFrame: One row per group id with the CLASSIFICATION_METRICS columns.
+    """
+    y_true = np.asarray(y_true) == pos_label
+    y_pred = np.asarray(y_pred) == pos_label
+
+    def count(mask):
+        return np.bincount(ids[mask], minlength=n_groups).astype(np.float64)
+
+    n = np.bincount(ids, minlength=n_groups).astype(np.float64)
+    tp = count(y_true & y_pred)
+    fp = count(~y_true & y_pred)
+    fn = count(y_true & ~y_pred)
+    correct = count(y_true == y_pred)
+
+    def ratio(num, den):
+        # zero_division=0
+        return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+    return pd.DataFrame({
+        'Accuracy': ratio(correct, n),
+        'Precision': ratio(tp, tp + fp),
+        'Recall': ratio(tp, tp + fn),
+        'F1': ratio(2 * tp, 2 * tp + fp + fn),
+    })
+
+
+def evaluate_groups(frame, by, task='regression', y_true=None, y_pred=None):
+    """
+    Evaluate predictions for every group of frame in one pass.
+
+    Parameters:
+    - frame (pd.DataFrame): Rows with the target, the prediction and the group keys.
+    - by (str or list): Group key column(s), e.g. 'station_id' or ['district_x', 'month'].
+    - task (str, optional): 'regression' or 'classification'.
+    - y_true, y_pred (str, optional): Target and prediction columns. Default to
+      rainfall_sum/pred_rainfall or extreme_rainfall/pred_extreme.
+
+    Returns:
+    - pd.DataFrame: Metrics indexed by the group keys.
+    """
+    if task == 'regression':
+        y_true, y_pred = y_true or 'rainfall_sum', y_pred or 'pred_rainfall'
+    else:
+        y_true, y_pred = y_true or 'extreme_rainfall', y_pred or 'pred_extreme'
+    ids, keys = group_ids(frame, by)
+    metrics = regression_metrics if task == 'regression' else classification_metrics
+    result = metrics(frame[y_true].to_numpy(), frame[y_pred].to_numpy(), ids, len(keys))
+    result.index = keys
+    return result
+
+
+def validation_predictions(validation_fraction=0.2):
+    """
+    Validation rows (the most recent validation_fraction, split by date) with both models' predictions.
+
+    Bulk scoring goes through the sklearn forests of the InferenceServices
+    (chunked, on all cores) rather than the compact runtime, which is built for
+    small requests. predict_array() leaves the services' memo untouched.
+
+    Returns:
+    - pd.DataFrame: Feature data with pred_rainfall, pred_extreme and pred_extreme_proba.
+    """
+    from utils import data_utils
+    from utils.inference import get_classification_service, get_regression_service
+    from utils.training import split_boundary
+
+    boundary = split_boundary(validation_fraction)
+    data = data_utils.load_feature_data(date_range=(boundary, None))
+    reg_service, clf_service = get_regression_service(), get_classification_service()
+    scored = data.copy()
+    scored['pred_rainfall'] = reg_service.predict_array(data)[:, 0]
+    classified = clf_service.predict_array(data)
+    scored['pred_extreme'] = classified[:, 0].astype(np.asarray(clf_service.model.classes_).dtype)
+    scored['pred_extreme_proba'] = classified[:, 1]
+    return scored
+
+
+def main():
+    from utils import data_utils
+
+    parser = argparse.ArgumentParser(description="Per-group evaluation of the rainfall models.")
+    parser.add_argument('--by', nargs='+', default=None,
+                        help="Group key columns; by default the regional and yearly CSVs are rewritten")
+    parser.add_argument('--output', default=None, help="CSV path for a custom --by grouping")
+    args = parser.parse_args()
+
+    val_data = validation_predictions()
+    val_data['year'] = pd.to_datetime(val_data['date']).dt.year
+    if args.by:
+        result = evaluate_groups(val_data, args.by, 'regression').join(
+            evaluate_groups(val_data, args.by, 'classification'))
+        print(result.to_string())
+        if args.output:
+            result.to_csv(args.output)
+        return
+
+    outputs = {
+        'regional_performance_regression.csv': evaluate_groups(val_data, 'station_id', 'regression'),
+        'regional_performance_classification.csv': evaluate_groups(val_data, 'station_id', 'classification'),
+        'yearly_performance_regression.csv': evaluate_groups(val_data, 'year', 'regression'),
+    }
+    for name, result in outputs.items():
+        path = os.path.join(data_utils.DATA_DIR, name)
+        result.to_csv(path)
+        print(f"Wrote {len(result)} groups to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Streaming feature engineering for the rainfall data.
+
+Reproduces the preprocessing.ipynb cleaning/merge steps and the
+create_new_features step of feature_engineering.ipynb without loading the
+whole history. Raw rainfall_data.csv is read in chunks; each station keeps a
+small rolling state (last six readings for the 7-day mean, the previous day's
+value and the rows of its current year), and feature rows are emitted as soon
+as a station's year is complete, because yearly_rainfall and monthly_rainfall
+are totals over the whole period. Memory is bounded by one chunk plus at most
+one year of rows per station.
+
+For daily updates, append() takes new (station_id, date, rainfall_sum)
+records and returns the rows of the station-years they close, with final
+totals. Rows of still-open years stay in the state; open_features() returns
+all of them with period-to-date yearly/monthly totals, so a caller can store
+them in a part it rewrites on every append until the year closes.
+
+Each station's rows must arrive in date order (stations may interleave).
+Concatenating the emitted frames and sorting by station_name_x and date gives
+the notebook output, with rolling means equal to within floating point
+rounding.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.feature_engineering ../Data/Raw/rainfall_data.csv \
+        --stations "../Data/Raw/Eastern Data.csv" --output features.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+ROLLING_WINDOW = 7
+EXTREME_RAINFALL_MM = 50
+NEW_FEATURES = [
+    'yearly_rainfall', 'monthly_rainfall', 'extreme_rainfall',
+    'prev_day_rainfall', 'rolling_mean_7d', 'day_of_year'
+]
+
+
+def normalize_rainfall(chunk):
+    """
+    Apply the preprocessing notebook's cleaning to a chunk of raw rainfall rows.
+
+    Fills missing rainfall with 0, standardizes column names and renames
+    index_no/station to station_id/station_name.
+    """
+    if 'rainfall_sum' not in chunk.columns:
+        raise ValueError("Column 'rainfall_sum' not found in rainfall data")
+    chunk = chunk.copy()
+    chunk['rainfall_sum'] = chunk['rainfall_sum'].fillna(0)
+    chunk.columns = chunk.columns.str.strip().str.lower().str.replace(' ', '_')
+    return chunk.rename(columns={'index_no': 'station_id', 'station': 'station_name'})
+
+
+def load_stations(stations_path):
+    """Load and clean the station metadata (Eastern Data.csv) as in the preprocessing notebook."""
+    stations = pd.read_csv(stations_path)
+    if 'Index No.' not in stations.columns:
+        raise ValueError("Column 'Index No.' not found in stations data")
+    stations = stations.dropna(subset=['Index No.']).drop_duplicates()
+    stations.columns = stations.columns.str.strip().str.lower().str.replace(' ', '_').str.replace('.', '_')
+    return stations.rename(columns={
+        'index_no_': 'station_id',
+        'ele': 'elevation',
+        'lat': 'latitude',
+        'lon': 'longitude'
+    })
+
+
+def merge_stations(rainfall, stations):
+    """Merge station metadata and create the date column, dropping rows with invalid dates."""
+    if stations is not None:
+        merged = pd.merge(rainfall, stations, on='station_id', how='left')
+    else:
+        merged = rainfall.rename(columns={'station_name': 'station_name_x', 'district': 'district_x'})
+    merged['date'] = pd.to_datetime(merged[['year', 'month', 'days']], errors='coerce')
+    merged = merged.dropna(subset=['date'])
+    merged['month'] = merged['date'].dt.month
+    merged['year'] = merged['date'].dt.year
+    return merged
+
+
+class _StationState:
+    """Rolling state of one station between chunks."""
+
+    def __init__(self):
+        self.tail = np.empty(0, dtype=np.float64)
+        self.last_date = None
+        self.open_rows = []
+        self.emitted = 0
+        self.seen = set()
+
+    def to_dict(self):
+        return {
+            'tail': self.tail.tolist(),
+            'last_date': None if self.last_date is None else str(self.last_date),
+            'open_rows': pd.concat(self.open_rows) if self.open_rows else None,
+            'emitted': self.emitted,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls()
+        obj.tail = np.asarray(state['tail'], dtype=np.float64)
+        obj.last_date = None if state['last_date'] is None else pd.Timestamp(state['last_date'])
+        if state['open_rows'] is not None:
+            obj.open_rows = [state['open_rows']]
+        obj.emitted = state.get('emitted', 0)
+        return obj
+
+
+class FeatureEngine:
+    """
+    Incremental equivalent of create_new_features.
+
+    Parameters:
+    - stations (pd.DataFrame, optional): Cleaned station metadata from load_stations().
+      Without it the output carries only the rainfall columns.
+    """
+
+    def __init__(self, stations=None):
+        self.stations = stations
+        self._states = {}
+        self._raw_columns = None
+        # Last raw row per station_id, used to expand append() records into raw rows
+        self._profiles = {}
+
+    def process(self, chunk):
+        """
+        Consume a chunk of raw rainfall rows.
+
+        Parameters:
+        - chunk (pd.DataFrame): Rows of rainfall_data.csv.
+
+        Returns:
+        - pd.DataFrame: Feature rows for every station-year completed by this chunk.
+        """
+        chunk = normalize_rainfall(chunk)
+        if self._raw_columns is None:
+            self._raw_columns = list(chunk.columns)
+        # drop_duplicates in the notebook runs on the raw rainfall rows
+        chunk = chunk.drop_duplicates()
+        if 'station_id' in chunk.columns:
+            for row in chunk.drop_duplicates('station_id', keep='last').to_dict('records'):
+                self._profiles[row['station_id']] = row
+        merged = merge_stations(chunk, self.stations)
+        merged = merged.sort_values(['station_name_x', 'date'], kind='stable')
+        frames = []
+        for name, rows in merged.groupby('station_name_x', sort=False):
+            frames.extend(self._advance(name, rows))
+        return self._emit(frames)
+
+    def append(self, records):
+        """
+        Add new daily observations of known stations to the state.
+
+        Parameters:
+        - records (pd.DataFrame or list of dict): 'station_id', 'date' and 'rainfall_sum'.
+
+        Returns:
+        - pd.DataFrame: Feature rows of the station-years these records close, with
+          final totals. Rows of open years are returned by open_features().
+        """
+        records = pd.DataFrame(records)
+        missing = [col for col in ['station_id', 'date', 'rainfall_sum'] if col not in records.columns]
+        if missing:
+            raise ValueError(f"Missing columns in new records: {missing}")
+        unknown = sorted(set(records['station_id']) - set(self._profiles))
+        if unknown:
+            raise ValueError(f"Unknown station_id values (not in the engine state): {unknown}")
+        raw = pd.DataFrame([self._profiles[sid] for sid in records['station_id']])
+        dates = pd.to_datetime(records['date']).reset_index(drop=True)
+        raw['year'] = dates.dt.year
+        raw['month'] = dates.dt.month
+        raw['days'] = dates.dt.day
+        raw['rainfall_sum'] = records['rainfall_sum'].to_numpy()
+        return self.process(raw[self._raw_columns])
+
+    def open_features(self):
+        """
+        Feature rows of every open station-year, with period-to-date totals.
+
+        The rows stay in the state and are returned again, with updated totals,
+        until a later year closes them.
+        """
+        frames = []
+        for state in self._states.values():
+            if state.open_rows:
+                pending = pd.concat(state.open_rows)
+                state.open_rows = [pending]
+                # Rows emitted as open by older versions are already stored elsewhere
+                frames.append(self._finalize(pending).iloc[state.emitted:])
+        return self._emit(frames)
+
+    def open_row_count(self):
+        """Number of rows held in open station-years."""
+        return sum(len(rows) for state in self._states.values() for rows in state.open_rows)
+
+    def flush(self):
+        """Emit the rows of every open station-year (call once the input is exhausted)."""
+        finished = []
+        for state in self._states.values():
+            if state.open_rows:
+                finished.append(self._finalize(pd.concat(state.open_rows)).iloc[state.emitted:])
+                state.open_rows = []
+                state.emitted = 0
+                state.seen = set()
+        return self._emit(finished)
+
+    def _advance(self, name, rows):
+        state = self._states.setdefault(name, _StationState())
+        keys = self._row_keys(rows)
+        keep = np.array([key not in state.seen for key in keys], dtype=bool)
+        rows = rows[keep]
+        state.seen.update(key for key, kept in zip(keys, keep) if kept)
+        if rows.empty:
+            return []
+        if state.last_date is not None and rows['date'].iloc[0] < state.last_date:
+            raise ValueError(
+                f"Rows for station {name!r} are not in date order: "
+                f"{rows['date'].iloc[0].date()} after {state.last_date.date()}"
+            )
+
+        values = rows['rainfall_sum'].to_numpy(dtype=np.float64)
+        history = np.concatenate([state.tail, values])
+        rows = rows.copy()
+        rows['extreme_rainfall'] = (rows['rainfall_sum'] > EXTREME_RAINFALL_MM).astype(int)
+        # shift(1) within the station, first reading filled with 0
+        first_previous = state.tail[-1:] if len(state.tail) else [0.0]
+        rows['prev_day_rainfall'] = np.concatenate([first_previous, values[:-1]])
+        rolling = pd.Series(history).rolling(window=ROLLING_WINDOW, min_periods=1).mean()
+        rows['rolling_mean_7d'] = rolling.to_numpy()[len(state.tail):]
+        rows['day_of_year'] = rows['date'].dt.dayofyear
+        state.tail = history[-(ROLLING_WINDOW - 1):]
+        state.last_date = rows['date'].iloc[-1]
+
+        state.open_rows.append(rows)
+        latest_year = rows['year'].iloc[-1]
+        frames = []
+        if state.open_rows[0]['year'].iloc[0] != latest_year:
+            pending = pd.concat(state.open_rows)
+            closed = (pending['year'] < latest_year).to_numpy()
+            # Rows emitted with period-to-date totals by older versions are a prefix of the closed rows
+            frames.append(self._finalize(pending[closed]).iloc[state.emitted:])
+            state.emitted = max(0, state.emitted - int(closed.sum()))
+            state.open_rows = [pending[~closed]]
+            # Duplicates can only share a date, so keys of closed years are no longer needed
+            state.seen = set(self._row_keys(state.open_rows[0]))
+        return frames
+
+    def _row_keys(self, rows):
+        """Hashable raw-row keys with NaN normalized, matching drop_duplicates semantics."""
+        key_cols = [col for col in self._raw_columns if col in rows.columns]
+        keys = rows[key_cols].astype(object)
+        keys = keys.where(keys.notna(), None)
+        return list(keys.itertuples(index=False, name=None))
+
+    @staticmethod
+    def _finalize(rows):
+        """Attach the period totals to rows whose station-years are complete."""
+        rows = rows.copy()
+        rows['yearly_rainfall'] = rows.groupby(['station_name_x', 'year'])['rainfall_sum'].transform('sum')
+        rows['monthly_rainfall'] = rows.groupby(['station_name_x', 'year', 'month'])['rainfall_sum'].transform('sum')
+        base = [col for col in rows.columns if col not in NEW_FEATURES]
+        return rows[base + NEW_FEATURES]
+
+    @staticmethod
+    def _emit(frames):
+        frames = [frame for frame in frames if frame is not None and len(frame)]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames)
+
+    def state_dict(self):
+        """Return the per-station rolling state so processing can resume later."""
+        return {
+            'raw_columns': self._raw_columns,
+            'profiles': self._profiles,
+            'stations': {name: state.to_dict() for name, state in self._states.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state, stations=None):
+        """Rebuild an engine from state_dict() output."""
+        engine = cls(stations)
+        engine._raw_columns = state['raw_columns']
+        engine._profiles = state.get('profiles', {})
+        engine._states = {name: _StationState.from_dict(s) for name, s in state['stations'].items()}
+        for station in engine._states.values():
+            if station.open_rows:
+                station.seen = set(engine._row_keys(station.open_rows[0]))
+        return engine
+
+
+def stream_features(rainfall_path, stations_path=None, chunksize=100000, engine=None):
+    """
+    Yield feature frames for a raw rainfall CSV, one chunk at a time.
+
+    Parameters:
+    - rainfall_path (str): Path to rainfall_data.csv.
+    - stations_path (str, optional): Path to Eastern Data.csv for the station merge.
+    - chunksize (int, optional): Raw rows read per chunk.
+    - engine (FeatureEngine, optional): Engine to continue from; a new one by default.
+
+    Yields:
+    - pd.DataFrame: Completed feature rows (empty chunks are skipped).
+    """
+    if engine is None:
+        stations = load_stations(stations_path) if stations_path else None
+        engine = FeatureEngine(stations)
+    for chunk in pd.read_csv(rainfall_path, chunksize=chunksize):
+        features = engine.process(chunk)
+        if len(features):
+            yield features
+    features = engine.flush()
+    if len(features):
+        yield features
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream raw rainfall data into engineered features.")
+    parser.add_argument('rainfall', help="Path to rainfall_data.csv")
+    parser.add_argument('--stations', default=None, help="Path to Eastern Data.csv")
+    parser.add_argument('--output', required=True, help="Output CSV path")
+    parser.add_argument('--chunksize', type=int, default=100000, help="Raw rows per chunk")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    total = 0
+    for features in stream_features(args.rainfall, args.stations, args.chunksize):
+        features.to_csv(args.output, mode='a', header=total == 0, index=False)
+        total += len(features)
+    print(f"Wrote {total} feature rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
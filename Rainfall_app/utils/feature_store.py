@@ -0,0 +1,401 @@
+"""
+Columnar storage for the feature-engineered dataset.
+
+Converts feature_engineered_data.csv into a Parquet store with explicit dtypes:
+float32 for measurements and engineered features (the random forests evaluate
+splits in float32, so predictions are unchanged), small integers for calendar
+fields, categoricals for the repeated station/district strings and datetime64
+for `date`. Rows are sorted by station then date so each row group covers a
+narrow station/date range.
+
+Numbered parts (part-00000.parquet, ...) are written once. Rows of station-years
+that are still open, whose yearly/monthly totals change with every new
+reading, live in part-open.parquet, which each daily append rewrites
+(see utils.feature_updates).
+
+Usage (from the Rainfall_app directory):
+    python -m utils.feature_store              # build data/feature_store/
+    python -m utils.feature_store --benchmark  # compare CSV and store loads
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+STORE_NAME = 'feature_store'
+ROW_GROUP_SIZE = 16384
+# Part holding the rows of open station-years; replaced on every append
+OPEN_PART = 'open'
+
+CATEGORICAL_COLUMNS = [
+    'station_name_x', 'district_x', 'station_name_y', 'basin_office',
+    'types_of_station', 'district_y', 'unnamed:_9_y'
+]
+
+INTEGER_COLUMNS = {
+    'gsid': 'int32',
+    'station_id': 'int32',
+    'year': 'int16',
+    'month': 'int8',
+    'days': 'int8',
+    'day_of_year': 'int16',
+    'extreme_rainfall': 'int8',
+    'station_name_x_encoded': 'int16',
+    'district_encoded': 'int16',
+}
+
+
+def read_feature_csv(csv_path, **read_csv_kwargs):
+    """
+    Read the feature CSV and apply the store dtypes.
+
+    Parameters:
+    - csv_path (str or file-like): Path to feature_engineered_data.csv.
+    - read_csv_kwargs: Passed through to pd.read_csv (e.g. usecols).
+
+    Returns:
+    - pd.DataFrame: The typed feature data.
+    """
+    frame = pd.read_csv(csv_path, low_memory=False, **read_csv_kwargs)
+    return apply_feature_dtypes(frame)
+
+
+def apply_feature_dtypes(frame):
+    """
+    Convert feature data columns to their compact storage dtypes in place.
+
+    Integer columns only keep a small integer dtype when they hold integers
+    (e.g. day_of_year is standardized by the notebook); columns with missing or
+    scaled values and unknown columns fall back to float32 (numeric) or category
+    (text) so that ingest never fails on new data.
+
+    Parameters:
+    - frame (pd.DataFrame): Feature data as read from CSV.
+
+    Returns:
+    - pd.DataFrame: The same dataframe with converted dtypes.
+    """
+    for col in frame.columns:
+        series = frame[col]
+        if col == 'date':
+            frame[col] = pd.to_datetime(series)
+        elif col in INTEGER_COLUMNS and pd.api.types.is_integer_dtype(series):
+            frame[col] = series.astype(INTEGER_COLUMNS[col])
+        elif col in CATEGORICAL_COLUMNS or pd.api.types.is_string_dtype(series):
+            frame[col] = series.astype('category')
+        elif pd.api.types.is_float_dtype(series) or pd.api.types.is_integer_dtype(series):
+            frame[col] = series.astype(np.float32)
+    return frame
+
+
+def store_files(store_dir):
+    """Return the sorted list of Parquet part files in a store directory."""
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(
+        os.path.join(store_dir, name) for name in os.listdir(store_dir)
+        if name.endswith('.parquet')
+    )
+
+
+def part_path(store_dir, part):
+    """Path of a store part: a part number, or OPEN_PART."""
+    name = f'part-{part}.parquet' if part == OPEN_PART else f'part-{part:05d}.parquet'
+    return os.path.join(store_dir, name)
+
+
+def write_feature_store(frame, store_dir, part=0, row_group_size=ROW_GROUP_SIZE):
+    """
+    Write a typed feature dataframe as one Parquet part of the store.
+
+    Parameters:
+    - frame (pd.DataFrame): Feature data (dtypes are applied if still raw).
+    - store_dir (str): Store directory, created if needed.
+    - part (int or str, optional): Part number used in the file name, or OPEN_PART. Defaults to 0.
+    - row_group_size (int, optional): Rows per Parquet row group.
+
+    Returns:
+    - str: Path of the written part file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    frame = apply_feature_dtypes(frame)
+    sort_cols = [col for col in ['station_id', 'date'] if col in frame.columns]
+    if sort_cols:
+        frame = frame.sort_values(sort_cols, kind='stable')
+    os.makedirs(store_dir, exist_ok=True)
+    path = part_path(store_dir, part)
+    tmp_path = path + '.tmp'
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    pq.write_table(table, tmp_path, row_group_size=row_group_size, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+
+def append_feature_rows(frame, store_dir, part):
+    """
+    Write new feature rows as an additional part cast to the store's existing schema.
+
+    Parameters:
+    - frame (pd.DataFrame): Feature rows with the same columns as the store.
+    - store_dir (str): Existing store directory.
+    - part (int or str): Part number, or OPEN_PART; rewriting the same part replaces it.
+
+    Returns:
+    - str: Path of the written part file, or of the removed part when frame is empty.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = part_path(store_dir, part)
+    if frame.empty:
+        # E.g. no open station-years are left
+        if os.path.exists(path):
+            os.remove(path)
+        return path
+    files = [f for f in store_files(store_dir) if f != path]
+    if not files:
+        raise FileNotFoundError(f"No Parquet files found in: {store_dir}")
+    schema = pq.read_schema(files[0])
+    frame = apply_feature_dtypes(frame.copy())[schema.names]
+    frame = frame.sort_values(['station_id', 'date'], kind='stable')
+    tmp_path = path + '.tmp'
+    table = pa.Table.from_pandas(frame, preserve_index=False).cast(schema)
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_feature_store(store_dir, columns=None, stations=None, date_range=None):
+    """
+    Load the feature store into a dataframe, reading only what is requested.
+
+    Column projection and the station/date predicates are pushed down to the
+    Parquet reader, so row groups whose statistics fall outside the filter are
+    skipped without being decoded.
+
+    Parameters:
+    - store_dir (str): Store directory.
+    - columns (list, optional): Columns to read. Defaults to all columns.
+    - stations (list, optional): station_id values to keep. Defaults to all stations.
+    - date_range (tuple, optional): Inclusive (start, end) dates; either end may be None.
+
+    Returns:
+    - pd.DataFrame: The feature data.
+    """
+    import pyarrow.dataset as ds
+
+    files = store_files(store_dir)
+    if not files:
+        raise FileNotFoundError(f"No Parquet files found in: {store_dir}")
+    dataset = ds.dataset(files, format='parquet')
+    table = dataset.to_table(columns=columns, filter=_dataset_filter(stations, date_range))
+    return table.to_pandas()
+
+
+def iter_feature_batches(path, columns, date_range=None, batch_size=ROW_GROUP_SIZE * 8, shuffle_seed=None):
+    """
+    Stream feature rows as dataframes of at most batch_size rows.
+
+    The store is read batch by batch with the date predicate pushed down; a CSV
+    source is read in chunks and filtered per chunk. Either way memory stays
+    bounded by one batch.
+
+    Parameters:
+    - path (str): Store directory or feature CSV.
+    - columns (list): Columns to read.
+    - date_range (tuple, optional): Inclusive (start, end) dates; either end may be None.
+    - batch_size (int, optional): Maximum rows per batch.
+    - shuffle_seed (int, optional): Read the store's row groups in a random order drawn
+      with this seed instead of storage order (station, then date). Each batch then
+      holds one row group. Ignored for a CSV source.
+
+    Yields:
+    - pd.DataFrame: Batches in storage order, or in shuffled row-group order.
+    """
+    if os.path.isdir(path):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(store_files(path), format='parquet')
+        row_filter = _dataset_filter(None, date_range)
+        if shuffle_seed is None:
+            batches = dataset.to_batches(columns=list(columns), filter=row_filter, batch_size=batch_size)
+        else:
+            # Row-group statistics skip groups outside the date range before shuffling
+            groups = [group for fragment in dataset.get_fragments(filter=row_filter)
+                      for group in fragment.split_by_row_group(filter=row_filter)]
+            order = np.random.default_rng(shuffle_seed).permutation(len(groups))
+            batches = (batch for i in order
+                       for batch in groups[i].to_batches(columns=list(columns), filter=row_filter,
+                                                         batch_size=batch_size))
+        for batch in batches:
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+    start, end = _normalize_date_range(date_range)
+    usecols = list(dict.fromkeys(list(columns) + (['date'] if date_range is not None else [])))
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=batch_size, low_memory=False):
+        if start is not None or end is not None:
+            dates = pd.to_datetime(chunk['date'])
+            mask = pd.Series(True, index=chunk.index)
+            if start is not None:
+                mask &= dates >= start
+            if end is not None:
+                mask &= dates <= end
+            chunk = chunk[mask]
+        if len(chunk):
+            yield chunk[list(columns)]
+
+
+def _dataset_filter(stations, date_range):
+    import pyarrow.dataset as ds
+
+    condition = None
+    if stations is not None:
+        condition = ds.field('station_id').isin([int(s) for s in stations])
+    start, end = _normalize_date_range(date_range)
+    for op, bound in [('ge', start), ('le', end)]:
+        if bound is None:
+            continue
+        term = getattr(ds.field('date'), f'__{op}__')(bound.to_datetime64())
+        condition = term if condition is None else condition & term
+    return condition
+
+
+def read_feature_csv_filtered(csv_path, columns=None, stations=None, date_range=None):
+    """
+    CSV fallback for read_feature_store with the same projection and filters.
+
+    Only the requested and filter columns are parsed; filtering happens after load.
+    """
+    filter_cols = (['station_id'] if stations is not None else []) + \
+        (['date'] if date_range is not None else [])
+    usecols = None if columns is None else list(dict.fromkeys(list(columns) + filter_cols))
+    frame = pd.read_csv(csv_path, usecols=usecols, low_memory=False)
+    mask = pd.Series(True, index=frame.index)
+    if stations is not None:
+        mask &= frame['station_id'].isin(list(stations))
+    start, end = _normalize_date_range(date_range)
+    if start is not None or end is not None:
+        dates = pd.to_datetime(frame['date'])
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates <= end
+    if not mask.all():
+        frame = frame[mask].reset_index(drop=True)
+    if columns is not None:
+        frame = frame[list(columns)]
+    return frame
+
+
+def available_columns(path):
+    """Return the column names of the feature store directory or feature CSV."""
+    if os.path.isdir(path):
+        import pyarrow.dataset as ds
+
+        return ds.dataset(store_files(path), format='parquet').schema.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def _normalize_date_range(date_range):
+    if date_range is None:
+        return None, None
+    start, end = date_range
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    return start, end
+
+
+def build_feature_store(csv_path=None, store_dir=None):
+    """
+    Convert feature_engineered_data.csv into the Parquet feature store.
+
+    Any existing part files are replaced.
+
+    Parameters:
+    - csv_path (str, optional): Source CSV. Defaults to data/feature_engineered_data.csv.
+    - store_dir (str, optional): Target directory. Defaults to data/feature_store.
+
+    Returns:
+    - str: Path of the written part file.
+    """
+    csv_path = csv_path or os.path.join(DATA_DIR, 'feature_engineered_data.csv')
+    store_dir = store_dir or os.path.join(DATA_DIR, STORE_NAME)
+    frame = read_feature_csv(csv_path)
+    for old in store_files(store_dir):
+        os.remove(old)
+    return write_feature_store(frame, store_dir)
+
+
+def _measure_load(method, path):
+    """Load the data once and return (seconds, dataframe bytes, peak RSS growth in bytes)."""
+    import resource
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if method == 'csv':
+        frame = pd.read_csv(path, low_memory=False)
+    else:
+        frame = read_feature_store(path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    if sys.platform != 'darwin':
+        peak *= 1024  # Linux reports kilobytes
+    return elapsed, int(frame.memory_usage(deep=True).sum()), peak
+
+
+def benchmark(csv_path=None, store_dir=None):
+    """
+    Compare cold-start load time and memory of the CSV and the feature store.
+
+    Each load runs in a fresh process so timings and peak RSS are not affected
+    by earlier loads; RSS is reported as growth over the post-import baseline.
+
+    Returns:
+    - pd.DataFrame: One row per format with seconds, frame MB and peak RSS growth MB,
+      plus a csv/parquet ratio row.
+    """
+    import multiprocessing
+
+    csv_path = csv_path or os.path.join(DATA_DIR, 'feature_engineered_data.csv')
+    store_dir = store_dir or os.path.join(DATA_DIR, STORE_NAME)
+    ctx = multiprocessing.get_context('spawn')
+    rows = []
+    for method, path in [('csv', csv_path), ('parquet', store_dir)]:
+        with ctx.Pool(1) as pool:
+            seconds, frame_bytes, peak = pool.apply(_measure_load, (method, path))
+        rows.append({
+            'format': method,
+            'load_seconds': round(seconds, 3),
+            'frame_mb': round(frame_bytes / 1e6, 1),
+            'peak_rss_mb': round(peak / 1e6, 1),
+        })
+    result = pd.DataFrame(rows).set_index('format')
+    result.loc['csv/parquet'] = (result.loc['csv'] / result.loc['parquet']).round(1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or benchmark the columnar feature store.")
+    parser.add_argument('--csv', default=None, help="Source CSV path")
+    parser.add_argument('--store', default=None, help="Store directory")
+    parser.add_argument('--benchmark', action='store_true', help="Report CSV vs store load time and memory")
+    args = parser.parse_args()
+
+    store_dir = args.store or os.path.join(DATA_DIR, STORE_NAME)
+    if not args.benchmark or not store_files(store_dir):
+        part = build_feature_store(args.csv, store_dir)
+        print(f"Feature store written to {part}")
+    if args.benchmark:
+        print(benchmark(args.csv, store_dir).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Incremental daily updates of the feature store.
+
+bootstrap() runs the streaming feature engine over the raw history once, fits
+the notebook transforms (the notebook never saved its scaler, PCA or encoder)
+on the same chronological train split the notebook used, rebuilds
+data/feature_store/ with them and saves the engine state and the transforms
+next to the app data. From then on append_observations() turns new
+(station_id, date, rainfall_sum) records into fully transformed feature rows
+from the saved per-station state, so a daily update costs O(new rows plus the
+open years) instead of a rebuild.
+
+yearly_rainfall and monthly_rainfall are whole-period totals, so rows of a
+station-year that is still open change with every new reading. They are kept
+in the store's open part (part-open.parquet), which every append rewrites with
+the period-to-date totals. When a station's year closes, its rows move out of
+the open part into a new numbered part with their final totals, and numbered
+parts are never rewritten.
+
+The rainfall cube (utils.rainfall_cube) is rebuilt by bootstrap() and, once
+it exists, updated with each append. A current prediction store
+(utils.prediction_store) is extended with predictions for the new part and the
+rewritten open part; after a bootstrap it is stale and has to be rebuilt.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.feature_updates bootstrap ../Data/Raw/rainfall_data.csv \
+        --stations "../Data/Raw/Eastern Data.csv"
+    python -m utils.feature_updates append new_readings.csv
+"""
+import argparse
+import os
+import pickle
+import time
+
+import pandas as pd
+
+from utils import feature_store, prediction_store, rainfall_cube
+from utils.feature_engineering import FeatureEngine, load_stations
+from utils.transforms import TRANSFORMS_FILE, FeatureTransforms
+
+STATE_FILE = 'feature_engine_state.pkl'
+# Latest share of rows held out by the notebook's split_data; the transforms are fit on the rest
+VALIDATION_FRACTION = 0.2
+
+
+def state_path():
+    return os.path.join(feature_store.DATA_DIR, STATE_FILE)
+
+
+def transforms_path():
+    return os.path.join(feature_store.DATA_DIR, TRANSFORMS_FILE)
+
+
+def store_dir():
+    return os.path.join(feature_store.DATA_DIR, feature_store.STORE_NAME)
+
+
+def bootstrap(rainfall_path, stations_path=None, chunksize=100000):
+    """
+    Build the feature store, transforms and engine state from the raw history.
+
+    Parameters:
+    - rainfall_path (str): Path to rainfall_data.csv.
+    - stations_path (str, optional): Path to Eastern Data.csv.
+    - chunksize (int, optional): Raw rows read per chunk.
+
+    Returns:
+    - int: Number of feature rows written.
+    """
+    stations = load_stations(stations_path) if stations_path else None
+    engine = FeatureEngine(stations)
+    frames = []
+    for chunk in pd.read_csv(rainfall_path, chunksize=chunksize):
+        frames.append(engine.process(chunk))
+    closed = pd.concat(frames, ignore_index=True)
+    # Open years stay in the state so later appends continue their totals
+    open_rows = engine.open_features().reset_index(drop=True)
+
+    transforms = FeatureTransforms().fit(pd.concat([closed, open_rows], ignore_index=True),
+                                         validation_fraction=VALIDATION_FRACTION)
+    target = store_dir()
+    for old in feature_store.store_files(target):
+        os.remove(old)
+    if len(closed):
+        feature_store.write_feature_store(transforms.transform(closed), target, part=0)
+    if len(open_rows):
+        open_rows = transforms.transform(open_rows)
+        if len(closed):
+            # Cast to part 0's schema, as appends do
+            feature_store.append_feature_rows(open_rows, target, feature_store.OPEN_PART)
+        else:
+            feature_store.write_feature_store(open_rows, target, part=feature_store.OPEN_PART)
+    transforms.save(transforms_path())
+    _save_state(engine, stations, next_part=1)
+    rainfall_cube.build_cube(target)
+    return len(closed) + len(open_rows)
+
+
+def append_observations(records):
+    """
+    Engineer, transform and store new daily observations.
+
+    Parameters:
+    - records (pd.DataFrame or list of dict): 'station_id', 'date' and 'rainfall_sum'.
+      Each station's records must be newer than what the store already holds.
+
+    Returns:
+    - pd.DataFrame: The feature rows written: those of station-years the records
+      closed, followed by the rewritten open part.
+    """
+    for path in [state_path(), transforms_path()]:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run `python -m utils.feature_updates bootstrap` first")
+    state = pd.read_pickle(state_path())
+    engine = FeatureEngine.from_state(state['engine'], state['stations'])
+    pending = engine.open_row_count()
+    closed = engine.append(records)
+    if closed.empty and engine.open_row_count() == pending:
+        # Every record was a duplicate or had an invalid date
+        return closed
+    transforms = FeatureTransforms.load(transforms_path())
+    target = store_dir()
+    parts = []
+    next_part = state['next_part']
+    if len(closed):
+        closed = transforms.transform(closed)
+        # The part number only advances with the saved state, so a retried append
+        # after a failure rewrites the same part instead of duplicating rows
+        parts.append((closed, feature_store.append_feature_rows(closed, target, next_part)))
+        next_part += 1
+    open_rows = engine.open_features()
+    if len(open_rows):
+        open_rows = transforms.transform(open_rows)
+    parts.append((open_rows, feature_store.append_feature_rows(open_rows, target, feature_store.OPEN_PART)))
+    _save_state(engine, state['stations'], next_part)
+    if os.path.exists(rainfall_cube.cube_path()):
+        rainfall_cube.update_cube()
+    prediction_store.extend_prediction_store(parts)
+    return pd.concat([closed, open_rows], ignore_index=True)
+
+
+def _save_state(engine, stations, next_part):
+    path = state_path()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'engine': engine.state_dict(), 'stations': stations, 'next_part': next_part}, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap or append to the feature store.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    boot = sub.add_parser('bootstrap', help="Rebuild the store and state from the raw history")
+    boot.add_argument('rainfall', help="Path to rainfall_data.csv")
+    boot.add_argument('--stations', default=None, help="Path to Eastern Data.csv")
+    boot.add_argument('--chunksize', type=int, default=100000, help="Raw rows per chunk")
+    append = sub.add_parser('append', help="Append new observations")
+    append.add_argument('records', help="CSV with station_id, date and rainfall_sum columns")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'bootstrap':
+        total = bootstrap(args.rainfall, args.stations, args.chunksize)
+        print(f"Feature store rebuilt with {total} rows in {time.perf_counter() - start:.1f}s")
+        print("Rebuild the prediction store with `python -m utils.prediction_store`.")
+    else:
+        rows = append_observations(pd.read_csv(args.records))
+        print(f"Wrote {len(rows)} feature rows (closed years and the open part) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Batched, memoized inference around the random-forest models.
+
+An InferenceService wraps one loaded model. Requests are split into bounded
+chunks, the forest's trees are evaluated on all cores (n_jobs=-1), and every
+prediction is memoized per (station_id, date) for the lifetime of the service.
+Services are cached through the shared data_utils cache against the model file
+and the feature data files, so rows already predicted for any session are never
+predicted again until the model or the feature data changes.
+
+The model is shared with every other user of the cache, so the service never
+modifies it: parallelism is set on a shallow copy for each call. The memo keeps
+each station's predictions as sorted, append-only blocks that are merged
+pairwise once they reach similar sizes, so remembering a request costs about
+its own size rather than a re-sort of everything memoized. The service reports
+the memo's current size to the cache (cache_nbytes); the model is cached and
+counted on its own.
+"""
+import copy
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import data_utils
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Feature columns the models were trained on, used when a model has no feature_names_in_
+FEATURE_COLUMNS = [
+    'ele(meter)', 'lat(deg)', 'lon(deg)', 'year', 'month', 'day_of_year',
+    'yearly_rainfall', 'monthly_rainfall', 'prev_day_rainfall',
+    'rolling_mean_7d', 'station_name_x_encoded', 'log_rainfall_sum',
+    'log_monthly_rainfall', 'log_prev_day_rainfall', 'log_rolling_mean_7d',
+    'pca_component_1', 'pca_component_2', 'pca_component_3'
+]
+
+
+class InferenceService:
+    """
+    Chunked, memoized predictions for one fitted model.
+
+    Parameters:
+    - model: Fitted regressor or classifier.
+    - model_hash (str): Content hash of the model file; identifies the memo.
+    - task (str, optional): 'regression' outputs 'pred_rainfall'; 'classification'
+      outputs 'pred_extreme' and 'pred_extreme_proba' from a single predict_proba pass.
+    - chunk_size (int, optional): Maximum rows per model call.
+    - n_jobs (int, optional): Parallelism used by the forest when predicting; the
+      shared model itself is left unchanged.
+    """
+
+    def __init__(self, model, model_hash, task='regression', chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=-1):
+        self.model = model
+        self.model_hash = model_hash
+        self.task = task
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.features = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+        self.outputs = ['pred_rainfall'] if task == 'regression' else ['pred_extreme', 'pred_extreme_proba']
+        # station_id -> list of (sorted int64 dates, values) blocks, largest first
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.rows_predicted = 0
+        self.rows_memoized = 0
+
+    def predict_array(self, X):
+        """
+        Run the model over X in chunks without memoization.
+
+        Parameters:
+        - X (pd.DataFrame): Rows with the model's feature columns.
+
+        Returns:
+        - np.ndarray: Array of shape (len(X), len(self.outputs)).
+        """
+        out = np.empty((len(X), len(self.outputs)), dtype=np.float64)
+        X = X[self.features]
+        model = with_n_jobs(self.model, self.n_jobs)
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X.iloc[start:start + self.chunk_size]
+            if self.task == 'regression':
+                out[start:start + len(chunk), 0] = model.predict(chunk)
+            else:
+                proba = model.predict_proba(chunk)
+                out[start:start + len(chunk), 0] = model.classes_[proba.argmax(axis=1)]
+                positive = list(model.classes_).index(1) if 1 in model.classes_ else proba.shape[1] - 1
+                out[start:start + len(chunk), 1] = proba[:, positive]
+        self.rows_predicted += len(X)
+        return out
+
+    def predict(self, frame):
+        """
+        Predict for rows keyed by 'station_id' and 'date', reusing memoized results.
+
+        Parameters:
+        - frame (pd.DataFrame): Rows with 'station_id', 'date' and the feature columns.
+
+        Returns:
+        - pd.DataFrame: The output columns, aligned with frame's index.
+        """
+        result = np.full((len(frame), len(self.outputs)), np.nan)
+        if len(frame) == 0:
+            return pd.DataFrame(result, index=frame.index, columns=self.outputs)
+        stations = frame['station_id'].to_numpy()
+        dates = pd.to_datetime(frame['date']).to_numpy(dtype='datetime64[ns]').view('int64')
+        groups = pd.Series(np.arange(len(frame))).groupby(stations).indices
+
+        missing = []
+        with self._lock:
+            for sid, rows in groups.items():
+                hit = np.zeros(len(rows), dtype=bool)
+                wanted = dates[rows]
+                for block_dates, block_values in self._memo.get(sid, ()):
+                    pos = np.minimum(block_dates.searchsorted(wanted), len(block_dates) - 1)
+                    found = ~hit & (block_dates[pos] == wanted)
+                    result[rows[found]] = block_values[pos[found]]
+                    hit |= found
+                self.rows_memoized += int(hit.sum())
+                missing.append(rows[~hit])
+        missing = np.concatenate(missing) if missing else np.empty(0, dtype=np.int64)
+
+        if len(missing):
+            predicted = self.predict_array(frame.iloc[missing])
+            result[missing] = predicted
+            self._remember(stations[missing], dates[missing], predicted)
+        return pd.DataFrame(result, index=frame.index, columns=self.outputs)
+
+    def _remember(self, stations, dates, values):
+        with self._lock:
+            for sid, rows in pd.Series(np.arange(len(stations))).groupby(stations).indices.items():
+                order = np.argsort(dates[rows], kind='stable')
+                blocks = self._memo.setdefault(sid, [])
+                blocks.append((dates[rows][order], values[rows][order]))
+                # Merge while the newest block is at least half the size of the one before it,
+                # which keeps O(log n) blocks per station and each row merged O(log n) times
+                while len(blocks) > 1 and 2 * len(blocks[-1][0]) >= len(blocks[-2][0]):
+                    newer, older = blocks.pop(), blocks.pop()
+                    blocks.append(_merge_blocks(older, newer))
+
+    def cache_nbytes(self):
+        """Bytes held by the memo; the model is cached and counted separately."""
+        with self._lock:
+            return sum(block_dates.nbytes + block_values.nbytes
+                       for blocks in self._memo.values() for block_dates, block_values in blocks)
+
+    def stats(self):
+        with self._lock:
+            memo_rows = sum(len(block_dates) for blocks in self._memo.values() for block_dates, _ in blocks)
+        return {
+            'model_hash': self.model_hash,
+            'rows_predicted': self.rows_predicted,
+            'rows_memoized': self.rows_memoized,
+            'memo_rows': memo_rows,
+        }
+
+
+def _merge_blocks(older, newer):
+    """One sorted block from two; a date predicted twice keeps the newer values."""
+    dates = np.concatenate([older[0], newer[0]])
+    values = np.concatenate([older[1], newer[1]])
+    order = np.argsort(dates, kind='stable')
+    dates, values = dates[order], values[order]
+    last = np.append(dates[1:] != dates[:-1], True)
+    return dates[last], values[last]
+
+
+def with_n_jobs(model, n_jobs):
+    """
+    The model with n_jobs set, as a shallow copy so the shared cached model is not modified.
+
+    Parameters:
+    - model: Fitted estimator; returned as is when it has no n_jobs or already uses n_jobs.
+    - n_jobs (int): Parallelism for this call.
+
+    Returns:
+    - The estimator to predict with.
+    """
+    if not hasattr(model, 'n_jobs') or model.n_jobs == n_jobs:
+        return model
+    configured = copy.copy(model)
+    configured.n_jobs = n_jobs
+    return configured
+
+
+def missing_features(columns, model):
+    """Return the model features absent from an uploaded file's columns."""
+    features = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+    columns = set(columns)
+    return [f for f in features if f not in columns]
+
+
+def iter_upload_chunks(uploaded_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream an uploaded CSV or Parquet file as dataframes of at most chunk_size rows.
+
+    Parameters:
+    - uploaded_file: File-like object with a `name` attribute (e.g. Streamlit UploadedFile).
+    - chunk_size (int, optional): Rows per chunk.
+
+    Yields:
+    - pd.DataFrame: Consecutive chunks of the file.
+    """
+    name = getattr(uploaded_file, 'name', '').lower()
+    if name.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(uploaded_file).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(uploaded_file, chunksize=chunk_size)
+
+
+def score_frame(frame, reg_model, clf_model):
+    """
+    Add pred_rainfall, pred_extreme and pred_extreme_proba columns to a feature frame.
+
+    The classifier runs a single predict_proba pass; the label is the most
+    probable class, which is what predict() returns.
+
+    Parameters:
+    - frame (pd.DataFrame): Rows containing the model feature columns.
+    - reg_model: Fitted regressor (pickled or compact).
+    - clf_model: Fitted classifier (pickled or compact).
+
+    Returns:
+    - pd.DataFrame: A copy of frame with the prediction columns appended.
+    """
+    features = list(getattr(reg_model, 'feature_names_in_', FEATURE_COLUMNS))
+    X = frame[features]
+    scored = frame.copy()
+    scored['pred_rainfall'] = reg_model.predict(X)
+    proba = clf_model.predict_proba(X)
+    classes = np.asarray(clf_model.classes_)
+    scored['pred_extreme'] = classes[proba.argmax(axis=1)]
+    positive = list(classes).index(1) if 1 in classes else proba.shape[1] - 1
+    scored['pred_extreme_proba'] = proba[:, positive]
+    return scored
+
+
+def score_batches(chunks, reg_model, clf_model):
+    """Score an iterable of feature chunks, yielding each scored chunk as soon as it is done."""
+    for chunk in chunks:
+        yield score_frame(chunk, reg_model, clf_model)
+
+
+def score_raw_batches(chunks, transforms, reg_model, clf_model):
+    """
+    Score chunks of raw readings, building the model features with the saved transforms.
+
+    Parameters:
+    - chunks (iterable of pd.DataFrame): Rows with a station, 'date' and the raw rainfall inputs.
+    - transforms (FeatureTransforms): Fitted transform pipeline.
+    - reg_model, clf_model: Fitted models (pickled or compact).
+
+    Yields:
+    - pd.DataFrame: Each raw chunk with the prediction columns appended.
+    """
+    features = list(getattr(reg_model, 'feature_names_in_', FEATURE_COLUMNS))
+    for chunk in chunks:
+        scored = score_frame(transforms.model_features(chunk, features), reg_model, clf_model)
+        yield chunk.reset_index(drop=True).join(scored[['pred_rainfall', 'pred_extreme', 'pred_extreme_proba']])
+
+
+def get_regression_service():
+    """Return the process-wide InferenceService for the regression model."""
+    return _get_service('reg', 'best_random_forest_regressor_model.pkl', data_utils.load_reg_model, 'regression')
+
+
+def get_classification_service():
+    """Return the process-wide InferenceService for the classification model."""
+    return _get_service('clf', 'best_random_forest_classifier_model.pkl', data_utils.load_clf_model, 'classification')
+
+
+def _get_service(name, file_name, loader, task):
+    file_path = os.path.join(data_utils.DATA_DIR, file_name)
+    model = loader()
+    # The memo is keyed by (station_id, date) only, so it is dropped with the service
+    # when the feature data is rewritten or extended as well as when the model changes
+    return data_utils.cached(
+        (f'{name}_inference_service',),
+        lambda: InferenceService(model, data_utils.file_hash(file_path), task=task),
+        [file_path] + data_utils.feature_data_files(),
+    )
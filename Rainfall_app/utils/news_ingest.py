@@ -0,0 +1,354 @@
+"""
+Concurrent scraping and translation stage of the news NLP pipeline.
+
+NLP.ipynb scrapes every article with requests.get(url, timeout=10) and then
+translates it with googletrans, one article after another, so ingesting the
+corpus takes the sum of all latencies. ingest_articles() runs the same steps
+on an asyncio event loop instead:
+
+- at most `concurrency` downloads and `translate_concurrency` translations are
+  in flight at once;
+- requests to the same host are spaced at least `host_interval` seconds apart,
+  and a download waiting for its host does not hold one of the download slots;
+- connection errors, timeouts, 429 and 5xx responses are retried with
+  exponential backoff;
+- response bodies are cached on disk by URL together with their ETag and
+  Last-Modified headers, and re-runs send conditional requests, so unchanged
+  pages are not downloaded again (a 304 reuses the cached body). Translations
+  are cached by content hash.
+
+Downloads go through requests in worker threads and translation through any
+object with googletrans' translate(text, src, dest) interface (sync or async),
+so the stage runs offline against a local HTTP server and a stub translator.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.news_ingest articles.csv --output ingested.csv
+"""
+import argparse
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+CACHE_NAME = 'news_cache'
+DEFAULT_CONCURRENCY = 8
+DEFAULT_HOST_INTERVAL = 1.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+REQUEST_TIMEOUT = 10
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+CONTENT_CLASSES = re.compile('content|article-body|news-content|post-content')
+POST_CLASSES = re.compile('post|fb-post|status')
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    from utils.data_utils import CACHE_DIR
+    return os.path.join(CACHE_DIR, CACHE_NAME)
+
+
+def extract_text(html):
+    """
+    Article text from an HTML page, using the notebook's content selectors.
+
+    Returns:
+    - str: The joined paragraph text, or None when the page has none.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    content = (
+        soup.find('article') or
+        soup.find('div', class_=CONTENT_CLASSES) or
+        soup.find('div', class_=POST_CLASSES)
+    )
+    paragraphs = (content or soup).find_all('p')
+    text = ' '.join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
+    return text if text.strip() else None
+
+
+class ContentCache:
+    """
+    On-disk cache of downloaded pages and translations.
+
+    A page is stored as <sha256(url)>.html with a .json sidecar holding the URL,
+    ETag and Last-Modified validators; translations as <sha256(src, dest, text)>.txt.
+
+    Parameters:
+    - directory (str): Cache directory; created on the first write.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def _key(*parts):
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _write(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def page(self, url):
+        """Cached (metadata dict, body bytes) for url, or (None, None)."""
+        key = self._key(url)
+        try:
+            with open(self._path(key, '.json')) as f:
+                meta = json.load(f)
+            with open(self._path(key, '.html'), 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def store_page(self, url, body, etag=None, last_modified=None):
+        key = self._key(url)
+        # Body first: a sidecar is only ever written next to a complete body
+        self._write(self._path(key, '.html'), body)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time()}
+        self._write(self._path(key, '.json'), json.dumps(meta).encode('utf-8'))
+
+    def translation(self, text, src, dest):
+        try:
+            with open(self._path(self._key(src, dest, text), '.txt'), encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store_translation(self, text, src, dest, translated):
+        self._write(self._path(self._key(src, dest, text), '.txt'), translated.encode('utf-8'))
+
+
+class HostRateLimiter:
+    """
+    Spaces requests to the same host at least `interval` seconds apart.
+
+    Parameters:
+    - interval (float): Minimum seconds between two request starts per host.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._locks = {}
+        self._last = {}
+
+    async def wait(self, host):
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._last.get(host, float('-inf')) + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last[host] = time.monotonic()
+
+
+def _get(url, headers, timeout):
+    import requests
+    return requests.get(url, headers=headers, timeout=timeout)
+
+
+class NewsIngestor:
+    """
+    Asynchronous scrape-and-translate stage.
+
+    Parameters:
+    - translator (optional): Object with translate(text, src=..., dest=...) returning
+      a result with a .text attribute; plain or async. Defaults to googletrans.
+    - cache_dir (str, optional): ContentCache directory. Defaults to data/cache/news_cache.
+    - concurrency (int, optional): Maximum downloads in flight.
+    - translate_concurrency (int, optional): Maximum translations in flight.
+    - host_interval (float, optional): Minimum seconds between requests to one host.
+    - retries (int, optional): Retries after the first attempt of a download.
+    - backoff (float, optional): First retry delay in seconds; doubled on each retry.
+    - timeout (float, optional): Per-request timeout in seconds.
+    - fetch (callable, optional): fetch(url, headers, timeout) returning a
+      requests-like response; defaults to requests.get.
+    """
+
+    def __init__(self, translator=None, cache_dir=None, concurrency=DEFAULT_CONCURRENCY,
+                 translate_concurrency=None, host_interval=DEFAULT_HOST_INTERVAL,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=REQUEST_TIMEOUT, fetch=None):
+        self.translator = translator
+        self.cache = ContentCache(cache_dir or default_cache_dir())
+        self.concurrency = concurrency
+        self.translate_concurrency = translate_concurrency or concurrency
+        self.host_interval = host_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.fetch = fetch or _get
+        self._executor = None
+        self.stats = {'downloaded': 0, 'not_modified': 0, 'retries': 0, 'failed': 0,
+                      'translated': 0, 'translation_cache_hits': 0}
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def download(self, url, limiter, semaphore):
+        """
+        Page body of url, from the network or the cache.
+
+        Returns:
+        - bytes: The body, or None when the page could not be downloaded.
+        """
+        meta, cached_body = self.cache.page(url)
+        headers = dict(HEADERS)
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            # Wait for the host first, so a rate-limited host does not block downloads from others
+            await limiter.wait(host)
+            async with semaphore:
+                try:
+                    response = await self._run(self.fetch, url, headers, self.timeout)
+                except Exception as e:
+                    # Connection errors and timeouts are worth another attempt
+                    logger.warning(f"Error fetching {url} (attempt {attempt + 1}): {e}")
+                    continue
+            if response.status_code == 304 and cached_body is not None:
+                self.stats['not_modified'] += 1
+                return cached_body
+            if response.status_code in RETRY_STATUS:
+                logger.warning(f"HTTP {response.status_code} from {url} (attempt {attempt + 1})")
+                continue
+            if response.status_code >= 400:
+                logger.error(f"HTTP {response.status_code} from {url}")
+                break
+            self.stats['downloaded'] += 1
+            body = response.content
+            self.cache.store_page(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return body
+        self.stats['failed'] += 1
+        return None
+
+    async def translate(self, text, semaphore, src='ne', dest='en'):
+        """Translate text through the cache; returns the original text if translation fails."""
+        if not text:
+            return ''
+        cached = self.cache.translation(text, src, dest)
+        if cached is not None:
+            self.stats['translation_cache_hits'] += 1
+            return cached
+        if self.translator is None:
+            from googletrans import Translator
+            self.translator = Translator()
+        async with semaphore:
+            try:
+                translate = self.translator.translate
+                if inspect.iscoroutinefunction(translate):
+                    result = await translate(text, src=src, dest=dest)
+                else:
+                    result = await self._run(lambda: translate(text, src=src, dest=dest))
+            except Exception as e:
+                logger.error(f"Error translating text: {e}")
+                return text
+        # The notebook falls back to the original text on empty translations
+        translated = getattr(result, 'text', None) or text
+        self.cache.store_translation(text, src, dest, translated)
+        self.stats['translated'] += 1
+        return translated
+
+    async def ingest(self, articles):
+        """
+        Scrape and translate articles concurrently.
+
+        Parameters:
+        - articles (list of dict): url, source, date and language of each article.
+
+        Returns:
+        - list of dict: One record per article with extractable text, in input order,
+          with text, translated_text, source, date, type, language and url.
+        """
+        limiter = HostRateLimiter(self.host_interval)
+        download_slots = asyncio.Semaphore(self.concurrency)
+        translate_slots = asyncio.Semaphore(self.translate_concurrency)
+
+        async def process(article):
+            body = await self.download(article['url'], limiter, download_slots)
+            if body is None:
+                return None
+            text = await self._run(extract_text, body)
+            if not text:
+                logger.warning(f"No text extracted from {article['url']}")
+                return None
+            language = article['language']
+            translated = await self.translate(text, translate_slots) if language == 'ne' else text
+            return {
+                'text': text,
+                'translated_text': translated,
+                'source': article['source'],
+                'date': article['date'],
+                'type': 'article',
+                'language': language,
+                'url': article['url'],
+            }
+
+        # Blocking downloads and parsing get their own threads so the default
+        # executor's small worker count does not cap the concurrency
+        with ThreadPoolExecutor(max_workers=self.concurrency + self.translate_concurrency) as executor:
+            self._executor = executor
+            try:
+                results = await asyncio.gather(*(process(article) for article in articles))
+            finally:
+                self._executor = None
+        return [record for record in results if record is not None]
+
+
+def ingest_articles(articles, **kwargs):
+    """
+    Run NewsIngestor(**kwargs).ingest(articles) to completion.
+
+    Returns:
+    - pd.DataFrame: The ingested records.
+    """
+    ingestor = NewsIngestor(**kwargs)
+    start = time.perf_counter()
+    records = asyncio.run(ingestor.ingest(list(articles)))
+    logger.info(f"Ingested {len(records)} of {len(articles)} articles in "
+                f"{time.perf_counter() - start:.1f}s: {ingestor.stats}")
+    return pd.DataFrame(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape and translate news articles concurrently.")
+    parser.add_argument('articles', help="CSV with url, source, date and language columns")
+    parser.add_argument('--output', required=True, help="CSV to write the ingested articles to")
+    parser.add_argument('--cache-dir', default=None, help="Page and translation cache directory")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Downloads in flight")
+    parser.add_argument('--host-interval', type=float, default=DEFAULT_HOST_INTERVAL,
+                        help="Minimum seconds between requests to one host")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help="Retries per download")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    articles = pd.read_csv(args.articles).to_dict('records')
+    data = ingest_articles(articles, cache_dir=args.cache_dir, concurrency=args.concurrency,
+                           host_interval=args.host_interval, retries=args.retries)
+    data.to_csv(args.output, index=False, encoding='utf-8')
+    print(f"Wrote {len(data)} articles to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
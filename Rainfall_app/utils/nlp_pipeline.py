@@ -0,0 +1,349 @@
+"""
+Batched analysis stage of the news NLP pipeline.
+
+NLP.ipynb analyses articles one text at a time: nlp(text) per article for
+named entities, a VADER call per text, summarize_text through .apply(), and a
+separate re.search per station for station mentions. NewsAnalyzer runs the
+same analyses over a whole batch:
+
+- named entities come from nlp.pipe() in batches, optionally over several
+  processes;
+- VADER and the summaries are computed once per distinct text, in a process
+  pool when n_process > 1 (VADER has no vectorized scorer, so batching means
+  deduplicating and spreading the per-text calls over processes);
+- station mentions and hazard keywords are found with one compiled regex each
+  instead of a scan per station or keyword;
+- results are cached on disk per article content hash, so re-running the
+  pipeline over a growing corpus only analyses new articles.
+
+Outputs match the notebook's process_articles() columns (minus the topic
+model): clean_text, neg, neu, pos, compound, locations, events,
+station_mention and summary, plus the summary's TextBlob polarity and
+sentiment label shown on the News Insights page, so the page never scores text
+itself.
+
+Needs the spaCy model and NLTK data listed in requirements.txt:
+    python -m spacy download en_core_web_sm
+    python -m nltk.downloader vader_lexicon stopwords punkt punkt_tab
+
+Usage (from the Rainfall_app directory):
+    python -m utils.nlp_pipeline ingested.csv --output data/nlp_results.csv --n-process 4
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+ANALYSIS_CACHE_FILE = 'nlp_analysis_cache.jsonl'
+# Bump when an analysis changes so cached results are recomputed
+ANALYSIS_VERSION = 2
+SPACY_MODEL = 'en_core_web_sm'
+DEFAULT_BATCH_SIZE = 256
+SUMMARY_SENTENCES = 3
+
+RAINFALL_STATIONS = [
+    'Okhaldhunga', 'Khotang Bazaar', 'Siraha', 'Rajbiraj', 'Barmajhiya', 'Chainpur (East)',
+    'Pakhribas', 'Dhankuta', 'Biratnagar Airport', 'Tarhara', 'Dingla', 'Taplejung',
+    'Ilam Tea Garden', 'Damak', 'Anarmani Birta', 'Chandri Gadhi', 'Phidim (Panchthar)',
+    'Kanyam Tea Estate', 'Gaida (Kankai)'
+]
+HAZARD_KEYWORDS = ['flood', 'landslide', 'rainfall']
+EVENT_LABELS = {'EVENT', 'DATE'}
+SENTIMENT_COLUMNS = ['neg', 'neu', 'pos', 'compound']
+ANALYSIS_COLUMNS = ['clean_text'] + SENTIMENT_COLUMNS + ['locations', 'events', 'station_mention', 'summary',
+                                                       'sentiment_polarity', 'sentiment']
+
+URL_PATTERN = re.compile(r'http\S+|www\S+|@\w+|#\w+')
+# Same word boundaries as the notebook's per-station rf'\b{station}\b' searches;
+# longest names first so a name is never shadowed by a shorter prefix
+STATION_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(s) for s in sorted(RAINFALL_STATIONS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE)
+HAZARD_PATTERN = re.compile('|'.join(HAZARD_KEYWORDS))
+_STATION_NAMES = {station.lower(): station for station in RAINFALL_STATIONS}
+_STATION_ORDER = {station: i for i, station in enumerate(RAINFALL_STATIONS)}
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text):
+    return hashlib.sha256(f'{ANALYSIS_VERSION}\0{text}'.encode('utf-8')).hexdigest()
+
+
+def match_stations(text):
+    """Stations mentioned in text, in RAINFALL_STATIONS order."""
+    found = {_STATION_NAMES[m.group(0).lower()] for m in STATION_PATTERN.finditer(text)}
+    return sorted(found, key=_STATION_ORDER.get)
+
+
+def summarize_text(text, sentences_count=SUMMARY_SENTENCES):
+    """Extractive LSA summary, as in the notebook; '' when summarization fails."""
+    if not text:
+        return ''
+    from sumy.nlp.tokenizers import Tokenizer
+    from sumy.parsers.plaintext import PlaintextParser
+    from sumy.summarizers.lsa import LsaSummarizer
+
+    try:
+        parser = PlaintextParser.from_string(text, Tokenizer('english'))
+        summary = LsaSummarizer()(parser.document, sentences_count)
+        return ' '.join(str(sentence) for sentence in summary)
+    except Exception as e:
+        logger.error(f"Error summarizing text: {e}")
+        return ''
+
+
+def summary_sentiment(summaries):
+    """
+    TextBlob polarity and Positive/Negative/Neutral label of each summary.
+
+    Every distinct summary is scored once. Missing or empty summaries get a NaN
+    polarity and 'Unknown' (an empty summary reads back from CSV as missing).
+
+    Returns:
+    - tuple: (polarity np.ndarray, label np.ndarray).
+    """
+    from textblob import TextBlob
+
+    summaries = pd.Series(summaries, dtype=object).reset_index(drop=True)
+    present = summaries.map(lambda s: isinstance(s, str) and s != '')
+    distinct = summaries[present].unique()
+    scores = {text: TextBlob(text).sentiment.polarity for text in distinct}
+    polarity = summaries.where(present).map(scores).to_numpy(dtype=np.float64)
+    label = np.select([polarity > 0, polarity < 0, polarity == 0], ['Positive', 'Negative', 'Neutral'], 'Unknown')
+    return polarity, label
+
+
+def _summarize_all(texts, sentences_count):
+    return [summarize_text(text, sentences_count) for text in texts]
+
+
+_worker_sia = None
+
+
+def _vader_all(texts):
+    # One analyzer per worker process; loading the lexicon dominates short batches
+    global _worker_sia
+    if _worker_sia is None:
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        _worker_sia = SentimentIntensityAnalyzer()
+    return [_worker_sia.polarity_scores(text) for text in texts]
+
+
+class AnalysisCache:
+    """
+    Append-only JSON-lines store of per-text analysis results keyed by content hash.
+
+    Parameters:
+    - path (str): Cache file; created on the first write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run killed mid-write leaves at most one partial line
+                        continue
+                    self.results[record['key']] = record['result']
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def add_many(self, results):
+        """Store a dict of key -> result with one file append."""
+        self.results.update(results)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps({'key': key, 'result': result}, ensure_ascii=False) + '\n'
+                         for key, result in results.items())
+
+
+class NewsAnalyzer:
+    """
+    Batched preprocessing, sentiment, entity, station and summary analysis.
+
+    Parameters:
+    - nlp (optional): A loaded spaCy pipeline or a model name. Defaults to en_core_web_sm
+      without the parser, as in the notebook.
+    - n_process (int, optional): Processes for nlp.pipe() and the summaries.
+    - batch_size (int, optional): Texts per nlp.pipe() batch.
+    - summary_sentences (int, optional): Sentences per summary.
+    - cache_path (str, optional): AnalysisCache file. Defaults to data/cache/nlp_analysis_cache.jsonl;
+      pass False to disable caching.
+    """
+
+    def __init__(self, nlp=None, n_process=1, batch_size=DEFAULT_BATCH_SIZE,
+                 summary_sentences=SUMMARY_SENTENCES, cache_path=None):
+        self._nlp = nlp
+        self._sia = None
+        self._stop_words = None
+        self.n_process = n_process
+        self.batch_size = batch_size
+        self.summary_sentences = summary_sentences
+        if cache_path is None:
+            from utils.data_utils import CACHE_DIR
+            cache_path = os.path.join(CACHE_DIR, ANALYSIS_CACHE_FILE)
+        self.cache = AnalysisCache(cache_path) if cache_path else None
+
+    @property
+    def nlp(self):
+        if self._nlp is None or isinstance(self._nlp, str):
+            import spacy
+            self._nlp = spacy.load(self._nlp or SPACY_MODEL, disable=['parser'])
+        return self._nlp
+
+    @property
+    def sia(self):
+        if self._sia is None:
+            from nltk.sentiment.vader import SentimentIntensityAnalyzer
+            self._sia = SentimentIntensityAnalyzer()
+        return self._sia
+
+    @property
+    def stop_words(self):
+        if self._stop_words is None:
+            from nltk.corpus import stopwords
+            self._stop_words = set(stopwords.words('english'))
+        return self._stop_words
+
+    def preprocess_text(self, text):
+        """Lowercase, strip URLs/handles/hashtags, tokenize and drop stopwords and non-words."""
+        if not isinstance(text, str) or not text.strip():
+            return ''
+        from nltk.tokenize import word_tokenize
+
+        tokens = word_tokenize(URL_PATTERN.sub('', text.lower()))
+        stop_words = self.stop_words
+        return ' '.join(t for t in tokens if t.isalpha() and t not in stop_words)
+
+    def sentiments(self, clean_texts):
+        """VADER scores of every cleaned text; each distinct non-empty text is scored once."""
+        distinct = list(dict.fromkeys(text for text in clean_texts if text))
+        if self.n_process <= 1 or len(distinct) < 2:
+            scores = [self.sia.polarity_scores(text) for text in distinct]
+        else:
+            scores = self._map_chunks(_vader_all, distinct)
+        by_text = {text: {col: score[col] for col in SENTIMENT_COLUMNS} for text, score in zip(distinct, scores)}
+        empty = dict.fromkeys(SENTIMENT_COLUMNS, 0)
+        return [by_text[text] if text else dict(empty) for text in clean_texts]
+
+    def entities(self, texts):
+        """Locations, events and station mentions for every text, with nlp.pipe()."""
+        results = [{'locations': [], 'events': [], 'station_mention': []} for _ in texts]
+        present = [i for i, text in enumerate(texts) if text]
+        docs = self.nlp.pipe((texts[i] for i in present), batch_size=self.batch_size, n_process=self.n_process)
+        for i, doc in zip(present, docs):
+            results[i] = {
+                'locations': [ent.text for ent in doc.ents if ent.label_ == 'GPE'],
+                'events': [
+                    ent.text for ent in doc.ents
+                    if ent.label_ in EVENT_LABELS or HAZARD_PATTERN.search(ent.text.lower())
+                ],
+                'station_mention': match_stations(texts[i]),
+            }
+        return results
+
+    def summaries(self, texts):
+        if self.n_process <= 1 or len(texts) < 2:
+            return _summarize_all(texts, self.summary_sentences)
+        return self._map_chunks(_summarize_all, texts, self.summary_sentences)
+
+    def _map_chunks(self, func, texts, *args):
+        """Run func(chunk, *args) over chunks of texts in a process pool and flatten the results."""
+        chunk = -(-len(texts) // (self.n_process * 4))
+        chunks = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+        with ProcessPoolExecutor(max_workers=self.n_process) as pool:
+            parts = pool.map(func, chunks, *[[arg] * len(chunks) for arg in args])
+            return [result for part in parts for result in part]
+
+    def analyze(self, texts):
+        """
+        Analyse translated article texts.
+
+        Parameters:
+        - texts (iterable of str): English (translated) article texts.
+
+        Returns:
+        - pd.DataFrame: The ANALYSIS_COLUMNS, one row per text in input order.
+        """
+        texts = ['' if pd.isna(text) else str(text) for text in texts]
+        keys = [content_hash(text) for text in texts]
+        results = {}
+        if self.cache is not None:
+            results = {key: self.cache.get(key) for key in set(keys) if self.cache.get(key) is not None}
+        # Each distinct uncached text is analysed once
+        pending = {key: text for key, text in zip(keys, texts) if key not in results}
+        if pending:
+            start = time.perf_counter()
+            pending_keys, pending_texts = list(pending), list(pending.values())
+            clean = [self.preprocess_text(text) for text in pending_texts]
+            sentiments = self.sentiments(clean)
+            entities = self.entities(pending_texts)
+            summaries = self.summaries(pending_texts)
+            polarity, label = summary_sentiment(summaries)
+            computed = {
+                key: {'clean_text': clean_text, **vader, **entity, 'summary': summary,
+                      'sentiment_polarity': None if np.isnan(score) else float(score), 'sentiment': str(name)}
+                for key, clean_text, vader, entity, summary, score, name
+                in zip(pending_keys, clean, sentiments, entities, summaries, polarity, label)
+            }
+            if self.cache is not None:
+                self.cache.add_many(computed)
+            results.update(computed)
+            logger.info(f"Analysed {len(pending)} new texts in {time.perf_counter() - start:.1f}s "
+                        f"({len(set(keys)) - len(pending)} cached)")
+        return pd.DataFrame([results[key] for key in keys], columns=ANALYSIS_COLUMNS)
+
+    def process_articles(self, articles):
+        """
+        Add the analysis columns to ingested articles.
+
+        Parameters:
+        - articles (pd.DataFrame): Output of utils.news_ingest, with a translated_text column.
+
+        Returns:
+        - pd.DataFrame: The articles with the ANALYSIS_COLUMNS appended.
+        """
+        articles = pd.DataFrame(articles).reset_index(drop=True)
+        if articles.empty:
+            return articles
+        analysis = self.analyze(articles['translated_text'])
+        return pd.concat([articles.drop(columns=ANALYSIS_COLUMNS, errors='ignore'), analysis], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched NLP analysis of ingested news articles.")
+    parser.add_argument('articles', help="CSV written by utils.news_ingest")
+    parser.add_argument('--output', required=True, help="CSV to write the analysed articles to")
+    parser.add_argument('--n-process', type=int, default=1, help="Processes for spaCy and the summaries")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Texts per spaCy batch")
+    parser.add_argument('--no-cache', action='store_true', help="Do not read or write the analysis cache")
+    parser.add_argument('--no-topics', action='store_true', help="Do not update the persisted topic model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    analyzer = NewsAnalyzer(n_process=args.n_process, batch_size=args.batch_size,
+                            cache_path=False if args.no_cache else None)
+    start = time.perf_counter()
+    data = analyzer.process_articles(pd.read_csv(args.articles))
+    if not args.no_topics and not data.empty:
+        from utils.topic_model import update_topics
+        data['dominant_topic'] = update_topics(data)['dominant_topic']
+    data.to_csv(args.output, index=False, encoding='utf-8')
+    print(f"Wrote {len(data)} analysed articles to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Offline store of historical model predictions.
+
+The "Actual vs Predicted" history is fully determined by the pickled models and
+the static feature data, so it is computed once by this batch job and written
+as a Parquet dataset partitioned by station:
+
+    data/prediction_store/<regressor hash>-<classifier hash>/station_id=<id>/*.parquet
+
+with columns date, pred_rainfall, pred_extreme and pred_extreme_proba. The
+directory name ties the predictions to the exact model files, and
+_manifest.json records the content hash of every feature file the predictions
+were computed from. When either pickle changes, or a recorded feature file is
+rewritten or removed (e.g. by a feature bootstrap), load_predictions() returns
+None and callers fall back to live inference. Feature parts appended after the
+store was built are not in the manifest; their rows are simply absent from the
+store until extend_prediction_store() adds them. The feature store's open part
+is rewritten by every append, and its predictions are replaced with it.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.prediction_store
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from utils import data_utils
+from utils.inference import InferenceService
+
+STORE_NAME = 'prediction_store'
+REG_MODEL_FILE = 'best_random_forest_regressor_model.pkl'
+CLF_MODEL_FILE = 'best_random_forest_classifier_model.pkl'
+OUTPUT_COLUMNS = ['pred_rainfall', 'pred_extreme', 'pred_extreme_proba']
+MANIFEST_FILE = '_manifest.json'
+
+
+def store_key():
+    """Return the store directory name for the current model files."""
+    reg_hash = data_utils.file_hash(os.path.join(data_utils.DATA_DIR, REG_MODEL_FILE))
+    clf_hash = data_utils.file_hash(os.path.join(data_utils.DATA_DIR, CLF_MODEL_FILE))
+    return f'{reg_hash[:16]}-{clf_hash[:16]}'
+
+
+def store_dir(key=None):
+    return os.path.join(data_utils.DATA_DIR, STORE_NAME, key or store_key())
+
+
+def build_prediction_store(chunk_size=None):
+    """
+    Run both models over the full feature data and write the prediction store.
+
+    Stations are predicted and written one partition at a time, each through
+    the chunked InferenceService. Predictions of each feature store part are
+    written under that part's file name, so a rewritten part (the open part)
+    later replaces exactly its own predictions. Stores for other model hashes
+    are left in place until removed by hand.
+
+    Returns:
+    - str: Path of the written store directory.
+    """
+    reg_model = data_utils.load_reg_model()
+    clf_model = data_utils.load_clf_model()
+    key = store_key()
+    target = store_dir(key)
+    reg = InferenceService(reg_model, key, task='regression')
+    clf = InferenceService(clf_model, key, task='classification')
+    if chunk_size:
+        reg.chunk_size = clf.chunk_size = chunk_size
+
+    feature_files = data_utils.feature_data_files()
+    index = data_utils.load_station_index(columns=reg.features)
+    tmp_dir = target + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    parts = [(None, 'part-00000.parquet')]
+    if feature_files[0].endswith('.parquet'):
+        # Rows are matched to their part by date range: each station's parts cover disjoint dates
+        parts = [(_part_date_ranges(path), os.path.basename(path)) for path in feature_files]
+    for station_id in index.offsets:
+        for ranges, name in parts:
+            if ranges is None:
+                frame = index.select([station_id])
+            elif station_id in ranges:
+                frame = index.select([station_id], *ranges[station_id])
+            else:
+                continue
+            _write_predictions(tmp_dir, station_id, frame, reg, clf, name)
+    _write_manifest(tmp_dir, feature_files)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp_dir, target)
+    return target
+
+
+def _part_date_ranges(path):
+    """First and last date of each station in a feature store part."""
+    import pyarrow.parquet as pq
+
+    dates = pq.read_table(path, columns=['station_id', 'date']).to_pandas()
+    ranges = dates.groupby('station_id')['date'].agg(['min', 'max'])
+    return {int(station_id): (row['min'], row['max']) for station_id, row in ranges.iterrows()}
+
+
+def extend_prediction_store(parts):
+    """
+    Add predictions for newly written feature store parts to the current store.
+
+    Parameters:
+    - parts (list): (rows, part_file) pairs: the feature rows of one written store part,
+      with 'station_id' and 'date', and its path. A part written before (the open part,
+      or a retried append) has its predictions replaced; a removed part is dropped.
+
+    Returns:
+    - bool: False when there is no current store to extend (build one instead).
+    """
+    try:
+        target = store_dir()
+    except FileNotFoundError:
+        # No model files, so no store either
+        return False
+    part_rels = [os.path.relpath(part_file, data_utils.DATA_DIR) for _, part_file in parts]
+    # Rewritten parts are replaced rather than checked
+    if not prediction_files(target) or not _store_current(target, ignore=part_rels):
+        return False
+    key = os.path.basename(target)
+    reg = clf = None
+    names = {os.path.basename(part_file) for _, part_file in parts}
+    for path in prediction_files(target):
+        if os.path.basename(path) in names:
+            os.remove(path)
+    for rows, part_file in parts:
+        if rows.empty:
+            continue
+        if reg is None:
+            reg = InferenceService(data_utils.load_reg_model(), key, task='regression')
+            clf = InferenceService(data_utils.load_clf_model(), key, task='classification')
+        for station_id, frame in rows.groupby('station_id', sort=True):
+            _write_predictions(target, int(station_id), frame, reg, clf, os.path.basename(part_file))
+    recorded = [os.path.join(data_utils.DATA_DIR, rel) for rel in _read_manifest(target)['feature_files']
+                if rel not in part_rels]
+    written = [part_file for _, part_file in parts if os.path.exists(part_file)]
+    _write_manifest(target, recorded + written)
+    return True
+
+
+def _write_predictions(directory, station_id, frame, reg, clf, file_name):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    out = pd.DataFrame({'date': pd.to_datetime(frame['date']).astype('datetime64[ns]').to_numpy()})
+    out['pred_rainfall'] = reg.predict_array(frame)[:, 0].astype('float32')
+    clf_out = clf.predict_array(frame)
+    out['pred_extreme'] = clf_out[:, 0].astype('int8')
+    out['pred_extreme_proba'] = clf_out[:, 1].astype('float32')
+    part_dir = os.path.join(directory, f'station_id={station_id}')
+    os.makedirs(part_dir, exist_ok=True)
+    pq.write_table(pa.Table.from_pandas(out, preserve_index=False), os.path.join(part_dir, file_name))
+
+
+def _write_manifest(directory, feature_files):
+    manifest = {'feature_files': {
+        os.path.relpath(path, data_utils.DATA_DIR): data_utils.file_hash(path) for path in feature_files
+    }}
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+
+    def load():
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    return data_utils.cached(('prediction_manifest', directory), load, [path])
+
+
+def _store_current(directory, ignore=()):
+    """Whether every feature file the store was computed from (except `ignore`) is unchanged."""
+    if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        # Stores written before manifests were recorded cannot be verified
+        return False
+    for rel, digest in _read_manifest(directory)['feature_files'].items():
+        if rel in ignore:
+            continue
+        path = os.path.join(data_utils.DATA_DIR, rel)
+        if not os.path.exists(path) or data_utils.file_hash(path) != digest:
+            return False
+    return True
+
+
+def is_current():
+    """Whether a store exists for the current model files and all of its recorded feature files."""
+    try:
+        directory = store_dir()
+    except FileNotFoundError:
+        return False
+    return bool(prediction_files(directory)) and _store_current(directory)
+
+
+def prediction_files(directory):
+    files = []
+    for root, _, names in os.walk(directory):
+        files.extend(os.path.join(root, name) for name in names if name.endswith('.parquet'))
+    return sorted(files)
+
+
+def load_predictions(stations=None, date_range=None):
+    """
+    Read stored predictions for the current model files.
+
+    Parameters:
+    - stations (list, optional): station_id values. Defaults to all stations.
+    - date_range (tuple, optional): Inclusive (start, end) dates.
+
+    Returns:
+    - pd.DataFrame or None: Columns station_id, date and the prediction columns,
+      or None when no store exists for the current model hashes and feature files.
+      Rows of feature parts appended since the store was built are absent.
+    """
+    directory = store_dir()
+    files = prediction_files(directory)
+    if not files or not _store_current(directory):
+        return None
+    if stations is not None:
+        stations = tuple(sorted(int(s) for s in stations))
+    if date_range is not None:
+        date_range = tuple(None if d is None else str(pd.Timestamp(d).date()) for d in date_range)
+    return data_utils.cached(
+        ('predictions', directory, stations, date_range),
+        lambda: _read_predictions(directory, stations, date_range),
+        files,
+    )
+
+
+def _read_predictions(directory, stations, date_range):
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(directory, format='parquet', partitioning='hive')
+    condition = None
+    if stations is not None:
+        condition = ds.field('station_id').isin(list(stations))
+    if date_range is not None:
+        start, end = date_range
+        for op, bound in [('__ge__', start), ('__le__', end)]:
+            if bound is not None:
+                term = getattr(ds.field('date'), op)(pd.Timestamp(bound).to_datetime64())
+                condition = term if condition is None else condition & term
+    frame = dataset.to_table(filter=condition).to_pandas()
+    frame['station_id'] = frame['station_id'].astype('int32')
+    return frame[['station_id', 'date'] + OUTPUT_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute historical predictions for both models.")
+    parser.add_argument('--chunk-size', type=int, default=None, help="Rows per model call")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    target = build_prediction_store(args.chunk_size)
+    print(f"Prediction store written to {target} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
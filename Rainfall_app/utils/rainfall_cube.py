@@ -0,0 +1,430 @@
+"""
+Pre-aggregated rainfall cube for the dashboards.
+
+Per-station and per-period rainfall shown on the pages used to be derived from
+the daily feature rows on every request. The cube holds those aggregates once:
+
+- rainfall_cube.parquet: station x year x month total, day count, maximum and
+  extreme-day count (> 50 mm);
+- rainfall_climatology.parquet: the same measures per station x day of year.
+
+Every measure is additive (sums, counts) or a maximum, so new feature store
+parts are folded in by aggregating only those parts and merging. The parts
+already included are recorded with their content hashes in the cube file's
+metadata; update_cube() adds the missing ones and rebuilds from scratch if an
+included part was rewritten (a bootstrap, or a retried append). The feature
+store's open part is rewritten by every append, so its aggregates are stored
+as separate rows (open_part = True) that update_cube() replaces on their own;
+RainfallCube merges them with the rest on load.
+
+Rainfall is reported in mm: when the saved feature transforms standardized
+rainfall_sum, the stored values are mapped back with the scaler's mean and
+scale. Without the transforms the data must already be in mm; standardized
+data (the notebook's feature CSV) is refused rather than aggregated as mm.
+Extreme days come from the extreme_rainfall flag, which was computed in mm
+before scaling.
+
+The Regional Analysis page reads its per-station and monthly rainfall from
+the cube through data_utils.rainfall_summary().
+
+RainfallCube loads both tables into dense (station, year, month) and
+(station, day of year) arrays, so aggregate queries are array slices and sums
+instead of scans over the daily rows.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.rainfall_cube            # rebuild the cube
+    python -m utils.rainfall_cube --update   # fold in new feature store parts
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import feature_store
+
+CUBE_FILE = 'rainfall_cube.parquet'
+CLIMATOLOGY_FILE = 'rainfall_climatology.parquet'
+PARTS_METADATA_KEY = b'rainfall_cube_parts'
+EXTREME_RAINFALL_MM = 50
+MEASURES = ['total_mm', 'days', 'max_mm', 'extreme_days']
+TOTAL, DAYS, MAX, EXTREME = range(len(MEASURES))
+SOURCE_COLUMNS = ['station_id', 'station_name_x', 'date', 'rainfall_sum', 'extreme_rainfall']
+DIMENSIONS = ['station', 'year', 'month']
+OPEN_FILE = os.path.basename(feature_store.part_path('', feature_store.OPEN_PART))
+_STANDARDIZED_MESSAGE = (
+    "rainfall_sum is standardized and feature_transforms.pkl is missing, so it cannot be mapped "
+    "back to mm; run `python -m utils.feature_updates bootstrap` first"
+)
+
+
+def cube_path():
+    return os.path.join(feature_store.DATA_DIR, CUBE_FILE)
+
+
+def climatology_path():
+    return os.path.join(feature_store.DATA_DIR, CLIMATOLOGY_FILE)
+
+
+def _rainfall_scaling(columns=()):
+    """
+    (mean, scale) that map stored rainfall_sum back to mm, or None if it is stored in mm.
+
+    Raises:
+    - ValueError: If there are no saved transforms but the feature data is standardized
+      (it has the log_rainfall_sum column the notebook adds before scaling).
+    """
+    from utils.transforms import TRANSFORMS_FILE, FeatureTransforms
+
+    path = os.path.join(feature_store.DATA_DIR, TRANSFORMS_FILE)
+    if not os.path.exists(path):
+        if 'log_rainfall_sum' in columns:
+            raise ValueError(_STANDARDIZED_MESSAGE)
+        return None
+    transforms = FeatureTransforms.load(path)
+    if 'rainfall_sum' not in transforms.scaled_columns:
+        return None
+    i = transforms.scaled_columns.index('rainfall_sum')
+    return float(transforms.scaler.mean_[i]), float(transforms.scaler.scale_[i])
+
+
+def _aggregate(frame, scaling):
+    """Monthly and day-of-year aggregates of one batch of feature rows."""
+    rainfall = frame['rainfall_sum'].to_numpy(dtype=np.float64)
+    if scaling is not None:
+        rainfall = rainfall * scaling[1] + scaling[0]
+    elif (rainfall < 0).any():
+        raise ValueError(_STANDARDIZED_MESSAGE)
+    rainfall = np.nan_to_num(rainfall, nan=0.0)
+    if 'extreme_rainfall' in frame.columns:
+        extreme = frame['extreme_rainfall'].to_numpy(dtype=np.int64)
+    else:
+        extreme = (rainfall > EXTREME_RAINFALL_MM).astype(np.int64)
+    dates = pd.DatetimeIndex(pd.to_datetime(frame['date']))
+    rows = pd.DataFrame({
+        'station_id': frame['station_id'].to_numpy(dtype=np.int64),
+        'year': dates.year, 'month': dates.month, 'day_of_year': dates.dayofyear,
+        'total_mm': rainfall, 'max_mm': rainfall, 'extreme_days': extreme,
+    })
+    rows['days'] = 1
+    monthly = _combine(rows, ['station_id', 'year', 'month'])
+    climatology = _combine(rows, ['station_id', 'day_of_year'])
+    names = pd.DataFrame({'station_id': rows['station_id'],
+                          'station_name_x': frame['station_name_x'].astype(str).to_numpy()})
+    names = names.drop_duplicates('station_id')
+    return monthly, climatology, names
+
+
+def _combine(frame, keys):
+    """Merge partial aggregates (or single rows) sharing the same keys."""
+    return (frame.groupby(keys, sort=True)
+            .agg(total_mm=('total_mm', 'sum'), days=('days', 'sum'),
+                 max_mm=('max_mm', 'max'), extreme_days=('extreme_days', 'sum'))
+            .reset_index())
+
+
+def _aggregate_batches(batches, scaling):
+    monthly, climatology, names = [], [], []
+    for batch in batches:
+        m, c, n = _aggregate(batch, scaling)
+        monthly.append(m)
+        climatology.append(c)
+        names.append(n)
+    if not monthly:
+        return None
+    return (_combine(pd.concat(monthly), ['station_id', 'year', 'month']),
+            _combine(pd.concat(climatology), ['station_id', 'day_of_year']),
+            pd.concat(names).drop_duplicates('station_id'))
+
+
+def _part_batches(files, columns):
+    import pyarrow.parquet as pq
+
+    for path in files:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=feature_store.ROW_GROUP_SIZE * 8,
+                                                        columns=columns):
+            yield batch.to_pandas()
+
+
+def _flag_open(result, is_open):
+    monthly, climatology, names = result
+    return monthly.assign(open_part=is_open), climatology.assign(open_part=is_open), names
+
+
+def _split_open(files):
+    """Numbered store parts and the open part (or None)."""
+    closed = [f for f in files if os.path.basename(f) != OPEN_FILE]
+    return closed, next((f for f in files if os.path.basename(f) == OPEN_FILE), None)
+
+
+def _aggregate_parts(closed_files, open_file, columns, scaling):
+    """Aggregates of the numbered parts and of the open part, flagged and concatenated."""
+    results = []
+    for files, is_open in [(closed_files, False), ([open_file] if open_file else [], True)]:
+        result = _aggregate_batches(_part_batches(files, columns), scaling)
+        if result is not None:
+            results.append(_flag_open(result, is_open))
+    if not results:
+        return None
+    monthly, climatology, names = (pd.concat(frames, ignore_index=True) for frames in zip(*results))
+    return monthly, climatology, names.drop_duplicates('station_id')
+
+
+def _part_signature(files):
+    from utils.data_utils import file_hash
+
+    # Content hashes: a part rewritten with the same size must still be re-aggregated
+    return {os.path.basename(f): file_hash(f) for f in files}
+
+
+def _write(monthly, climatology, names, parts):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    monthly = monthly.merge(names, on='station_id', how='left')
+    monthly = monthly[['station_id', 'station_name_x', 'year', 'month'] + MEASURES + ['open_part']]
+    for frame, path, metadata in [(climatology, climatology_path(), {}),
+                                  (monthly, cube_path(), {PARTS_METADATA_KEY: json.dumps(parts).encode()})]:
+        # The cube file is written last: its part list marks the update as complete
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+
+
+def build_cube(source=None):
+    """
+    Rebuild the cube from the whole feature data, streamed in batches.
+
+    Parameters:
+    - source (str, optional): Feature store directory or CSV. Defaults to the app's feature data.
+
+    Returns:
+    - int: Number of station-month cells written.
+    """
+    if source is None:
+        from utils.data_utils import feature_data_path
+        source = feature_data_path()
+    available = feature_store.available_columns(source)
+    columns = [col for col in SOURCE_COLUMNS if col in available]
+    scaling = _rainfall_scaling(available)
+    if os.path.isdir(source):
+        files = feature_store.store_files(source)
+        result = _aggregate_parts(*_split_open(files), columns, scaling)
+        parts = _part_signature(files)
+    else:
+        result = _aggregate_batches(feature_store.iter_feature_batches(source, columns), scaling)
+        result = None if result is None else _flag_open(result, False)
+        parts = {}
+    if result is None:
+        raise ValueError(f"No feature rows found in {source}")
+    _write(*result, parts)
+    return len(result[0])
+
+
+def read_cube_parts():
+    """Store parts recorded in the cube file, or None if there is no cube."""
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(cube_path()):
+        return None
+    metadata = pq.read_schema(cube_path()).metadata or {}
+    return json.loads(metadata.get(PARTS_METADATA_KEY, b'{}'))
+
+
+def update_cube():
+    """
+    Fold feature store parts that are not in the cube yet into it.
+
+    The open part's aggregates are replaced whenever the part was rewritten.
+
+    Returns:
+    - int: Number of parts added or replaced (0 if the cube was current), or -1 after a full rebuild.
+    """
+    import pyarrow.parquet as pq
+
+    store_dir = os.path.join(feature_store.DATA_DIR, feature_store.STORE_NAME)
+    files = feature_store.store_files(store_dir)
+    included = read_cube_parts()
+    current = _part_signature(files)
+    changed = [name for name, digest in (included or {}).items()
+               if name != OPEN_FILE and current.get(name) != digest]
+    # A cube without recorded parts was built from the CSV and cannot be extended part by part,
+    # and cubes written before the open part was tracked have no open_part column
+    if (not files or not included or changed
+            or 'open_part' not in pq.read_schema(cube_path()).names):
+        build_cube()
+        return -1
+    closed_files, open_file = _split_open(files)
+    new_files = [f for f in closed_files if os.path.basename(f) not in included]
+    open_changed = current.get(OPEN_FILE) != included.get(OPEN_FILE)
+    if not new_files and not open_changed:
+        return 0
+    available = pq.read_schema(files[0]).names
+    columns = [col for col in SOURCE_COLUMNS if col in available]
+    old_monthly = pd.read_parquet(cube_path())
+    old_climatology = pd.read_parquet(climatology_path())
+    names = [old_monthly[['station_id', 'station_name_x']]]
+    monthly = [old_monthly.drop(columns='station_name_x')]
+    climatology = [old_climatology]
+    if open_changed:
+        monthly = [frame[~frame['open_part']] for frame in monthly]
+        climatology = [frame[~frame['open_part']] for frame in climatology]
+    result = _aggregate_parts(new_files, open_file if open_changed else None, columns,
+                              _rainfall_scaling(available))
+    if result is not None:
+        monthly.append(result[0])
+        climatology.append(result[1])
+        names.append(result[2])
+    # Numbered parts are merged into the stored aggregates; open rows stay separate
+    monthly = pd.concat(monthly, ignore_index=True)
+    climatology = pd.concat(climatology, ignore_index=True)
+    monthly = pd.concat([_combine(monthly[monthly['open_part'] == flag], ['station_id', 'year', 'month'])
+                         .assign(open_part=flag) for flag in [False, True]], ignore_index=True)
+    climatology = pd.concat([_combine(climatology[climatology['open_part'] == flag], ['station_id', 'day_of_year'])
+                             .assign(open_part=flag) for flag in [False, True]], ignore_index=True)
+    names = pd.concat(names).drop_duplicates('station_id')
+    _write(monthly, climatology, names, current)
+    return len(new_files) + int(open_changed)
+
+
+class RainfallCube:
+    """
+    Dense in-memory form of the cube for fast aggregate queries.
+
+    Parameters:
+    - monthly (pd.DataFrame): Contents of rainfall_cube.parquet.
+    - climatology (pd.DataFrame): Contents of rainfall_climatology.parquet.
+    """
+
+    def __init__(self, monthly, climatology):
+        self.stations = pd.Index(np.sort(monthly['station_id'].unique()), name='station_id')
+        self.station_names = (monthly.drop_duplicates('station_id').set_index('station_id')['station_name_x']
+                              .reindex(self.stations))
+        self.years = pd.Index(np.arange(monthly['year'].min(), monthly['year'].max() + 1), name='year')
+        # Measures are stacked on the last axis so a query is one slice and one reduction
+        s = self.stations.get_indexer(monthly['station_id'])
+        y = self.years.get_indexer(monthly['year'])
+        m = monthly['month'].to_numpy() - 1
+        self.monthly = np.zeros((len(self.stations), len(self.years), 12, len(MEASURES)))
+        self.monthly[s, y, m] = monthly[MEASURES].to_numpy(dtype=np.float64)
+        s = self.stations.get_indexer(climatology['station_id'])
+        d = climatology['day_of_year'].to_numpy() - 1
+        self.climatology = np.zeros((len(self.stations), 366, len(MEASURES)))
+        self.climatology[s, d] = climatology[MEASURES].to_numpy(dtype=np.float64)
+        self._month_labels = pd.Index(np.arange(1, 13), name='month')
+
+    @classmethod
+    def load(cls):
+        monthly = pd.read_parquet(cube_path())
+        climatology = pd.read_parquet(climatology_path())
+        # Open-part aggregates share keys with the rest (always for day of year)
+        names = monthly[['station_id', 'station_name_x']].drop_duplicates('station_id')
+        monthly = _combine(monthly, ['station_id', 'year', 'month']).merge(names, on='station_id', how='left')
+        return cls(monthly, _combine(climatology, ['station_id', 'day_of_year']))
+
+    def _station_rows(self, stations):
+        if stations is None:
+            return np.arange(len(self.stations))
+        rows = self.stations.get_indexer([int(s) for s in stations])
+        return rows[rows >= 0]
+
+    def query(self, stations=None, years=None, months=None, by=('station',)):
+        """
+        Rainfall aggregates over the selected cells.
+
+        Parameters:
+        - stations (list, optional): station_id values. Defaults to all stations.
+        - years (tuple or list, optional): Inclusive (start, end) year range, or a list of years.
+        - months (list, optional): Months 1-12. Defaults to all months.
+        - by (str or tuple, optional): Dimensions to keep, from 'station', 'year' and 'month';
+          empty for a single total.
+
+        Returns:
+        - pd.DataFrame: total_mm, days, max_mm, extreme_days and mean_mm per kept cell,
+          without cells that have no observed days.
+        """
+        by = (by,) if isinstance(by, str) else tuple(by)
+        unknown = set(by) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {sorted(unknown)}")
+        s = self._station_rows(stations)
+        if years is None:
+            y = slice(None)
+        elif isinstance(years, tuple):
+            start, end = years
+            y = slice(0 if start is None else self.years.searchsorted(start),
+                      len(self.years) if end is None else self.years.searchsorted(end, side='right'))
+        else:
+            y = self.years.get_indexer(list(years))
+            y = y[y >= 0]
+        m = slice(None) if months is None else np.asarray(months, dtype=np.int64) - 1
+        cells = self.monthly[s][:, y][:, :, m]
+
+        axes = tuple(i for i, dim in enumerate(DIMENSIONS) if dim not in by)
+        totals = cells.sum(axis=axes)
+        totals[..., MAX] = cells[..., MAX].max(axis=axes, initial=0.0)
+        totals = totals.reshape(-1, len(MEASURES))
+        kept = [dim for dim in DIMENSIONS if dim in by]
+        if kept:
+            labels = {
+                'station': self.stations[s],
+                'year': self.years[y],
+                'month': self._month_labels[m],
+            }
+            if len(kept) == 1:
+                index = labels[kept[0]]
+            else:
+                index = pd.MultiIndex.from_product([labels[dim] for dim in kept],
+                                                   names=[labels[dim].name for dim in kept])
+        else:
+            index = pd.RangeIndex(1)
+        observed = totals[:, DAYS] > 0
+        totals = totals[observed]
+        return pd.DataFrame({
+            'total_mm': totals[:, TOTAL],
+            'days': totals[:, DAYS].astype(np.int64),
+            'max_mm': totals[:, MAX],
+            'extreme_days': totals[:, EXTREME].astype(np.int64),
+            'mean_mm': totals[:, TOTAL] / totals[:, DAYS],
+        }, index=index[observed])
+
+    def climatology_profile(self, stations=None):
+        """
+        Day-of-year climatology over the selected stations.
+
+        Returns:
+        - pd.DataFrame: mean_mm, max_mm, extreme_probability and days per day of year.
+        """
+        cells = self.climatology[self._station_rows(stations)]
+        totals = cells.sum(axis=0)
+        observed = totals[:, DAYS] > 0
+        totals = totals[observed]
+        return pd.DataFrame({
+            'mean_mm': totals[:, TOTAL] / totals[:, DAYS],
+            'max_mm': cells[:, observed, MAX].max(axis=0, initial=0.0),
+            'extreme_probability': totals[:, EXTREME] / totals[:, DAYS],
+            'days': totals[:, DAYS].astype(np.int64),
+        }, index=pd.Index(np.arange(1, 367)[observed], name='day_of_year'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the pre-aggregated rainfall cube.")
+    parser.add_argument('--update', action='store_true', help="Only fold in new feature store parts")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.update:
+        added = update_cube()
+        status = "rebuilt" if added < 0 else f"updated with {added} new parts"
+        print(f"Rainfall cube {status} in {time.perf_counter() - start:.1f}s")
+    else:
+        cells = build_cube()
+        print(f"Rainfall cube built with {cells} station-months in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
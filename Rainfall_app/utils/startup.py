@@ -0,0 +1,318 @@
+"""
+Startup profiling, lazy imports and background warmup for the Streamlit app.
+
+The first visit to a page used to pay for every heavy import (plotly, folium,
+sklearn through the model pickles) and for loading the dataset and models
+before anything was drawn. This module keeps that off the first-paint path:
+
+- lazy_import() returns a module proxy that imports on first attribute access,
+  so a page can draw its title before plotly is loaded.
+- start_warmup(), called from app.py, preloads the heavy modules, the feature
+  index and the models into the shared data_utils cache on a daemon thread
+  while the Home page renders. It runs once per process.
+- PageTimer records each page's time to first paint and to a complete render,
+  once per session, in data/cache/startup_metrics.csv. Once the file exceeds
+  METRICS_MAX_BYTES its older half is dropped.
+
+Only the standard library is imported here so that importing this module does
+not itself delay the first paint.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.startup              # import-time profile of the heavy dependencies
+    python -m utils.startup --metrics    # recorded time-to-first-paint per page
+"""
+import argparse
+import csv
+import importlib
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+METRICS_FILE = 'startup_metrics.csv'
+METRICS_MAX_BYTES = 1024 * 1024
+METRICS_FIELDS = ['timestamp', 'page', 'cold', 'warmup_done', 'first_paint_ms', 'render_ms', 'since_start_ms']
+
+# Third-party and app modules profiled by the startup report
+HEAVY_MODULES = [
+    'streamlit', 'numpy', 'pandas', 'pyarrow.parquet', 'sklearn.ensemble', 'plotly.express',
+    'plotly.graph_objects', 'folium', 'textblob', 'utils.data_utils', 'utils.visualization_utils',
+    'utils.inference'
+]
+# Imported by the warmup thread; the data loaders below pull in sklearn and pyarrow
+WARMUP_IMPORTS = ['plotly.express', 'plotly.graph_objects', 'plotly.subplots', 'folium']
+
+# Feature columns read by the Regional Analysis page; warmed cache keys must match the pages'
+REGIONAL_COLUMNS = ['station_id', 'station_name_x', 'lat(deg)', 'lon(deg)', 'rainfall_sum']
+
+PROCESS_START = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+_import_times = {}
+_warmup = {'thread': None, 'done': False, 'timings': {}, 'errors': {}}
+_warmup_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+
+
+class LazyModule:
+    """Proxy that imports the named module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            _import_times.setdefault(self._name, time.perf_counter() - start)
+            self._module = module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """
+    Import a module on first use.
+
+    Parameters:
+    - name (str): Dotted module name, e.g. 'plotly.express'.
+
+    Returns:
+    - module or LazyModule: The module itself if it is already imported, else a proxy.
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def import_times():
+    """Seconds spent in each import triggered through a LazyModule in this process."""
+    return dict(_import_times)
+
+
+def _warmup_tasks():
+    from utils import data_utils, inference, prediction_store
+
+    prediction_columns = ['date', 'rainfall_sum'] + inference.FEATURE_COLUMNS
+    return [
+        ('station_index', lambda: data_utils.load_station_index(columns=prediction_columns)),
+        # The pickles are only needed for live history inference, i.e. when the prediction store is stale
+        ('regression_service', lambda: prediction_store.is_current() or inference.get_regression_service()),
+        ('compact_models', lambda: (data_utils.load_compact_reg_model(), data_utils.load_compact_clf_model())),
+        ('feature_transforms', data_utils.load_feature_transforms),
+        ('feature_defaults', lambda: data_utils.feature_defaults(inference.FEATURE_COLUMNS)),
+        ('evaluation_results', data_utils.load_model_evaluation_results),
+        ('regional_performance', lambda: (data_utils.load_regional_performance_regression(),
+                                          data_utils.load_regional_performance_classification())),
+        ('regional_features', lambda: data_utils.load_feature_data(columns=REGIONAL_COLUMNS)),
+        ('station_locations', data_utils.load_station_locations),
+        ('rainfall_cube', data_utils.load_rainfall_cube),
+        ('nlp_results', lambda: (data_utils.load_nlp_results(), data_utils.load_lda_topics())),
+    ]
+
+
+def _run_warmup():
+    start = time.perf_counter()
+    for name in WARMUP_IMPORTS:
+        task_start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            _warmup['errors'][name] = str(e)
+        _warmup['timings'][name] = time.perf_counter() - task_start
+    for name, task in _warmup_tasks():
+        task_start = time.perf_counter()
+        try:
+            task()
+        except Exception as e:
+            # A missing file only means that page will report it when visited
+            _warmup['errors'][name] = str(e)
+        _warmup['timings'][name] = time.perf_counter() - task_start
+    _warmup['done'] = True
+    logger.info(f"Warmup finished in {time.perf_counter() - start:.1f}s "
+                f"({len(_warmup['errors'])} tasks skipped)")
+
+
+def start_warmup():
+    """
+    Preload heavy modules, the feature index and the models on a background thread.
+
+    Safe to call on every script run: the thread is started once per process.
+
+    Returns:
+    - threading.Thread: The warmup thread.
+    """
+    with _warmup_lock:
+        if _warmup['thread'] is None:
+            _warmup['thread'] = threading.Thread(target=_run_warmup, name='rainfall-warmup', daemon=True)
+            _warmup['thread'].start()
+        return _warmup['thread']
+
+
+def warmup_status():
+    """Whether the warmup finished, with per-task seconds and the errors of skipped tasks."""
+    return {'started': _warmup['thread'] is not None, 'done': _warmup['done'],
+            'timings': dict(_warmup['timings']), 'errors': dict(_warmup['errors'])}
+
+
+def metrics_path():
+    from utils.data_utils import CACHE_DIR
+
+    return os.path.join(CACHE_DIR, METRICS_FILE)
+
+
+class PageTimer:
+    """
+    Time to first paint and to a complete render of a page script.
+
+    Create it at the top of the page, call first_paint() once the first content
+    (the title) is drawn and done() at the end. Only the first render of each
+    page in a session is recorded; reruns triggered by widgets are not startup.
+
+    Parameters:
+    - page (str): Page name written to the metrics file.
+    """
+
+    _cold_pages = set()
+
+    def __init__(self, page):
+        import streamlit as st
+
+        self.page = page
+        self.start = time.perf_counter()
+        self.first_paint_seconds = None
+        state_key = f"_startup_recorded_{page}"
+        self.record = not st.session_state.get(state_key, False)
+        st.session_state[state_key] = True
+
+    def first_paint(self):
+        if self.first_paint_seconds is None:
+            self.first_paint_seconds = time.perf_counter() - self.start
+
+    def done(self):
+        if not self.record:
+            return
+        self.record = False
+        end = time.perf_counter()
+        cold = self.page not in PageTimer._cold_pages
+        PageTimer._cold_pages.add(self.page)
+        first_paint = self.first_paint_seconds if self.first_paint_seconds is not None else end - self.start
+        row = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'page': self.page,
+            'cold': int(cold),
+            'warmup_done': int(_warmup['done']),
+            'first_paint_ms': round(first_paint * 1000, 1),
+            'render_ms': round((end - self.start) * 1000, 1),
+            'since_start_ms': round((end - PROCESS_START) * 1000, 1),
+        }
+        try:
+            _append_metrics(row)
+        except OSError as e:
+            logger.warning(f"Could not record startup metrics: {e}")
+
+
+def _append_metrics(row, file_path=None):
+    file_path = file_path or metrics_path()
+    with _metrics_lock:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        new_file = not os.path.exists(file_path)
+        with open(file_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=METRICS_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+        if os.path.getsize(file_path) > METRICS_MAX_BYTES:
+            _truncate_metrics(file_path)
+
+
+def _truncate_metrics(file_path):
+    """Keep the header and the newer half of the recorded rows."""
+    with open(file_path, encoding='utf-8') as f:
+        lines = f.readlines()
+    rows = lines[1:]
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:1] + rows[len(rows) // 2:])
+    os.replace(tmp_path, file_path)
+
+
+def profile_imports(modules=HEAVY_MODULES):
+    """
+    Cold import time of each module, each measured in a fresh interpreter.
+
+    Parameters:
+    - modules (list, optional): Dotted module names.
+
+    Returns:
+    - pd.DataFrame: module, self_ms and cumulative_ms (NaN if the import failed),
+      slowest first.
+    """
+    import pandas as pd
+
+    from utils.data_utils import BASE_DIR
+
+    rows = []
+    for name in modules:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {name}"],
+                                cwd=BASE_DIR, capture_output=True, text=True)
+        self_us = cumulative_us = None
+        if result.returncode == 0:
+            # Lines look like "import time:      1234 |      5678 | package.module"; the target is last
+            for line in result.stderr.splitlines():
+                match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)', line)
+                if match and match.group(3) == name:
+                    self_us, cumulative_us = int(match.group(1)), int(match.group(2))
+        rows.append({
+            'module': name,
+            'self_ms': None if self_us is None else self_us / 1000,
+            'cumulative_ms': None if cumulative_us is None else cumulative_us / 1000,
+        })
+    return pd.DataFrame(rows).sort_values('cumulative_ms', ascending=False, na_position='last', ignore_index=True)
+
+
+def metrics_summary(file_path=None):
+    """
+    Time-to-first-paint per page from the recorded metrics.
+
+    Returns:
+    - pd.DataFrame: Runs, median and 95th percentile first paint and render times per page and cold flag.
+    """
+    import pandas as pd
+
+    metrics = pd.read_csv(file_path or metrics_path())
+    grouped = metrics.groupby(['page', 'cold'])
+    summary = grouped.agg(runs=('page', 'size'), warmup_done=('warmup_done', 'mean'),
+                          first_paint_median_ms=('first_paint_ms', 'median'),
+                          render_median_ms=('render_ms', 'median'))
+    summary['first_paint_p95_ms'] = grouped['first_paint_ms'].quantile(0.95)
+    summary['render_p95_ms'] = grouped['render_ms'].quantile(0.95)
+    return summary.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup profile of the Rainfall app.")
+    parser.add_argument('--metrics', action='store_true', help="Summarize recorded time-to-first-paint instead")
+    parser.add_argument('modules', nargs='*', help="Modules to profile (defaults to the heavy dependencies)")
+    args = parser.parse_args()
+
+    if args.metrics:
+        if not os.path.exists(metrics_path()):
+            print(f"No startup metrics recorded yet at {metrics_path()}")
+            return
+        print(metrics_summary().to_string(index=False))
+        return
+    report = profile_imports(args.modules or HEAVY_MODULES)
+    print(report.to_string(index=False, float_format='{:.1f}'.format))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Station/date index over the feature data.
+
+Rows are kept sorted by station then date, and each station's rows form one
+contiguous block recorded in an offset table. A (stations, date range) query
+is answered by two binary searches per station, so filtering costs time
+proportional to the number of selected rows rather than a scan of the table.
+"""
+import numpy as np
+import pandas as pd
+
+
+class StationDateIndex:
+    """
+    Feature data sorted by (station_id, date) with per-station offsets.
+
+    Parameters:
+    - frame (pd.DataFrame): Feature data containing at least 'station_id' and 'date'.
+    """
+
+    def __init__(self, frame):
+        frame = frame.copy()
+        frame['date'] = pd.to_datetime(frame['date'])
+        station_ids = frame['station_id'].to_numpy()
+        dates = frame['date'].to_numpy(dtype='datetime64[ns]').view('int64')
+        order = np.lexsort((dates, station_ids))
+        if not np.array_equal(order, np.arange(len(order))):
+            frame = frame.iloc[order]
+            station_ids = station_ids[order]
+            dates = dates[order]
+        self.data = frame.reset_index(drop=True)
+        self._dates = dates
+
+        self.stations, starts = np.unique(station_ids, return_index=True)
+        stops = np.append(starts[1:], len(station_ids))
+        self.offsets = {
+            int(sid): (int(start), int(stop))
+            for sid, start, stop in zip(self.stations, starts, stops)
+        }
+        if 'station_name_x' in self.data.columns and len(self.data):
+            names = self.data['station_name_x'].iloc[starts]
+            self.station_names = {int(sid): str(name) for sid, name in zip(self.stations, names)}
+        else:
+            self.station_names = {int(sid): 'Unknown' for sid in self.stations}
+
+        if len(dates):
+            self.date_min = pd.Timestamp(dates.min())
+            self.date_max = pd.Timestamp(dates.max())
+        else:
+            self.date_min = self.date_max = None
+
+    def __len__(self):
+        return len(self.data)
+
+    def locate(self, station_id, start=None, end=None):
+        """
+        Return the (lo, hi) row positions of one station's rows within [start, end].
+
+        Parameters:
+        - station_id (int): Station to look up.
+        - start, end (date-like, optional): Inclusive date bounds.
+
+        Returns:
+        - tuple: Half-open row range; (0, 0) if the station is unknown.
+        """
+        block = self.offsets.get(int(station_id))
+        if block is None:
+            return 0, 0
+        lo, hi = block
+        dates = self._dates[lo:hi]
+        if start is not None:
+            lo += int(np.searchsorted(dates, _to_ns(start), side='left'))
+            dates = self._dates[lo:hi]
+        if end is not None:
+            hi = lo + int(np.searchsorted(dates, _to_ns(end), side='right'))
+        return lo, hi
+
+    def positions(self, stations=None, start=None, end=None):
+        """Return the row positions of the selected stations within the date range."""
+        stations = self.stations if stations is None else stations
+        ranges = [self.locate(sid, start, end) for sid in stations]
+        ranges = [(lo, hi) for lo, hi in sorted(ranges) if hi > lo]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(lo, hi) for lo, hi in ranges])
+
+    def select(self, stations=None, start=None, end=None, columns=None):
+        """
+        Return the rows of the selected stations within [start, end] as a new dataframe.
+
+        Parameters:
+        - stations (list, optional): station_id values. Defaults to all stations.
+        - start, end (date-like, optional): Inclusive date bounds.
+        - columns (list, optional): Columns to return. Defaults to all columns.
+
+        Returns:
+        - pd.DataFrame: Selected rows, ordered by station then date.
+        """
+        frame = self.data if columns is None else self.data[list(columns)]
+        return frame.take(self.positions(stations, start, end)).reset_index(drop=True)
+
+
+def _to_ns(value):
+    return pd.Timestamp(value).to_datetime64().astype('datetime64[ns]').view('int64')
@@ -0,0 +1,220 @@
+"""
+Persisted online LDA topic model of the news articles.
+
+topic_modeling() in NLP.ipynb builds a new gensim Dictionary and retrains
+LdaModel (10 passes) on the whole corpus every run, and keeps only the top-5
+keywords. TopicModel trains that model once, saves the dictionary and model
+under data/topic_model/, and folds new articles in with LdaModel.update(), the
+online variational Bayes minibatch update, so a daily run costs O(new
+articles). Each article's dominant topic is stored in article_topics.csv next
+to nlp_results.csv, keyed by a hash of its cleaned text, and lda_topics.txt is
+rewritten from the updated model.
+
+The vocabulary is fixed when the model is first trained (an LdaModel cannot
+grow it); words first seen later are ignored until the model is rebuilt with
+rebuild=True / --rebuild, which retrains on every article seen so far.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.topic_model data/nlp_results.csv
+    python -m utils.topic_model data/nlp_results.csv --rebuild
+"""
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import time
+
+import pandas as pd
+
+MODEL_DIR = 'topic_model'
+ASSIGNMENTS_FILE = 'article_topics.csv'
+TOPICS_FILE = 'lda_topics.txt'
+NUM_TOPICS = 3
+TOP_WORDS = 5
+INITIAL_PASSES = 10
+
+logger = logging.getLogger(__name__)
+
+
+def article_key(clean_text):
+    """Stable key of an article for its topic assignment."""
+    text = clean_text if isinstance(clean_text, str) else ''
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class TopicModel:
+    """
+    Gensim dictionary and LDA model persisted in a directory.
+
+    Parameters:
+    - directory (str): Model directory. Defaults to data/topic_model.
+    - num_topics (int, optional): Topics of a newly trained model.
+    """
+
+    def __init__(self, directory=None, num_topics=NUM_TOPICS):
+        if directory is None:
+            from utils.data_utils import DATA_DIR
+            directory = os.path.join(DATA_DIR, MODEL_DIR)
+        self.directory = directory
+        self.num_topics = num_topics
+        self.dictionary = None
+        self.lda = None
+
+    @property
+    def trained(self):
+        return self.lda is not None
+
+    def load(self):
+        """Load the saved dictionary and model if present; returns self."""
+        from gensim import corpora
+        from gensim.models import LdaModel
+
+        model_path = os.path.join(self.directory, 'lda.model')
+        if os.path.exists(model_path):
+            self.dictionary = corpora.Dictionary.load(os.path.join(self.directory, 'lda.dict'))
+            self.lda = LdaModel.load(model_path)
+            self.num_topics = self.lda.num_topics
+        return self
+
+    def save(self):
+        # gensim writes several files per model; swap the whole directory in at once
+        tmp_dir = self.directory + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        self.dictionary.save(os.path.join(tmp_dir, 'lda.dict'))
+        self.lda.save(os.path.join(tmp_dir, 'lda.model'))
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(tmp_dir, self.directory)
+
+    def fit(self, documents):
+        """Train a new dictionary and model on token lists, as the notebook does."""
+        from gensim import corpora
+        from gensim.models import LdaModel
+
+        self.dictionary = corpora.Dictionary(documents)
+        corpus = [self.dictionary.doc2bow(doc) for doc in documents]
+        self.lda = LdaModel(corpus, num_topics=self.num_topics, id2word=self.dictionary,
+                            passes=INITIAL_PASSES, random_state=42, minimum_probability=0.0)
+        return self
+
+    def update(self, documents):
+        """Fold new token lists into the model with an online minibatch update."""
+        corpus = [bow for bow in (self.dictionary.doc2bow(doc) for doc in documents) if bow]
+        if corpus:
+            self.lda.update(corpus)
+        return self
+
+    def assign(self, documents):
+        """
+        Dominant topic of each token list.
+
+        Returns:
+        - pd.DataFrame: dominant_topic (nullable int) and topic_probability per document.
+        """
+        topics, probabilities = [], []
+        for doc in documents:
+            bow = self.dictionary.doc2bow(doc)
+            distribution = self.lda.get_document_topics(bow, minimum_probability=0.0) if bow else []
+            if distribution:
+                topic, probability = max(distribution, key=lambda x: x[1])
+            else:
+                topic, probability = None, None
+            topics.append(topic)
+            probabilities.append(probability)
+        return pd.DataFrame({'dominant_topic': pd.array(topics, dtype='Int64'), 'topic_probability': probabilities})
+
+    def topics(self, topn=TOP_WORDS):
+        return [
+            {'topic': i, 'keywords': [word for word, _ in self.lda.show_topic(i, topn=topn)]}
+            for i in range(self.num_topics)
+        ]
+
+    def write_topics(self, path, topn=TOP_WORDS):
+        with open(path, 'w', encoding='utf-8') as f:
+            for topic in self.topics(topn):
+                f.write(f"Topic {topic['topic']}: {', '.join(topic['keywords'])}\n")
+
+
+def update_topics(articles, data_dir=None, rebuild=False, num_topics=NUM_TOPICS):
+    """
+    Fold new articles into the saved topic model and store their assignments.
+
+    Parameters:
+    - articles (pd.DataFrame): Analysed articles with a clean_text column.
+    - data_dir (str, optional): Directory of the model, assignments and topics files.
+    - rebuild (bool, optional): Retrain from scratch on every stored and given article.
+    - num_topics (int, optional): Topics when a model is (re)trained.
+
+    Returns:
+    - pd.DataFrame: dominant_topic and topic_probability for each row of articles.
+    """
+    if data_dir is None:
+        from utils.data_utils import DATA_DIR
+        data_dir = DATA_DIR
+    assignments_path = os.path.join(data_dir, ASSIGNMENTS_FILE)
+    model = TopicModel(os.path.join(data_dir, MODEL_DIR), num_topics)
+    if not rebuild:
+        model.load()
+
+    clean = articles['clean_text'].where(articles['clean_text'].notna(), '').astype(str)
+    keys = clean.map(article_key)
+    stored = None
+    if os.path.exists(assignments_path):
+        stored = pd.read_csv(assignments_path, dtype={'dominant_topic': 'Int64'}, keep_default_na=False,
+                             na_values={'dominant_topic': [''], 'topic_probability': ['']})
+    unique = ~keys.duplicated()
+    new = pd.DataFrame({'article_key': keys[unique], 'clean_text': clean[unique]})
+    if stored is not None:
+        new = new[~new['article_key'].isin(stored['article_key'])]
+
+    start = time.perf_counter()
+    if rebuild or not model.trained:
+        # (Re)train on every article seen so far and reassign all of them
+        pending = new if stored is None else pd.concat([stored[['article_key', 'clean_text']], new])
+        documents = [text.split() for text in pending['clean_text']]
+        if not any(documents):
+            logger.warning("No valid texts for topic modeling.")
+            return pd.DataFrame({'dominant_topic': pd.array([None] * len(articles), dtype='Int64'),
+                                 'topic_probability': [None] * len(articles)}, index=articles.index)
+        model.fit([doc for doc in documents if doc])
+        stored = None
+    else:
+        pending = new
+        documents = [text.split() for text in pending['clean_text']]
+        model.update(documents)
+
+    if len(pending):
+        assigned = model.assign(documents)
+        assigned.insert(0, 'article_key', pending['article_key'].to_numpy())
+        assigned['clean_text'] = pending['clean_text'].to_numpy()
+        assigned['model_updated'] = pd.Timestamp.now().isoformat(timespec='seconds')
+        stored = assigned if stored is None else pd.concat([stored, assigned], ignore_index=True)
+        stored.to_csv(assignments_path + '.tmp', index=False, encoding='utf-8')
+        os.replace(assignments_path + '.tmp', assignments_path)
+        model.save()
+        model.write_topics(os.path.join(data_dir, TOPICS_FILE))
+        logger.info(f"Topic model updated with {len(pending)} articles in {time.perf_counter() - start:.1f}s")
+
+    lookup = stored.drop_duplicates('article_key', keep='last').set_index('article_key')
+    result = lookup.reindex(keys)[['dominant_topic', 'topic_probability']]
+    result.index = articles.index
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the persisted news topic model.")
+    parser.add_argument('articles', help="Analysed articles CSV with a clean_text column")
+    parser.add_argument('--rebuild', action='store_true', help="Retrain from scratch on every article seen")
+    parser.add_argument('--topics', type=int, default=NUM_TOPICS, help="Topics when (re)training")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.perf_counter()
+    result = update_topics(pd.read_csv(args.articles), rebuild=args.rebuild, num_topics=args.topics)
+    print(f"Assigned topics to {len(result)} articles in {time.perf_counter() - start:.1f}s")
+    print(result['dominant_topic'].value_counts(dropna=False).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,712 @@
+"""
+Hyperparameter search for the rainfall models.
+
+Replaces the exhaustive GridSearchCV of Modeling_technique.ipynb with
+successive halving over time-series folds: every candidate is first scored on
+a small, most recent slice of each fold's training window, and only the best
+1/factor of the candidates move on to a factor-times larger slice, until the
+survivors are scored on the full windows. Folds follow TimeSeriesSplit, so each
+training window and validation block is a contiguous slice of the date-sorted
+arrays and is passed around as a view, never copied.
+
+Each (estimator, params, fold, resources, data hash) score is appended to a
+JSON-lines cache as soon as it is computed, so an interrupted search, or one
+re-run with more candidates, only fits what is missing. Fits run in parallel
+on all cores through joblib.
+
+For histories that do not fit in memory, the streaming path reads float32
+batches straight from the feature store, splits train and validation at a date
+boundary, and fits either an incremental learner (partial_fit) or a
+warm-started forest that grows a few trees per batch. The store is sorted by
+station, then date, so training batches are drawn through a shuffle buffer
+from row groups read in random order; otherwise every batch would hold one or
+two stations. Memory stays bounded by a few batches. full_fit_baseline() fits
+the same forest in memory on the same rows to measure what streaming costs.
+
+cross_validate() runs the TimeSeriesSplit folds of a fixed estimator in a
+process pool. The arrays are saved once as .npy files that every worker
+memory-maps, so only the estimator and the fold bounds are pickled per fold;
+fold metrics and timings go to the same cache.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.training --task regression
+    python -m utils.training --task classification --model gradient_boosting --output model.pkl
+    python -m utils.training --task regression --stream forest --output model.pkl
+    python -m utils.training --task regression --stream forest --baseline   # compare with a full fit
+    python -m utils.training --cv 5 --workers 8   # validate both saved forests
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from utils import data_utils, feature_store
+from utils.inference import FEATURE_COLUMNS
+
+CACHE_FILE = 'tuning_scores.jsonl'
+DEFAULT_BATCH_SIZE = 200000
+TARGETS = {'regression': 'rainfall_sum', 'classification': 'extreme_rainfall'}
+
+# Grids of the notebook (random forest) plus a gradient boosting grid of similar size
+PARAM_GRIDS = {
+    'random_forest': {
+        'n_estimators': [100, 200],
+        'max_depth': [10, 20, None],
+        'min_samples_split': [2, 5],
+    },
+    'gradient_boosting': {
+        'n_estimators': [100, 200],
+        'learning_rate': [0.05, 0.1],
+        'max_depth': [3, 5],
+    },
+}
+
+
+def make_estimator(model, task, **params):
+    """Return an unfitted estimator of the given family for the task."""
+    from sklearn.ensemble import (GradientBoostingClassifier, GradientBoostingRegressor,
+                                  RandomForestClassifier, RandomForestRegressor)
+
+    classes = {
+        ('random_forest', 'regression'): RandomForestRegressor,
+        ('random_forest', 'classification'): RandomForestClassifier,
+        ('gradient_boosting', 'regression'): GradientBoostingRegressor,
+        ('gradient_boosting', 'classification'): GradientBoostingClassifier,
+    }
+    if (model, task) not in classes:
+        raise ValueError(f"Unknown model/task: {model}/{task}")
+    return classes[(model, task)](random_state=42, **params)
+
+
+def load_training_arrays(task, features=None, validation_fraction=0.2):
+    """
+    Load the training part of the feature data as contiguous arrays.
+
+    Rows are sorted by date and the last validation_fraction is held out, as in
+    the notebook's split_data.
+
+    Returns:
+    - tuple: (X_train, y_train, X_val, y_val, features); X arrays are C-contiguous float32.
+    """
+    features = [f for f in (features or FEATURE_COLUMNS)]
+    target = TARGETS[task]
+    data = data_utils.load_feature_data(columns=features + [target, 'date'])
+    features = [f for f in features if f in data.columns]
+    order = np.argsort(data['date'].to_numpy(), kind='stable')
+    X = np.ascontiguousarray(data[features].fillna(0).to_numpy(dtype=np.float32)[order])
+    y = data[target].fillna(0).to_numpy()[order]
+    if task == 'classification':
+        y = y.astype(np.int64)
+    split = int(len(X) * (1 - validation_fraction))
+    return X[:split], y[:split], X[split:], y[split:], features
+
+
+def time_series_folds(n_samples, n_splits=3):
+    """
+    Return TimeSeriesSplit folds as (train_stop, val_stop) bounds.
+
+    Fold k trains on rows [0, train_stop) and validates on [train_stop, val_stop),
+    so both parts are plain slices of the arrays.
+    """
+    test_size = n_samples // (n_splits + 1)
+    if test_size == 0:
+        raise ValueError(f"Cannot split {n_samples} rows into {n_splits} folds")
+    first = n_samples - n_splits * test_size
+    return [(first + k * test_size, first + (k + 1) * test_size) for k in range(n_splits)]
+
+
+def data_hash(X, y):
+    """Content hash of the training arrays, part of every cached score key."""
+    digest = hashlib.sha256()
+    for array in (X, y):
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.dtype, array.shape)).encode())
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+class ScoreCache:
+    """
+    Append-only JSON-lines store of fold scores.
+
+    Parameters:
+    - path (str): Cache file; created on the first record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.scores = {}
+        self.records = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A search killed mid-write leaves at most one partial line
+                        continue
+                    self.scores[record['key']] = record['score']
+                    self.records[record['key']] = record
+
+    @staticmethod
+    def key(estimator_name, params, fold, n_resources, dataset_hash):
+        payload = json.dumps([estimator_name, params, fold, n_resources, dataset_hash],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        return self.scores.get(key)
+
+    def record(self, key):
+        """Full cached record (score plus the info stored with it), or None."""
+        return self.records.get(key)
+
+    def add(self, key, score, **info):
+        record = {'key': key, 'score': score, **info}
+        self.scores[key] = score
+        self.records[key] = record
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+
+def _window_starts(y, folds, task):
+    """
+    Latest start per fold that still keeps every class in the training window.
+
+    Small early-round windows of a rare class (extreme rainfall) may otherwise
+    contain a single class, which classifiers cannot be fitted on.
+    """
+    if task != 'classification':
+        return [None] * len(folds)
+    starts = []
+    for train_stop, _ in folds:
+        window = y[:train_stop]
+        starts.append(min(int(np.flatnonzero(window == c)[-1]) for c in np.unique(window)))
+    return starts
+
+
+def _fit_and_score(estimator, X, y, train_start, train_stop, val_stop, task):
+    """Fit on X[train_start:train_stop] and score on the following validation block."""
+    from sklearn.metrics import f1_score, r2_score
+
+    start = time.perf_counter()
+    estimator.fit(X[train_start:train_stop], y[train_start:train_stop])
+    y_pred = estimator.predict(X[train_stop:val_stop])
+    y_val = y[train_stop:val_stop]
+    score = r2_score(y_val, y_pred) if task == 'regression' else f1_score(y_val, y_pred, zero_division=0)
+    return float(score), time.perf_counter() - start
+
+
+def _single_threaded(estimator):
+    # joblib already runs one fit per core
+    if hasattr(estimator, 'n_jobs'):
+        estimator.n_jobs = 1
+    return estimator
+
+
+def successive_halving(model, param_grid, X, y, task='regression', n_splits=3, factor=3,
+                       min_resources=None, cache=None, n_jobs=-1, verbose=True):
+    """
+    Successive-halving search over a parameter grid with time-series folds.
+
+    Parameters:
+    - model (str): Estimator family, a key of PARAM_GRIDS.
+    - param_grid (dict): Parameter lists, expanded like GridSearchCV.
+    - X, y (np.ndarray): Date-sorted training arrays.
+    - task (str, optional): 'regression' (scored by R2) or 'classification' (F1).
+    - n_splits (int, optional): Number of time-series folds.
+    - factor (int, optional): Candidates kept per round are 1/factor; resources grow by factor.
+    - min_resources (int, optional): Training rows per fold in the first round.
+      Defaults to the size needed to reach the full windows in the last round.
+    - cache (ScoreCache, optional): Persisted scores to reuse and extend.
+    - n_jobs (int, optional): Parallel fits (all cores by default).
+
+    Returns:
+    - tuple: (best_params, history DataFrame with one row per candidate and round).
+    """
+    from joblib import Parallel, delayed
+
+    candidates = [dict(zip(param_grid, values)) for values in itertools.product(*param_grid.values())]
+    folds = time_series_folds(len(X), n_splits)
+    # Sized by the largest (last) window so the final round trains every fold on its
+    # full expanding window; earlier rounds take at most each fold's own window
+    max_resources = folds[-1][0]
+    n_rounds = max(1, int(np.ceil(np.log(len(candidates)) / np.log(factor))) + 1)
+    if min_resources is None:
+        min_resources = max(1, max_resources // factor ** (n_rounds - 1))
+    dataset_hash = data_hash(X, y)
+    name = type(make_estimator(model, task)).__name__
+    class_starts = _window_starts(y, folds, task)
+
+    history = []
+    for round_id in range(n_rounds):
+        n_resources = min(max_resources, min_resources * factor ** round_id)
+        if round_id == n_rounds - 1 or len(candidates) == 1:
+            n_resources = max_resources
+        tasks, scores = [], {}
+        for ci, params in enumerate(candidates):
+            for fold, (train_stop, val_stop) in enumerate(folds):
+                key = ScoreCache.key(name, params, fold, n_resources, dataset_hash)
+                cached_score = cache.get(key) if cache is not None else None
+                if cached_score is not None:
+                    scores[(ci, fold)] = cached_score
+                    continue
+                # The most recent n_resources rows of each window (the full window in the last round)
+                train_start = max(0, train_stop - n_resources)
+                if class_starts[fold] is not None:
+                    train_start = min(train_start, class_starts[fold])
+                tasks.append((ci, fold, key, train_start, train_stop, val_stop))
+
+        start = time.perf_counter()
+        results = Parallel(n_jobs=n_jobs, return_as='generator')(
+            delayed(_fit_and_score)(_single_threaded(make_estimator(model, task, **candidates[ci])),
+                                    X, y, train_start, train_stop, val_stop, task)
+            for ci, fold, key, train_start, train_stop, val_stop in tasks
+        )
+        for (ci, fold, key, *_), (score, seconds) in zip(tasks, results):
+            scores[(ci, fold)] = score
+            if cache is not None:
+                cache.add(key, score, estimator=name, params=candidates[ci], fold=fold,
+                          n_resources=n_resources, fit_seconds=round(seconds, 3))
+
+        means = [np.mean([scores[(ci, fold)] for fold in range(len(folds))]) for ci in range(len(candidates))]
+        for ci, params in enumerate(candidates):
+            history.append({'round': round_id, 'n_resources': n_resources, 'params': params,
+                            'mean_score': means[ci]})
+        if verbose:
+            print(f"Round {round_id}: {len(candidates)} candidates x {len(folds)} folds on "
+                  f"{n_resources} rows ({len(tasks)} fitted, "
+                  f"{len(candidates) * len(folds) - len(tasks)} cached) in {time.perf_counter() - start:.1f}s")
+
+        if len(candidates) == 1 or n_resources == max_resources:
+            break
+        keep = max(1, int(np.ceil(len(candidates) / factor)))
+        ranked = np.argsort(means, kind='stable')[::-1][:keep]
+        candidates = [candidates[ci] for ci in ranked]
+
+    best = int(np.argmax(means))
+    return candidates[best], pd.DataFrame(history)
+
+
+def _cv_fold(estimator, X_path, y_path, train_stop, val_stop, task):
+    """Worker: fit and score one fold on the memory-mapped arrays."""
+    from utils.evaluation import classification_metrics, regression_metrics
+
+    X = np.load(X_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r')
+    start = time.perf_counter()
+    estimator.fit(X[:train_stop], y[:train_stop])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    y_pred = estimator.predict(X[train_stop:val_stop])
+    predict_seconds = time.perf_counter() - start
+    y_val = np.asarray(y[train_stop:val_stop])
+    metrics = regression_metrics if task == 'regression' else classification_metrics
+    result = metrics(y_val, y_pred, np.zeros(len(y_val), dtype=np.int64), 1).iloc[0]
+    return {**{name: float(value) for name, value in result.items()},
+            'fit_seconds': round(fit_seconds, 3), 'predict_seconds': round(predict_seconds, 3)}
+
+
+def cross_validate(estimator, X, y, task='regression', n_splits=5, cache=None, max_workers=None, verbose=True):
+    """
+    Time-series cross-validation of one estimator with the folds run in parallel processes.
+
+    Parameters:
+    - estimator: scikit-learn estimator; it is cloned, so a fitted model can be passed.
+    - X, y (np.ndarray): Date-sorted training arrays.
+    - task (str, optional): 'regression' or 'classification'.
+    - n_splits (int, optional): TimeSeriesSplit folds.
+    - cache (ScoreCache, optional): Fold results to reuse and extend.
+    - max_workers (int, optional): Worker processes. Defaults to one per core.
+
+    Returns:
+    - pd.DataFrame: One row per fold with its metrics, row counts, fit and predict
+      seconds and whether it came from the cache.
+    """
+    from sklearn.base import clone
+
+    estimator = _single_threaded(clone(estimator))
+    name = type(estimator).__name__
+    params = estimator.get_params(deep=False)
+    params.pop('n_jobs', None)
+    folds = time_series_folds(len(X), n_splits)
+    dataset_hash = data_hash(X, y)
+    score_name = 'R2' if task == 'regression' else 'F1'
+
+    rows, pending = {}, []
+    for fold, (train_stop, val_stop) in enumerate(folds):
+        key = ScoreCache.key(name, params, [fold, train_stop, val_stop], 'cv', dataset_hash)
+        record = cache.record(key) if cache is not None else None
+        if record is not None and 'metrics' in record:
+            rows[fold] = {**record['metrics'], 'cached': True}
+        else:
+            pending.append((fold, key, train_stop, val_stop))
+
+    if pending:
+        tmp_dir = tempfile.mkdtemp(prefix='rainfall_cv_')
+        try:
+            # Workers memory-map these files instead of receiving pickled arrays
+            X_path, y_path = os.path.join(tmp_dir, 'X.npy'), os.path.join(tmp_dir, 'y.npy')
+            np.save(X_path, np.ascontiguousarray(X))
+            np.save(y_path, np.ascontiguousarray(y))
+            workers = min(len(pending), max_workers or os.cpu_count() or 1)
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {
+                    pool.submit(_cv_fold, estimator, X_path, y_path, train_stop, val_stop, task): (fold, key)
+                    for fold, key, train_stop, val_stop in pending
+                }
+                for future in as_completed(futures):
+                    fold, key = futures[future]
+                    metrics = future.result()
+                    rows[fold] = {**metrics, 'cached': False}
+                    if cache is not None:
+                        cache.add(key, metrics[score_name], estimator=name, params=params, fold=fold,
+                                  metrics=metrics)
+                    if verbose:
+                        print(f"{name} fold {fold}: {score_name}={metrics[score_name]:.4f} "
+                              f"(fit {metrics['fit_seconds']:.1f}s, predict {metrics['predict_seconds']:.1f}s)")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return pd.DataFrame([
+        {'fold': fold, 'train_rows': train_stop, 'val_rows': val_stop - train_stop, **rows[fold]}
+        for fold, (train_stop, val_stop) in enumerate(folds)
+    ])
+
+
+def split_boundary(validation_fraction=0.2, source=None):
+    """
+    Date at which the last validation_fraction of rows begins.
+
+    Only the date column is read. Training uses rows before the boundary and
+    validation the rows on or after it, matching split_data's chronological split.
+    """
+    source = source or data_utils.feature_data_path()
+    dates = pd.concat(
+        [batch['date'] for batch in feature_store.iter_feature_batches(source, ['date'])],
+        ignore_index=True,
+    )
+    dates = pd.to_datetime(dates).to_numpy(dtype='datetime64[ns]')
+    boundary = np.quantile(dates.view('int64'), 1 - validation_fraction, method='lower')
+    return pd.Timestamp(boundary).normalize()
+
+
+def shuffle_batches(batches, batch_size, buffer_batches=4, seed=42):
+    """
+    Regroup dataframe batches into shuffled batches of batch_size rows.
+
+    Rows are buffered until buffer_batches * batch_size of them are available;
+    each yielded batch is a random draw from the whole buffer, so it mixes rows
+    of several input batches. Memory stays bounded by the buffer.
+
+    Parameters:
+    - batches (iterable): pd.DataFrame batches, e.g. row groups in random order.
+    - batch_size (int): Rows per yielded batch (the last one may be smaller).
+    - buffer_batches (int, optional): Buffer size in batches.
+    - seed (int, optional): Seed of the row permutations.
+
+    Yields:
+    - pd.DataFrame: Shuffled batches.
+    """
+    rng = np.random.default_rng(seed)
+    buffer, buffered = [], 0
+    for batch in batches:
+        buffer.append(batch)
+        buffered += len(batch)
+        if buffered < buffer_batches * batch_size:
+            continue
+        rows = pd.concat(buffer, ignore_index=True)
+        rows = rows.iloc[rng.permutation(len(rows))]
+        while len(rows) >= buffer_batches * batch_size:
+            yield rows.iloc[:batch_size]
+            rows = rows.iloc[batch_size:]
+        buffer, buffered = [rows], len(rows)
+    if buffered:
+        rows = pd.concat(buffer, ignore_index=True)
+        rows = rows.iloc[rng.permutation(len(rows))]
+        for start in range(0, len(rows), batch_size):
+            yield rows.iloc[start:start + batch_size]
+
+
+def iter_training_batches(task, features=None, date_range=None, batch_size=DEFAULT_BATCH_SIZE, source=None,
+                          shuffle_seed=None):
+    """
+    Stream (X, y) batches from the feature store.
+
+    Parameters:
+    - task (str): 'regression' or 'classification'.
+    - features (list, optional): Feature columns. Defaults to the model features.
+    - date_range (tuple, optional): Inclusive (start, end) dates.
+    - batch_size (int, optional): Maximum rows per batch.
+    - shuffle_seed (int, optional): Mix stations and dates across batches: row groups are
+      read in random order and drawn into batches through a shuffle buffer (see
+      shuffle_batches). By default batches follow storage order, which is enough for
+      evaluation.
+
+    Yields:
+    - tuple: (X C-contiguous float32 with NaN filled by 0, y).
+    """
+    source = source or data_utils.feature_data_path()
+    features = list(features or FEATURE_COLUMNS)
+    target = TARGETS[task]
+    frames = feature_store.iter_feature_batches(source, features + [target], date_range, batch_size,
+                                                shuffle_seed=shuffle_seed)
+    if shuffle_seed is not None:
+        frames = shuffle_batches(frames, batch_size, seed=shuffle_seed)
+    for batch in frames:
+        X = np.empty((len(batch), len(features)), dtype=np.float32)
+        for i, col in enumerate(features):
+            X[:, i] = batch[col].to_numpy(dtype=np.float32, na_value=np.nan)
+        np.nan_to_num(X, copy=False, nan=0.0)
+        y = batch[target].fillna(0).to_numpy()
+        yield X, (y.astype(np.int64) if task == 'classification' else y.astype(np.float64))
+
+
+def fit_incremental(estimator, batches, classes=None):
+    """
+    Fit an estimator that supports partial_fit one batch at a time.
+
+    Parameters:
+    - estimator: Unfitted estimator with partial_fit (e.g. SGDRegressor, SGDClassifier).
+    - batches (iterable): (X, y) batches.
+    - classes (array-like, optional): All class labels, required by classifiers.
+
+    Returns:
+    - The fitted estimator.
+    """
+    for X, y in batches:
+        if classes is not None:
+            estimator.partial_fit(X, y, classes=classes)
+        else:
+            estimator.partial_fit(X, y)
+    return estimator
+
+
+def fit_warm_start_forest(task, batches, trees_per_batch=10, **params):
+    """
+    Grow a random forest batch by batch with warm_start.
+
+    Each batch adds trees_per_batch trees fitted on that batch only, so the
+    batches should be shuffled across stations (iter_training_batches with a
+    shuffle_seed). For classification, batches missing a class are held back and merged into the
+    next batch so every tree sees both classes.
+
+    Returns:
+    - The fitted RandomForestRegressor or RandomForestClassifier.
+    """
+    forest = make_estimator('random_forest', task, n_estimators=0, warm_start=True, n_jobs=-1, **params)
+    pending = []
+    for X, y in batches:
+        pending.append((X, y))
+        if task == 'classification' and len(np.unique(np.concatenate([b[1] for b in pending]))) < 2:
+            continue
+        if len(pending) > 1:
+            X = np.concatenate([b[0] for b in pending])
+            y = np.concatenate([b[1] for b in pending])
+        pending = []
+        forest.n_estimators += trees_per_batch
+        forest.fit(X, y)
+    if forest.n_estimators == 0:
+        raise ValueError("No training batch contained every class")
+    return forest
+
+
+def evaluate_stream(model, batches, task):
+    """
+    Evaluate a model over (X, y) batches with running sums.
+
+    Returns:
+    - dict: MAE, RMSE and R2 for regression; Accuracy, Precision, Recall and F1 for
+      classification (zero_division=0), as in the notebook's evaluate_* helpers.
+    """
+    totals = dict.fromkeys(['n', 'abs', 'sq', 'y', 'y2', 'tp', 'fp', 'fn', 'correct'], 0.0)
+    for X, y in batches:
+        pred = model.predict(X)
+        totals['n'] += len(y)
+        if task == 'regression':
+            err = y - pred
+            totals['abs'] += np.abs(err).sum()
+            totals['sq'] += (err ** 2).sum()
+            totals['y'] += y.sum()
+            totals['y2'] += (y.astype(np.float64) ** 2).sum()
+        else:
+            totals['correct'] += (pred == y).sum()
+            totals['tp'] += ((pred == 1) & (y == 1)).sum()
+            totals['fp'] += ((pred == 1) & (y != 1)).sum()
+            totals['fn'] += ((pred != 1) & (y == 1)).sum()
+    n = totals['n']
+    if n == 0:
+        raise ValueError("No evaluation rows")
+    if task == 'regression':
+        ss_tot = totals['y2'] - totals['y'] ** 2 / n
+        r2 = 1 - totals['sq'] / ss_tot if ss_tot > 0 else 0.0
+        return {'MAE': float(totals['abs'] / n), 'RMSE': float(np.sqrt(totals['sq'] / n)), 'R2': float(r2)}
+    tp, fp, fn = totals['tp'], totals['fp'], totals['fn']
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'Accuracy': float(totals['correct'] / n), 'Precision': float(precision),
+            'Recall': float(recall), 'F1': float(f1)}
+
+
+def train_streaming(task, learner='forest', validation_fraction=0.2, batch_size=DEFAULT_BATCH_SIZE,
+                    features=None, shuffle_seed=42, **params):
+    """
+    Train on the full history out of core and evaluate on the date-split validation rows.
+
+    Parameters:
+    - task (str): 'regression' or 'classification'.
+    - learner (str, optional): 'forest' (warm-started random forest) or 'sgd' (partial_fit
+      after a streamed StandardScaler pass, returned as a Pipeline).
+    - validation_fraction (float, optional): Share of the most recent rows held out.
+    - batch_size (int, optional): Rows per streamed batch.
+    - shuffle_seed (int, optional): Seed of the training batch shuffle; None trains in
+      storage order (station by station).
+    - params: Passed to the estimator.
+
+    Returns:
+    - tuple: (fitted model, validation metrics dict).
+    """
+    features = list(features or FEATURE_COLUMNS)
+    boundary = split_boundary(validation_fraction)
+    train = (None, boundary - pd.Timedelta(days=1))
+    validation = (boundary, None)
+
+    def batches(date_range, shuffle_seed=None):
+        return iter_training_batches(task, features, date_range, batch_size, shuffle_seed=shuffle_seed)
+
+    if learner == 'forest':
+        model = fit_warm_start_forest(task, batches(train, shuffle_seed), **params)
+    elif learner == 'sgd':
+        from sklearn.linear_model import SGDClassifier, SGDRegressor
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        # SGD needs standardized inputs; the scaler takes one extra streamed pass
+        scaler = fit_incremental(StandardScaler(), ((X, None) for X, _ in batches(train)))
+        scaled = ((scaler.transform(X), y) for X, y in batches(train, shuffle_seed))
+        if task == 'regression':
+            sgd = fit_incremental(SGDRegressor(random_state=42, **params), scaled)
+        else:
+            sgd = fit_incremental(SGDClassifier(random_state=42, **params), scaled, classes=[0, 1])
+        model = Pipeline([('scaler', scaler), ('model', sgd)])
+    else:
+        raise ValueError(f"Unknown learner: {learner}")
+    metrics = evaluate_stream(model, batches(validation), task)
+    # Keep feature names so the model is interchangeable with the pickled ones
+    first_step = model.steps[0][1] if hasattr(model, 'steps') else model
+    first_step.feature_names_in_ = np.asarray(features, dtype=object)
+    return model, metrics
+
+
+def full_fit_baseline(task, n_estimators, validation_fraction=0.2, batch_size=DEFAULT_BATCH_SIZE,
+                      features=None, **params):
+    """
+    Fit the random forest on all training rows in memory and score it like train_streaming.
+
+    Uses the same date split and validation batches as train_streaming, so the
+    metrics are directly comparable. Needs the training rows to fit in memory.
+
+    Parameters:
+    - task (str): 'regression' or 'classification'.
+    - n_estimators (int): Trees, e.g. the n_estimators of the streamed forest.
+    - params: Passed to the estimator.
+
+    Returns:
+    - dict: Validation metrics, as returned by evaluate_stream.
+    """
+    features = list(features or FEATURE_COLUMNS)
+    boundary = split_boundary(validation_fraction)
+    train = list(iter_training_batches(task, features, (None, boundary - pd.Timedelta(days=1)), batch_size))
+    if not train:
+        raise ValueError("No training rows before the validation boundary")
+    X = np.concatenate([b[0] for b in train])
+    y = np.concatenate([b[1] for b in train])
+    del train
+    model = make_estimator('random_forest', task, n_estimators=n_estimators, n_jobs=-1, **params)
+    model.fit(X, y)
+    return evaluate_stream(model, iter_training_batches(task, features, (boundary, None), batch_size), task)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search.")
+    parser.add_argument('--task', choices=list(TARGETS), default='regression')
+    parser.add_argument('--model', choices=list(PARAM_GRIDS), default='random_forest')
+    parser.add_argument('--factor', type=int, default=3, help="Halving factor")
+    parser.add_argument('--splits', type=int, default=3, help="Time-series folds")
+    parser.add_argument('--cache', default=None, help="Score cache file")
+    parser.add_argument('--output', default=None, help="Write the refitted best model to this pickle")
+    parser.add_argument('--stream', choices=['forest', 'sgd'], default=None,
+                        help="Train out of core on the full history instead of searching")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per streamed batch")
+    parser.add_argument('--baseline', action='store_true',
+                        help="With --stream forest, also fit the forest in memory and compare metrics")
+    parser.add_argument('--cv', type=int, default=None, metavar='N_SPLITS',
+                        help="Cross-validate the saved regressor and classifier instead of searching")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for --cv")
+    args = parser.parse_args()
+
+    if args.cv:
+        cache = ScoreCache(args.cache or os.path.join(data_utils.CACHE_DIR, CACHE_FILE))
+        for task, loader in [('regression', data_utils.load_reg_model),
+                             ('classification', data_utils.load_clf_model)]:
+            model = loader()
+            features = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+            X, y, *_ = load_training_arrays(task, features)
+            start = time.perf_counter()
+            folds = cross_validate(model, X, y, task, n_splits=args.cv, cache=cache, max_workers=args.workers)
+            score_name = 'R2' if task == 'regression' else 'F1'
+            print(folds.to_string(index=False))
+            print(f"Mean {score_name}: {folds[score_name].mean():.4f} (+/- {folds[score_name].std(ddof=0):.4f}) "
+                  f"in {time.perf_counter() - start:.1f}s")
+        return
+
+    if args.stream:
+        start = time.perf_counter()
+        model, metrics = train_streaming(args.task, args.stream, batch_size=args.batch_size)
+        print(f"Trained in {time.perf_counter() - start:.1f}s; validation metrics: {metrics}")
+        if args.baseline and args.stream == 'forest':
+            start = time.perf_counter()
+            baseline = full_fit_baseline(args.task, model.n_estimators, batch_size=args.batch_size)
+            print(f"Full fit in {time.perf_counter() - start:.1f}s; validation metrics: {baseline}")
+            print("Streamed minus full fit: " + ", ".join(
+                f"{name}={metrics[name] - baseline[name]:+.4f}" for name in baseline))
+        if args.output:
+            with open(args.output, 'wb') as f:
+                pickle.dump(model, f)
+            print(f"Saved model to {args.output}")
+        return
+
+    X, y, X_val, y_val, features = load_training_arrays(args.task)
+    cache = ScoreCache(args.cache or os.path.join(data_utils.CACHE_DIR, CACHE_FILE))
+    start = time.perf_counter()
+    best_params, history = successive_halving(args.model, PARAM_GRIDS[args.model], X, y, task=args.task,
+                                              n_splits=args.splits, factor=args.factor, cache=cache)
+    print(f"Search finished in {time.perf_counter() - start:.1f}s; best parameters: {best_params}")
+    print(history.groupby('round')['mean_score'].max().to_string())
+
+    if args.output:
+        model = make_estimator(args.model, args.task, **best_params)
+        if hasattr(model, 'n_jobs'):
+            model.n_jobs = -1
+        # Refit on the whole training part with feature names, as GridSearchCV(refit=True) does
+        model.fit(pd.DataFrame(X, columns=features), y)
+        with open(args.output, 'wb') as f:
+            pickle.dump(model, f)
+        print(f"Saved best model to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
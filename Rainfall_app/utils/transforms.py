@@ -0,0 +1,277 @@
+"""
+Saved feature transforms of feature_engineering.ipynb.
+
+The notebook refits the log transforms, StandardScaler, LabelEncoder,
+SelectKBest and PCA every time it runs. FeatureTransforms fits them once with
+the same procedure and is pickled next to the app data, so new rows can be
+transformed consistently without refitting anything.
+
+The artifact also keeps each station's static metadata, so model_features()
+can turn raw inputs (station, date and the day's rainfall history in mm) into
+the feature vector the models expect, vectorized over a batch.
+history_inputs() derives those raw inputs from a run of daily readings.
+
+The models were trained with monthly_rainfall and yearly_rainfall as totals
+of the whole month and year. The vectors match training only when those
+inputs are full-period totals. For a month or year that is still open, only a
+to-date total is known, which is smaller than anything the models saw for
+that period, so such predictions are out of distribution.
+"""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+TRANSFORMS_FILE = 'feature_transforms.pkl'
+
+NUMERICAL_COLUMNS = [
+    'rainfall_sum', 'yearly_rainfall', 'monthly_rainfall', 'prev_day_rainfall',
+    'rolling_mean_7d', 'ele(meter)', 'lat(deg)', 'lon(deg)', 'day_of_year'
+]
+CATEGORICAL_COLUMNS = ['station_name_x', 'district']
+# Rainfall inputs given in mm for online feature computation
+RAW_INPUT_COLUMNS = ['rainfall_sum', 'prev_day_rainfall', 'rolling_mean_7d', 'monthly_rainfall', 'yearly_rainfall']
+EXTREME_RAINFALL_MM = 50
+SKEW_THRESHOLD = 1
+N_SELECTED_FEATURES = 10
+N_COMPONENTS = 3
+
+
+class FeatureTransforms:
+    """
+    Fitted transform_features, encode_categorical_features, select_best_features
+    and dimensionality_reduction steps.
+
+    Parameters:
+    - target (str, optional): Target column used by SelectKBest. Defaults to 'rainfall_sum'.
+    """
+
+    def __init__(self, target='rainfall_sum'):
+        self.target = target
+        self.log_columns = []
+        self.scaled_columns = []
+        self.scaler = None
+        self.encoders = {}
+        self.selected_features = []
+        self.pca = None
+        self.station_table = None
+
+    def fit(self, data, validation_fraction=None):
+        """
+        Fit every step on engineered (unscaled) feature rows, as the notebook does.
+
+        Parameters:
+        - data (pd.DataFrame): Output of the create_new_features step.
+        - validation_fraction (float, optional): Hold out the latest rows by date and fit
+          on the rest. The notebook fits on its chronological train split (the first 80%),
+          so pass 0.2 to reproduce the inputs the saved models were trained on. Station
+          metadata is always taken from every row.
+
+        Returns:
+        - FeatureTransforms: self.
+        """
+        from scipy.stats import skew
+        from sklearn.decomposition import PCA
+        from sklearn.feature_selection import SelectKBest, f_regression
+        from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+        self.station_table = _station_table(data)
+        if validation_fraction:
+            order = np.argsort(pd.to_datetime(data['date']).to_numpy(), kind='stable')
+            data = data.iloc[order[:int(len(data) * (1 - validation_fraction))]]
+        data = data.copy()
+        numerical = [col for col in NUMERICAL_COLUMNS if col in data.columns]
+        self.log_columns = [col for col in numerical if skew(data[col].dropna()) > SKEW_THRESHOLD]
+        self._log(data)
+        self.scaled_columns = numerical + [f'log_{col}' for col in self.log_columns]
+        self.scaler = StandardScaler().fit(data[self.scaled_columns])
+        data[self.scaled_columns] = self.scaler.transform(data[self.scaled_columns])
+
+        self.encoders = {
+            col: LabelEncoder().fit(data[col])
+            for col in CATEGORICAL_COLUMNS if col in data.columns
+        }
+        self._encode(data)
+
+        # The notebook selects among int64/float64 columns as read back from CSV
+        data = data.astype({col: 'int64' for col in ['year', 'month'] if col in data.columns})
+        excluded = [self.target, 'date'] + CATEGORICAL_COLUMNS
+        feature_cols = [
+            col for col in data.columns
+            if col not in excluded and data[col].dtype in ['int64', 'float64']
+        ]
+        X = data[feature_cols].fillna(0)
+        selector = SelectKBest(score_func=f_regression, k=min(N_SELECTED_FEATURES, len(feature_cols)))
+        selector.fit(X, data[self.target].fillna(0))
+        self.selected_features = X.columns[selector.get_support()].tolist()
+
+        self.pca = PCA(n_components=min(N_COMPONENTS, len(self.selected_features)))
+        self.pca.fit(data[self.selected_features].fillna(0))
+        return self
+
+    def transform(self, data):
+        """
+        Apply the fitted steps to engineered feature rows.
+
+        Parameters:
+        - data (pd.DataFrame): Rows with the columns the transforms were fitted on.
+
+        Returns:
+        - pd.DataFrame: A transformed copy with log_*, *_encoded and pca_component_* columns.
+        """
+        if self.scaler is None:
+            raise ValueError("FeatureTransforms must be fitted before transform")
+        data = data.copy()
+        arrays = {col: data[col].to_numpy() for col in self._inputs() if col in data.columns}
+        new = pd.DataFrame(self._apply(arrays), index=data.index)
+        data[list(new.columns)] = new
+        return data
+
+    def model_features(self, raw, features):
+        """
+        Build model feature rows from raw inputs.
+
+        Parameters:
+        - raw (pd.DataFrame or list of dict): 'station_name_x' or 'station_id', 'date'
+          and the RAW_INPUT_COLUMNS in mm (monthly/yearly as whole-period totals, as in
+          training; to-date totals of an open period are out of distribution).
+        - features (list): Feature columns to return, in model order.
+
+        Returns:
+        - pd.DataFrame: One row per input with exactly the requested features.
+        """
+        if self.station_table is None:
+            raise ValueError("These transforms were saved without station metadata; refit them")
+        raw = pd.DataFrame(raw)
+        missing = missing_raw_inputs(raw.columns)
+        if missing:
+            raise ValueError(f"Missing raw input columns: {missing}")
+        table = self.station_table
+        if 'station_name_x' in raw.columns:
+            rows = table.index.get_indexer(raw['station_name_x'].astype(str))
+            unknown = raw['station_name_x'][rows < 0]
+        else:
+            rows = pd.Index(table['station_id']).get_indexer(raw['station_id'])
+            unknown = raw['station_id'][rows < 0]
+        if len(unknown):
+            raise ValueError(f"Unknown stations: {sorted(set(unknown.astype(str)))}")
+
+        # Plain arrays instead of dataframe column inserts keep single requests fast
+        arrays = {col: table[col].to_numpy()[rows] for col in table.columns}
+        arrays['station_name_x'] = table.index.to_numpy()[rows]
+        dates = pd.DatetimeIndex(pd.to_datetime(raw['date']))
+        arrays.update(year=dates.year.to_numpy(), month=dates.month.to_numpy(),
+                      days=dates.day.to_numpy(), day_of_year=dates.dayofyear.to_numpy())
+        for col in RAW_INPUT_COLUMNS:
+            arrays[col] = raw[col].to_numpy(dtype=np.float64)
+        arrays['extreme_rainfall'] = (arrays['rainfall_sum'] > EXTREME_RAINFALL_MM).astype(int)
+        arrays.update(self._apply(arrays))
+        absent = [f for f in features if f not in arrays]
+        if absent:
+            raise ValueError(f"Features not produced by the transforms: {absent}")
+        return pd.DataFrame({f: arrays[f] for f in features})
+
+    def _inputs(self):
+        """Columns read by _apply()."""
+        produced = {f'log_{col}' for col in self.log_columns} | {f'{col}_encoded' for col in self.encoders}
+        needed = list(self.log_columns) + list(self.scaled_columns) + list(self.encoders) + list(self.selected_features)
+        return [col for col in dict.fromkeys(needed) if col not in produced]
+
+    def _apply(self, arrays):
+        """
+        Compute the transformed columns from plain arrays.
+
+        Mirrors StandardScaler.transform, LabelEncoder.transform and PCA.transform
+        with NumPy operations so batches and single rows share one code path.
+
+        Returns:
+        - dict: log_* columns, the scaled columns, *_encoded columns and pca_component_*.
+        """
+        out = {f'log_{col}': np.log1p(arrays[col].astype(np.float64)) for col in self.log_columns}
+        values = {**arrays, **out}
+        scaled = np.column_stack([values[col].astype(np.float64) for col in self.scaled_columns])
+        scaled = (scaled - self.scaler.mean_) / self.scaler.scale_
+        for i, col in enumerate(self.scaled_columns):
+            out[col] = scaled[:, i]
+        for col, encoder in self.encoders.items():
+            labels = np.asarray(arrays[col]).astype(str)
+            codes = np.searchsorted(encoder.classes_, labels)
+            known = (codes < len(encoder.classes_)) & (encoder.classes_[np.minimum(codes, len(encoder.classes_) - 1)] == labels)
+            if not known.all():
+                raise ValueError(f"Unknown {col} values (refit the transforms to add them): {sorted(set(labels[~known]))}")
+            out[f'{col}_encoded'] = codes
+        values = {**arrays, **out}
+        selected = np.column_stack([np.asarray(values[col], dtype=np.float64) for col in self.selected_features])
+        selected = np.nan_to_num(selected, nan=0.0)
+        components = (selected - self.pca.mean_) @ self.pca.components_.T
+        for i in range(components.shape[1]):
+            out[f'pca_component_{i+1}'] = components[:, i]
+        return out
+
+    def _log(self, data):
+        for col in self.log_columns:
+            data[f'log_{col}'] = np.log1p(data[col])
+
+    def _encode(self, data):
+        for col, encoder in self.encoders.items():
+            data[f'{col}_encoded'] = encoder.transform(data[col])
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def load(path):
+        return pd.read_pickle(path)
+
+
+def missing_raw_inputs(columns):
+    """Return the raw input columns model_features() needs that are absent from columns."""
+    columns = set(columns)
+    missing = [col for col in ['date'] + RAW_INPUT_COLUMNS if col not in columns]
+    if not columns & {'station_name_x', 'station_id'}:
+        missing.insert(0, 'station_name_x')
+    return missing
+
+
+def history_inputs(readings, window=7):
+    """
+    Derive the raw inputs of model_features from daily readings.
+
+    Each reading gets the previous day's value, the trailing `window`-day mean and
+    the month and year totals of its station, summed over every reading given for
+    that period as the notebook's create_new_features does. Pass whole years of
+    readings for totals that match training; for a period still in progress the
+    totals cover only the readings so far (see the module docstring).
+
+    Parameters:
+    - readings (pd.DataFrame): 'station_name_x' or 'station_id', 'date' and 'rainfall_sum' (mm).
+
+    Returns:
+    - pd.DataFrame: The readings sorted by station and date with RAW_INPUT_COLUMNS added.
+    """
+    station = 'station_name_x' if 'station_name_x' in readings.columns else 'station_id'
+    frame = readings.copy()
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame = frame.sort_values([station, 'date'], kind='stable').reset_index(drop=True)
+    rainfall = frame['rainfall_sum'].astype(np.float64).fillna(0)
+    frame['rainfall_sum'] = rainfall
+    by_station = rainfall.groupby(frame[station], sort=False)
+    frame['prev_day_rainfall'] = by_station.shift(1).fillna(0)
+    frame['rolling_mean_7d'] = by_station.rolling(window=window, min_periods=1).mean().reset_index(level=0, drop=True)
+    year = frame['date'].dt.year
+    frame['monthly_rainfall'] = rainfall.groupby([frame[station], year, frame['date'].dt.month]).transform('sum')
+    frame['yearly_rainfall'] = rainfall.groupby([frame[station], year]).transform('sum')
+    return frame
+
+
+def _station_table(data):
+    """Per-station values of the columns that are constant within every station."""
+    first = data.groupby('station_name_x', sort=True).first()
+    constant = data.groupby('station_name_x').nunique(dropna=False).le(1).all()
+    columns = [col for col in first.columns if constant.get(col, False) and col != 'date']
+    return first[columns]
@@ -0,0 +1,354 @@
+"""
+Compact runtime for the random-forest models.
+
+export_forest() flattens every tree of a fitted RandomForestRegressor or
+RandomForestClassifier into contiguous NumPy node arrays (feature, threshold,
+left/right child, leaf value) and saves them as one .npz file. CompactForest
+loads those arrays and evaluates all trees at once with vectorized NumPy: every
+sample/tree pair descends one level per step, and leaves point to themselves so
+the loop runs a fixed max-depth number of steps without branching. Missing
+values (NaN) follow each node's missing_go_to_left, as in scikit-learn; exports
+from a scikit-learn without that routing reject NaN inputs instead.
+
+Inputs are cast to float32 and compared against the float64 thresholds exactly
+as scikit-learn does, so predictions match the pickled estimators to within
+floating point summation order. export_forest() verifies that on a sample
+before writing anything and records the number of rows checked; exports
+without a passed check are not loaded by the app (data_utils falls back to the
+pickle).
+
+The runtime wins for the small requests of the app pages (no pickle load, no
+joblib dispatch). From about SKLEARN_MIN_ROWS rows on, scikit-learn's compiled
+tree traversal is faster, so a CompactForest given a fallback loader hands
+larger batches to the original estimator.
+
+Usage (from the Rainfall_app directory):
+    python -m utils.tree_runtime                       # export (and parity-check) both models
+    python -m utils.tree_runtime --check --benchmark   # parity report and latency report
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Upper bound on sample x tree node indices held at once during evaluation
+# (about 4 MB per int32 index array); blocks hold MAX_BLOCK_CELLS // n_trees rows
+MAX_BLOCK_CELLS = 1 << 20
+# Batches of at least this many rows go to the fallback estimator, when there is one
+SKLEARN_MIN_ROWS = 1000
+# Rows drawn for the parity check of an export when no feature sample is given
+PARITY_ROWS = 2000
+
+
+class CompactForest:
+    """
+    Vectorized evaluator over flattened forest node arrays.
+
+    Exposes predict (and predict_proba for classifiers) plus feature_names_in_ and
+    classes_, so it can stand in for the scikit-learn estimator at inference time.
+
+    Parameters:
+    - arrays (dict): Output of flatten_forest, as saved by export_forest.
+    - fallback (callable, optional): Returns the original estimator; used for batches
+      of SKLEARN_MIN_ROWS rows or more.
+    """
+
+    def __init__(self, arrays, fallback=None):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.task = str(arrays['task'])
+        self.source_hash = str(arrays['source_hash'])
+        self.parity_rows = int(arrays.get('parity_rows', 0))
+        # Per-node routing of NaN inputs; None for exports without it
+        self.missing_left = arrays.get('missing_left')
+        self.fallback = fallback
+        self.feature_names_in_ = arrays['feature_names'].astype(object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.n_estimators = len(self.roots)
+        if self.task == 'classification':
+            self.classes_ = arrays['classes']
+
+    @classmethod
+    def load(cls, path, fallback=None):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in arrays.files}, fallback=fallback)
+
+    def _bulk_estimator(self, X):
+        if self.fallback is None or len(X) < SKLEARN_MIN_ROWS:
+            return None
+        from utils.inference import with_n_jobs
+
+        # The fallback is the shared cached model, so it is not modified
+        return with_n_jobs(self.fallback(), -1)
+
+    def _as_array(self, X):
+        if isinstance(X, pd.DataFrame) and len(self.feature_names_in_):
+            X = X[list(self.feature_names_in_)]
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        if self.missing_left is None and np.isnan(X).any():
+            raise ValueError("Input contains NaN, and this export has no missing-value routing; "
+                             "re-export it with `python -m utils.tree_runtime`")
+        return X
+
+    def _leaf_values(self, X):
+        """Average the leaf values reached by each sample across all trees."""
+        X = self._as_array(X)
+        n_trees = len(self.roots)
+        block = max(1, MAX_BLOCK_CELLS // n_trees)
+        out_shape = (len(X),) + self.value.shape[1:]
+        out = np.empty(out_shape, dtype=np.float64)
+        for start in range(0, len(X), block):
+            Xb = X[start:start + block]
+            rows = np.arange(len(Xb))[:, None]
+            node = np.broadcast_to(self.roots, (len(Xb), n_trees)).copy()
+            has_nan = self.missing_left is not None and np.isnan(Xb).any()
+            for _ in range(self.max_depth):
+                values = Xb[rows, self.feature[node]]
+                go_left = values <= self.threshold[node]
+                if has_nan:
+                    # NaN compares False; route it the way the fitted tree does
+                    go_left |= np.isnan(values) & self.missing_left[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+            out[start:start + len(Xb)] = self.value[node].mean(axis=1)
+        return out
+
+    def predict(self, X):
+        estimator = self._bulk_estimator(X)
+        if estimator is not None:
+            return estimator.predict(X)
+        values = self._leaf_values(X)
+        if self.task == 'regression':
+            return values
+        return self.classes_[values.argmax(axis=1)]
+
+    def predict_proba(self, X):
+        if self.task != 'classification':
+            raise AttributeError("predict_proba is only available for classifiers")
+        estimator = self._bulk_estimator(X)
+        if estimator is not None:
+            return estimator.predict_proba(X)
+        return self._leaf_values(X)
+
+
+def flatten_forest(model):
+    """
+    Flatten a fitted random forest into contiguous node arrays.
+
+    Parameters:
+    - model: Fitted RandomForestRegressor or RandomForestClassifier (single output).
+
+    Returns:
+    - dict: Arrays keyed feature, threshold, left, right, value, roots, max_depth, task,
+      missing_left (when scikit-learn routes missing values) and classes for classifiers.
+    """
+    is_classifier = hasattr(model, 'classes_')
+    features, thresholds, lefts, rights, values, roots, missing_left = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        leaf = tree.children_left == -1
+        node_ids = np.arange(n_nodes, dtype=np.int64)
+        # Leaves point to themselves so extra descent steps are no-ops
+        lefts.append(np.where(leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(leaf, node_ids, tree.children_right) + offset)
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(np.where(leaf, 0.0, tree.threshold))
+        if hasattr(tree, 'missing_go_to_left'):
+            missing_left.append(np.asarray(tree.missing_go_to_left, dtype=bool) & ~leaf)
+        value = tree.value[:, 0, :].astype(np.float64)
+        if is_classifier:
+            # Older scikit-learn stores class counts; normalize to per-leaf probabilities
+            totals = value.sum(axis=1, keepdims=True)
+            value = np.divide(value, totals, out=np.zeros_like(value), where=totals > 0)
+        else:
+            value = value[:, 0]
+        values.append(value)
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, tree.max_depth)
+
+    index_dtype = np.int32 if offset < np.iinfo(np.int32).max else np.int64
+    arrays = {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': np.concatenate(lefts).astype(index_dtype),
+        'right': np.concatenate(rights).astype(index_dtype),
+        'value': np.concatenate(values),
+        'roots': np.asarray(roots, dtype=index_dtype),
+        'max_depth': np.int64(max_depth),
+        'task': np.str_('classification' if is_classifier else 'regression'),
+        'feature_names': np.asarray(getattr(model, 'feature_names_in_', []), dtype=str),
+    }
+    if len(missing_left) == len(model.estimators_):
+        arrays['missing_left'] = np.concatenate(missing_left)
+    if is_classifier:
+        arrays['classes'] = np.asarray(model.classes_)
+    return arrays
+
+
+def parity_sample(arrays, n_rows=PARITY_ROWS, seed=42):
+    """
+    Synthetic rows that reach many leaves of a flattened forest.
+
+    Each feature value is drawn from that feature's split thresholds, nudged just
+    below or above, so both branches of the splits are exercised, including
+    values that round onto a threshold when cast to float32. When the forest
+    routes missing values, a share of the values is NaN.
+
+    Returns:
+    - pd.DataFrame: n_rows rows over the forest's features (float32).
+    """
+    rng = np.random.default_rng(seed)
+    internal = arrays['left'] != np.arange(len(arrays['left']))
+    n_features = len(arrays['feature_names']) or int(arrays['feature'].max()) + 1
+    X = np.zeros((n_rows, n_features), dtype=np.float32)
+    for f in range(n_features):
+        thresholds = arrays['threshold'][internal & (arrays['feature'] == f)]
+        # Splits that only separate missing values have an infinite threshold
+        thresholds = thresholds[np.isfinite(thresholds)]
+        if len(thresholds):
+            picked = rng.choice(thresholds, n_rows)
+            X[:, f] = picked + rng.choice([-1.0, 0.0, 1.0], n_rows) * np.maximum(np.abs(picked), 1) * 1e-6
+    if 'missing_left' in arrays:
+        X[rng.random(X.shape) < 0.05] = np.nan
+    columns = list(arrays['feature_names']) or None
+    return pd.DataFrame(X, columns=columns)
+
+
+def export_forest(model, path, source_hash='', X=None, atol=1e-9):
+    """
+    Save a fitted forest as a compact .npz file after checking parity with it.
+
+    Parameters:
+    - model: Fitted random forest.
+    - path (str): Output .npz path.
+    - source_hash (str, optional): Content hash of the pickle the model came from.
+    - X (pd.DataFrame, optional): Feature rows for the parity check; defaults to
+      parity_sample() of the forest.
+    - atol (float, optional): Largest prediction (or probability) difference allowed.
+
+    Returns:
+    - str: The written path.
+
+    Raises:
+    - ValueError: If the compact forest disagrees with the model; nothing is written.
+    """
+    arrays = flatten_forest(model)
+    if X is None:
+        X = parity_sample(arrays)
+    report = check_parity(model, CompactForest({**arrays, 'source_hash': np.str_(source_hash)}), X, atol)
+    if not report['ok']:
+        raise ValueError(f"Compact forest does not match the model: {report}")
+    arrays['source_hash'] = np.str_(source_hash)
+    arrays['parity_rows'] = np.int64(len(X))
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def compact_path(pickle_path):
+    """Return the .npz path used for the compact export of a model pickle."""
+    return os.path.splitext(pickle_path)[0] + '.compact.npz'
+
+
+def check_parity(model, compact, X, atol=1e-9):
+    """
+    Compare a compact forest against the original estimator.
+
+    Returns:
+    - dict: Maximum absolute differences and whether all outputs are within atol.
+    """
+    report = {}
+    if hasattr(model, 'classes_'):
+        proba_diff = np.abs(model.predict_proba(X) - compact.predict_proba(X)).max()
+        label_match = float((model.predict(X) == compact.predict(X)).mean())
+        report.update(max_proba_diff=float(proba_diff), label_agreement=label_match)
+        report['ok'] = bool(proba_diff <= atol and label_match == 1.0)
+    else:
+        pred_diff = np.abs(model.predict(X) - compact.predict(X)).max()
+        report.update(max_pred_diff=float(pred_diff))
+        report['ok'] = bool(pred_diff <= atol)
+    return report
+
+
+def benchmark(model, compact, pickle_path, X, repeats=50):
+    """
+    Report load time, single-row and batch latency for the pickle and the compact model.
+
+    Returns:
+    - pd.DataFrame: Milliseconds per operation for each runtime.
+    """
+    def timed(func, n=repeats):
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        return (time.perf_counter() - start) / n * 1000
+
+    row = X.iloc[[0]]
+    predict = 'predict_proba' if hasattr(model, 'classes_') else 'predict'
+    npz_path = compact_path(pickle_path)
+    rows = []
+    for name, est, load in [
+        ('sklearn', model, lambda: pd.read_pickle(pickle_path)),
+        ('compact', compact, lambda: CompactForest.load(npz_path)),
+    ]:
+        rows.append({
+            'runtime': name,
+            'load_ms': timed(load, n=3),
+            'single_row_ms': timed(lambda: getattr(est, predict)(row)),
+            f'batch_{len(X)}_ms': timed(lambda: getattr(est, predict)(X), n=3),
+            'file_mb': os.path.getsize(pickle_path if name == 'sklearn' else npz_path) / 1e6,
+        })
+    return pd.DataFrame(rows).set_index('runtime').round(3)
+
+
+def main():
+    from utils import data_utils
+
+    parser = argparse.ArgumentParser(description="Export the random forests to the compact runtime.")
+    parser.add_argument('--check', action='store_true', help="Verify parity against the pickled models")
+    parser.add_argument('--benchmark', action='store_true', help="Report load and prediction latency")
+    parser.add_argument('--rows', type=int, default=5000, help="Feature rows used for --check/--benchmark")
+    args = parser.parse_args()
+
+    # Exports are always parity-checked, on real rows when the feature data is there
+    try:
+        data = data_utils.load_feature_data()
+        sample = data.sample(min(args.rows, len(data)), random_state=42)
+    except FileNotFoundError:
+        if args.check or args.benchmark:
+            raise
+        sample = None
+
+    for file_name, loader in [
+        ('best_random_forest_regressor_model.pkl', data_utils.load_reg_model),
+        ('best_random_forest_classifier_model.pkl', data_utils.load_clf_model),
+    ]:
+        pickle_path = os.path.join(data_utils.DATA_DIR, file_name)
+        model = loader()
+        features = list(getattr(model, 'feature_names_in_', []))
+        X = sample[features] if sample is not None and features else None
+        path = export_forest(model, compact_path(pickle_path), data_utils.file_hash(pickle_path), X=X)
+        print(f"Exported {file_name} to {path}")
+        if sample is None or not (args.check or args.benchmark):
+            continue
+        compact = CompactForest.load(path)
+        X = sample[list(compact.feature_names_in_)]
+        if args.check:
+            print("Parity:", check_parity(model, compact, X))
+        if args.benchmark:
+            print(benchmark(model, compact, pickle_path, X).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,376 @@
-import folium
-from streamlit_folium import st_folium
-import plotly.express as px
+import hashlib
 
-def plot_station_map(reg_perf, locations_df, metric='R2'):
+import numpy as np
+import pandas as pd
+
+# folium and plotly are imported inside the plotting functions so pages that
+# import this module can draw before those libraries are loaded
+
+# Stations beyond this count are drawn as a clustered layer
+CLUSTER_THRESHOLD = 100
+# Low-to-high metric colors (red, amber, green)
+METRIC_COLORS = np.array([[0xef, 0x44, 0x44], [0xfa, 0xcc, 0x15], [0x22, 0xc5, 0x5e]])
+MARKER_BORDER = '#1e3a8a'
+# Points per time series sent to the browser (about two per horizontal pixel)
+DEFAULT_POINT_BUDGET = 2000
+# Series with more points are drawn with WebGL traces
+WEBGL_THRESHOLD = 1000
+# Sidebar aggregation modes -> pandas resample frequency
+AGGREGATION_FREQUENCIES = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'MS'}
+FACET_HEIGHT = 180
+
+_CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 8, color: '%s', weight: 1, fillColor: row[2], fillOpacity: 0.85
+    });
+    marker.bindTooltip(row[3]);
+    return marker;
+}
+""" % MARKER_BORDER
+
+
+def station_metrics(perf, locations_df, metric='R2'):
+    """
+    Align a per-station metric with station locations.
+
+    Parameters:
+    - perf (pd.DataFrame): Performance data indexed by station_id (or with a station_id column).
+    - locations_df (pd.DataFrame): 'station_id', 'station_name_x', 'lat(deg)' and 'lon(deg)'
+      in degrees (station_id may be the index), e.g. data_utils.load_station_locations().
+      The feature data's own lat(deg)/lon(deg) are standardized and cannot be used.
+    - metric (str, optional): Metric column of perf. Defaults to 'R2'.
+
+    Returns:
+    - pd.DataFrame: station_id, station_name_x, lat, lon and value for stations with both.
     """
-    Generate a Folium map with markers for each station displaying the specified metric.
+    if 'station_id' in perf.columns:
+        perf = perf.set_index('station_id')
+    if 'station_id' not in locations_df.columns:
+        locations_df = locations_df.reset_index()
+    locations = locations_df.drop_duplicates('station_id')
+    values = perf[metric].reindex(locations['station_id']).to_numpy(dtype=np.float64)
+    keep = ~np.isnan(values)
+    return pd.DataFrame({
+        'station_id': locations['station_id'].to_numpy()[keep],
+        'station_name_x': locations['station_name_x'].astype(str).to_numpy()[keep],
+        'lat': locations['lat(deg)'].to_numpy(dtype=np.float64)[keep],
+        'lon': locations['lon(deg)'].to_numpy(dtype=np.float64)[keep],
+        'value': values[keep],
+    })
+
+
+def metric_colors(values, vmin=None, vmax=None):
+    """Hex colors interpolated along METRIC_COLORS for an array of metric values."""
+    values = np.asarray(values, dtype=np.float64)
+    vmin = np.nanmin(values) if vmin is None else vmin
+    vmax = np.nanmax(values) if vmax is None else vmax
+    position = np.clip((values - vmin) / (vmax - vmin), 0, 1) if vmax > vmin else np.full(len(values), 0.5)
+    stops = np.linspace(0, 1, len(METRIC_COLORS))
+    rgb = np.column_stack([np.interp(position, stops, METRIC_COLORS[:, c]) for c in range(3)]).round().astype(int)
+    return ['#%02x%02x%02x' % tuple(color) for color in rgb]
+
+
+def plot_station_map(perf, locations_df, metric='R2', cluster=None):
+    """
+    Generate a Folium map of the stations colored by the specified metric.
+
+    All stations go into one layer built from column arrays: a GeoJSON layer of
+    circle markers, or a FastMarkerCluster layer when there are more than
+    CLUSTER_THRESHOLD stations.
 
     Parameters:
-    - reg_perf (pd.DataFrame): Regression performance dataframe with 'station_id' and metric columns.
-    - locations_df (pd.DataFrame): Locations dataframe with 'station_id', 'lat(deg)', 'lon(deg)', and 'station_name_x' columns.
+    - perf (pd.DataFrame): Performance data indexed by station_id (or with a station_id column).
+    - locations_df (pd.DataFrame): Locations with 'station_id', 'station_name_x', 'lat(deg)' and 'lon(deg)'.
     - metric (str, optional): The metric to display on the map. Defaults to 'R2'.
+    - cluster (bool, optional): Force clustering on or off. Defaults to automatic.
 
     Returns:
     - folium.Map: The generated Folium map.
     """
-    # Ensure station_id is the index in both dataframes
-    reg_perf = reg_perf.set_index('station_id')
-    locations_df = locations_df.set_index('station_id')
-    
-    # Merge the dataframes on station_id
-    merged_df = reg_perf.join(locations_df, how='inner')
-    
-    # Create a map centered around the mean latitude and longitude
-    mean_lat = merged_df['lat(deg)'].mean()
-    mean_lon = merged_df['lon(deg)'].mean()
-    map_center = [mean_lat, mean_lon]
-    
-    # Create a Folium map
-    m = folium.Map(location=map_center, zoom_start=6)
-    
-    # Add markers for each station
-    for idx, row in merged_df.iterrows():
-        folium.Marker(
-            [row['lat(deg)'], row['lon(deg)']],
-            popup=f"{row['station_name_x']} - {metric}: {row[metric]:.4f}",
-            icon=folium.Icon(color='blue')
+    return _station_map(station_metrics(perf, locations_df, metric), metric, cluster)
+
+
+def _station_map(stations, metric, cluster):
+    import folium
+    from branca.colormap import LinearColormap
+    from folium.plugins import FastMarkerCluster
+
+    center = [stations['lat'].mean(), stations['lon'].mean()] if len(stations) else [27.0, 87.0]
+    m = folium.Map(location=center, zoom_start=8, tiles="CartoDB Positron")
+    if stations.empty:
+        return m
+
+    values = stations['value'].to_numpy()
+    vmin, vmax = float(values.min()), float(values.max())
+    colors = metric_colors(values, vmin, vmax)
+    labels = [f"{name} - {metric}: {value:.4f}" for name, value in zip(stations['station_name_x'], values)]
+    if cluster is None:
+        cluster = len(stations) > CLUSTER_THRESHOLD
+    if cluster:
+        rows = [list(row) for row in zip(stations['lat'].tolist(), stations['lon'].tolist(), colors, labels)]
+        FastMarkerCluster(rows, callback=_CLUSTER_CALLBACK, name=metric).add_to(m)
+    else:
+        features = [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': {'label': label, 'color': color},
+            }
+            for lat, lon, label, color in zip(stations['lat'].tolist(), stations['lon'].tolist(), labels, colors)
+        ]
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            name=metric,
+            marker=folium.CircleMarker(radius=8, fill=True, fill_opacity=0.85, weight=1),
+            style_function=lambda feature: {'fillColor': feature['properties']['color'], 'color': MARKER_BORDER},
+            tooltip=folium.GeoJsonTooltip(fields=['label'], labels=False),
         ).add_to(m)
-    
+    if vmax > vmin:
+        LinearColormap(['#%02x%02x%02x' % tuple(c) for c in METRIC_COLORS], vmin=vmin, vmax=vmax,
+                       caption=metric).add_to(m)
+    m.fit_bounds([[stations['lat'].min(), stations['lon'].min()], [stations['lat'].max(), stations['lon'].max()]])
     return m
 
-def plot_time_series(data, y_columns=['rainfall_sum', 'pred_rainfall'], title="Rainfall Over Time"):
+
+def station_map_html(perf, locations_df, metric='R2', cluster=None):
+    """
+    Rendered HTML of plot_station_map, cached per (metric, data hash).
+
+    Reruns with the same stations and metric values reuse the HTML instead of
+    rebuilding and re-serializing the map.
+
+    Returns:
+    - str: Standalone HTML document of the map.
+    """
+    from utils.data_utils import cached
+
+    stations = station_metrics(perf, locations_df, metric)
+    digest = hashlib.sha1(pd.util.hash_pandas_object(stations, index=False).to_numpy().tobytes()).hexdigest()
+    return cached(('station_map', metric, cluster, digest),
+                  lambda: _station_map(stations, metric, cluster).get_root().render())
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets selection of n_out points.
+
+    Keeps the first and last point and, from each of n_out - 2 equal index
+    buckets, the point forming the largest triangle with the previously kept
+    point and the mean of the next bucket.
+
+    Returns:
+    - np.ndarray: Sorted row positions to keep.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    # Mean of every bucket, and of the final point as the last bucket's successor
+    bucket_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges), x[-1])
+    bucket_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / np.diff(edges), y[-1])
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - bucket_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (bucket_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_buckets):
+    """Positions of the minimum and maximum of each of n_buckets equal index buckets, plus both ends."""
+    n = len(y)
+    size = n // n_buckets
+    if size < 2:
+        return np.arange(n)
+    trimmed = size * n_buckets
+    blocks = y[:trimmed].reshape(n_buckets, size)
+    base = np.arange(n_buckets) * size
+    tail = np.arange(trimmed, n)
+    return np.unique(np.concatenate([[0], base + blocks.argmin(axis=1), base + blocks.argmax(axis=1), tail, [n - 1]]))
+
+
+def downsample_indices(x, y, max_points, preselect_ratio=4):
+    """
+    MinMaxLTTB: min/max preselection to preselect_ratio * max_points candidates, then LTTB.
+
+    Peaks survive the preselection and LTTB keeps the visual shape, while the
+    Python-level LTTB loop only runs over the small candidate set.
+
+    Returns:
+    - np.ndarray: Sorted row positions to keep (all rows when within max_points).
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    candidates = minmax_indices(y, max(1, (max_points * preselect_ratio) // 2))
+    return candidates[lttb_indices(x[candidates], y[candidates], max_points)]
+
+
+def downsample_series(data, y_columns, max_points=DEFAULT_POINT_BUDGET, x_range=None, cache_key=None):
+    """
+    Reduce each y column of a date-indexed frame to at most max_points points.
+
+    Parameters:
+    - data (pd.DataFrame): Rows with 'date' and y_columns, in plotting order.
+    - y_columns (list): Columns to plot, each decimated on its own.
+    - max_points (int, optional): Point budget per series.
+    - x_range (tuple, optional): Inclusive (start, end) dates to keep before decimating;
+      a narrow window is returned at full resolution.
+    - cache_key (hashable, optional): Identifies the selection (e.g. stations and date range).
+      When given, the result is cached per (cache_key, x_range, budget) and a fingerprint of the data.
+
+    Returns:
+    - dict: column -> (dates, values) arrays, plus 'total_points' (rows in the window).
+    """
+    def compute():
+        dates = pd.to_datetime(data['date']).to_numpy()
+        rows = np.arange(len(data))
+        if x_range is not None:
+            start, end = (np.datetime64(pd.Timestamp(bound)) if bound is not None else None for bound in x_range)
+            mask = np.ones(len(data), dtype=bool)
+            if start is not None:
+                mask &= dates >= start
+            if end is not None:
+                mask &= dates < end + np.timedelta64(1, 'D')
+            rows = rows[mask]
+        x = dates[rows].astype('datetime64[ns]').astype(np.int64)
+        series = {'total_points': len(rows)}
+        for col in y_columns:
+            values = data[col].to_numpy(dtype=np.float64)[rows]
+            keep = downsample_indices(x, values, max_points)
+            series[col] = (dates[rows][keep], values[keep])
+        return series
+
+    if cache_key is None:
+        return compute()
+    from utils.data_utils import cached
+
+    range_key = None if x_range is None else tuple(None if b is None else str(pd.Timestamp(b).date()) for b in x_range)
+    return cached(('time_series', cache_key, tuple(y_columns), max_points, range_key, _fingerprint(data, y_columns)),
+                  compute)
+
+
+def _fingerprint(data, y_columns):
+    # Cheap fingerprint so refreshed data (new rows or predictions) is not served stale
+    return (len(data),) + tuple(float(np.nansum(data[col].to_numpy(dtype=np.float64))) for col in y_columns)
+
+
+def aggregate_series(data, y_columns, freq='D', per_station=True, cache_key=None):
+    """
+    Resample y columns to a coarser period, per station or as a basin-wide mean.
+
+    Parameters:
+    - data (pd.DataFrame): Rows with 'station_id', 'date' and y_columns.
+    - y_columns (list): Columns to average.
+    - freq (str, optional): Pandas frequency, e.g. 'D', 'W' or 'MS' (see AGGREGATION_FREQUENCIES).
+    - per_station (bool, optional): One series per station; otherwise the mean over all stations.
+    - cache_key (hashable, optional): Identifies the selection; the result is cached per
+      (cache_key, freq, per_station) and a fingerprint of the data.
+
+    Returns:
+    - pd.DataFrame: 'date' and y_columns (plus 'station_id' when per_station), sorted by station then date.
+    """
+    y_columns = list(y_columns)
+
+    def compute():
+        keys = ['station_id'] if per_station else []
+        frame = data[keys + ['date'] + y_columns]
+        frame = frame.assign(date=pd.to_datetime(frame['date']))
+        if per_station and freq == 'D':
+            # Already one row per station-day
+            return frame.sort_values(keys + ['date'], kind='stable').reset_index(drop=True)
+        grouped = frame.groupby(keys + [pd.Grouper(key='date', freq=freq)], sort=True)[y_columns].mean()
+        return grouped.dropna(how='all').reset_index()
+
+    if cache_key is None:
+        return compute()
+    from utils.data_utils import cached
+
+    return cached(('aggregate_series', cache_key, tuple(y_columns), freq, per_station, _fingerprint(data, y_columns)),
+                  compute)
+
+
+def plot_time_series(data, y_columns=['rainfall_sum', 'pred_rainfall'], title="Rainfall Over Time",
+                     max_points=DEFAULT_POINT_BUDGET, x_range=None, cache_key=None):
     """
-    Create a time series line chart using Plotly Express.
+    Create a time series line chart with a bounded number of points per series.
+
+    Series longer than max_points are decimated with MinMaxLTTB, and WebGL
+    (scattergl) traces are used once a series has more than WEBGL_THRESHOLD points,
+    so the payload and browser render time do not grow with the history length.
 
     Parameters:
     - data (pd.DataFrame): Dataframe containing date and y_columns data.
     - y_columns (list, optional): List of column names to plot on the y-axis. Defaults to ['rainfall_sum', 'pred_rainfall'].
     - title (str, optional): Title of the chart. Defaults to "Rainfall Over Time".
+    - max_points (int, optional): Point budget per series.
+    - x_range (tuple, optional): Inclusive (start, end) zoom window, shown at full resolution when it fits the budget.
+    - cache_key (hashable, optional): Caches the decimated series; see downsample_series().
+
+    Returns:
+    - plotly.graph_objs.Figure: The generated Plotly figure.
+    """
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
+
+    series = downsample_series(data, y_columns, max_points, x_range, cache_key)
+    trace = go.Scattergl if series['total_points'] > WEBGL_THRESHOLD else go.Scatter
+    colors = qualitative.Plotly
+    fig = go.Figure([
+        trace(x=series[col][0], y=series[col][1], mode='lines', name=col, line=dict(color=colors[i % len(colors)]))
+        for i, col in enumerate(y_columns)
+    ])
+    fig.update_layout(title=title, xaxis_title='date', yaxis_title='value', legend_title_text='variable')
+    return fig
+
+
+def plot_station_facets(data, y_columns=['rainfall_sum', 'pred_rainfall'], title="Rainfall Over Time",
+                        station_names=None, max_points=DEFAULT_POINT_BUDGET, x_range=None, cache_key=None):
+    """
+    Create one time series panel per station on a shared date axis.
+
+    Each station's series are decimated on their own, as in plot_time_series(),
+    so stations never share (and interleave on) a single line.
+
+    Parameters:
+    - data (pd.DataFrame): Rows with 'station_id', 'date' and y_columns, e.g. from aggregate_series().
+    - y_columns (list, optional): List of column names to plot in every panel.
+    - title (str, optional): Title of the chart.
+    - station_names (dict, optional): Station ID -> name used in the panel titles.
+    - max_points (int, optional): Point budget per series and station.
+    - x_range (tuple, optional): Inclusive (start, end) zoom window.
+    - cache_key (hashable, optional): Caches each station's decimated series; see downsample_series().
 
     Returns:
     - plotly.graph_objs.Figure: The generated Plotly figure.
     """
-    fig = px.line(data, x='date', y=y_columns, title=title)
-    return fig
\ No newline at end of file
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
+    from plotly.subplots import make_subplots
+
+    groups = list(data.groupby('station_id', sort=False))
+    station_names = station_names or {}
+    n_rows = max(len(groups), 1)
+    fig = make_subplots(
+        rows=n_rows, cols=1, shared_xaxes=True, vertical_spacing=min(0.08, 0.3 / n_rows),
+        subplot_titles=[f"{station_names.get(sid, 'Unknown')} (ID: {sid})" for sid, _ in groups]
+    )
+    colors = qualitative.Plotly
+    for row, (sid, group) in enumerate(groups, start=1):
+        series = downsample_series(group, y_columns, max_points, x_range,
+                                   None if cache_key is None else (cache_key, sid))
+        trace = go.Scattergl if series['total_points'] > WEBGL_THRESHOLD else go.Scatter
+        for i, col in enumerate(y_columns):
+            fig.add_trace(
+                trace(x=series[col][0], y=series[col][1], mode='lines', name=col, legendgroup=col,
+                      showlegend=row == 1, line=dict(color=colors[i % len(colors)])),
+                row=row, col=1
+            )
+    fig.update_layout(title=title, height=max(400, FACET_HEIGHT * n_rows), legend_title_text='variable')
+    fig.update_xaxes(title_text='date', row=n_rows, col=1)
+    return fig